@@ -11,7 +11,7 @@ from flask_script import Manager, Shell
 from psycopg2 import DatabaseError
 from sqlalchemy.exc import StatementError
 
-from pma_api import create_app
+from pma_api import create_app, dataset_schemas, invalidation
 from pma_api.config import PROJECT_ROOT_PATH
 from pma_api.manage.server_mgmt import store_pid
 from pma_api.manage.db_mgmt import get_api_data, get_ui_data, \
@@ -19,6 +19,7 @@ from pma_api.manage.db_mgmt import get_api_data, get_ui_data, \
      restore_db, list_backups as listbackups, \
      list_ui_data as listuidata, list_datasets as listdatasets, \
      backup_source_files as backupsourcefiles
+from pma_api.manage.dataset_diff import diff_datasets as diffdatasets
 from pma_api.manage.initdb_from_wb import InitDbFromWb
 from pma_api.models import db, Cache, ApiMetadata, Translation
 from pma_api.utils import dict_to_pretty_json
@@ -30,14 +31,19 @@ manager = Manager(app)
 
 @manager.option('-a', '--api_file_path', help='Custom path for api file')
 @manager.option('-u', '--ui_file_path', help='Custom path for ui file')
-def initdb(api_file_path: str, ui_file_path: str):
+@manager.option('-s', '--skip_if_unchanged', action='store_true',
+                help='Only refresh cache if files are of the active dataset')
+def initdb(api_file_path: str, ui_file_path: str,
+           skip_if_unchanged: bool = False):
     """Initialize a fresh database instance.
 
-    WARNING: If DB already exists, will drop it.
+    WARNING: If DB already exists, will drop it, unless skipping an
+    unchanged dataset.
 
     Side effects:
         - Drops database
         - Creates database
+        - Backs up database, once active, if not backed up before
         - Prints results
 
     Args:
@@ -45,14 +51,23 @@ def initdb(api_file_path: str, ui_file_path: str):
         from default path
         ui_file_path (str): Path to UI spec file; if not present, gets
         from default path
+        skip_if_unchanged (bool): If the files are those of the active
+        dataset, only refresh the cache?
     """
     api_fp = api_file_path if api_file_path else get_api_data()
     ui_fp = ui_file_path if ui_file_path else get_ui_data()
-    results: Dict = InitDbFromWb(
+    initializer = InitDbFromWb(
         _app=app,
         api_file_path=api_fp,
-        ui_file_path=ui_fp)\
-        .run()
+        ui_file_path=ui_fp,
+        skip_if_unchanged=skip_if_unchanged)
+    results: Dict = initializer.run()
+    # Loading into a shadow schema skips backups; back up once active instead
+    if initializer.uses_shadow_schema and not initializer.unchanged:
+        try:
+            backup_db()
+        except Exception as err:
+            results['warnings']['backup'] = str(err)
 
     warning_str = ''
     if results['warnings']:
@@ -60,7 +75,9 @@ def initdb(api_file_path: str, ui_file_path: str):
         warnings: dict = results['warnings']
         for k, v in warnings.items():
             warning_str += '\n{}: {}'.format(k, v)
-    result = 'Successfully initialized dataset.' if results['success'] \
+    result = 'Dataset is already active. Refreshed cache.' \
+        if results['unchanged'] \
+        else 'Successfully initialized dataset.' if results['success'] \
         else 'Failed to initialize dataset.'
 
     print('\n' + result + '\n' + warning_str)
@@ -92,11 +109,56 @@ def cache_responses():
     """Cache responses in the 'cache' table of DB."""
     with app.app_context():
         try:
-            Cache.cache_datalab_init(app)
+            Cache.warm_up(app)
         except (StatementError, DatabaseError) as e:
             print(connection_error.format(str(e)), file=stderr)
 
 
+@manager.option('--snapshot', help='Name of snapshot to roll back to; '
+                                   'defaults to the newest')
+def rollback_dataset(snapshot: str = None):
+    """Swap a snapshot of a previously active dataset back in.
+
+    Only possible on Postgres, where datasets are activated by swapping
+    schemas. Rolling back to the newest snapshot again undoes the rollback.
+
+    Args:
+        snapshot (str): Name of snapshot schema
+    """
+    with app.app_context():
+        if not dataset_schemas.is_supported():
+            print('Rolling back datasets requires Postgres.', file=stderr)
+            return
+        dataset_schemas.activate_snapshot(snapshot)
+        invalidation.publish()
+
+
+@manager.command
+def list_snapshots():
+    """List snapshots of previously active datasets, newest first"""
+    with app.app_context():
+        if dataset_schemas.is_supported():
+            print(dict_to_pretty_json(dataset_schemas.list_snapshots()))
+
+
+@manager.option('-n', '--new', help='Version number of new dataset, or '
+                                    'path to its file')
+@manager.option('-o', '--old', help='Version number of old dataset, or path '
+                                    'to its file; defaults to the active one')
+def diff_datasets(new: str, old: str = None):
+    """Show what changed between two versions of a dataset
+
+    Args:
+        new (str): Version number of new dataset, or path to its file
+        old (str): Version number of old dataset, or path to its file
+    """
+    if not new:
+        print('Must specify new dataset: --new=VERSION', file=stderr)
+        return
+    with app.app_context():
+        print(dict_to_pretty_json(diffdatasets(new=new, old=old)))
+
+
 @manager.option('--path', help='Custom path for backup file')
 def backup(path: str = ''):
     """Backup db
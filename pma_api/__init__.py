@@ -4,6 +4,7 @@ import os
 from flask_cors import CORS
 from flask_user import UserManager
 
+from pma_api import dataset_schemas, invalidation
 from pma_api.app import PmaApiFlask
 
 
@@ -33,4 +34,9 @@ def create_app(config_name: str = os.getenv('ENV_NAME', 'default')) \
     from pma_api.routes.endpoints.api_1_0 import api as api_1_0_blueprint
     _app.register_blueprint(api_1_0_blueprint, url_prefix='/v1')
 
+    # Dataset tables are read from the live schema, on Postgres
+    dataset_schemas.install(_app)
+    # Web workers drop in-process caches when a dataset is activated
+    _app.before_first_request(lambda: invalidation.start_listener(_app))
+
     return _app
@@ -1,5 +1,5 @@
 """Custom subclass for the PMA API."""
-from flask import Flask, Response, jsonify
+from flask import Flask, Response, jsonify, request
 
 
 class PmaApiFlask(Flask):
@@ -54,6 +54,8 @@ class PmaApiFlask(Flask):
             returns: jsonify = rv.to_response()
         elif isinstance(rv, Cache):
             returns = Response(rv.value, mimetype=rv.mimetype)
+            returns.set_etag(rv.etag)
+            returns = returns.make_conditional(request)
         else:
             returns = Flask.make_response(self, rv)
 
@@ -13,6 +13,10 @@ PROJECT_ROOT_PATH = \
 load_dotenv(dotenv_path=Path(PROJECT_ROOT_PATH) / '.env')
 
 TEMP_DIR: str = os.path.join(PROJECT_ROOT_PATH, 'temp')
+PARSED_WORKBOOKS_DIR: str = os.path.join(TEMP_DIR, 'parsed_workbooks')
+DATASET_STORE_DIR: str = os.path.join(TEMP_DIR, 'dataset_store')
+CLOUD_INDEX_PATH: str = os.path.join(TEMP_DIR, 'cloud_index.json')
+UPLOADS_DIR: str = os.path.join(TEMP_DIR, 'uploads')
 DATA_DIR: str = os.path.abspath(os.path.join(PROJECT_ROOT_PATH, 'data'))
 BINARY_DIR: str = \
     os.path.abspath(os.path.join(PACKAGE_DIR_PATH, 'bin'))
@@ -29,7 +33,8 @@ FILE_LIST_IGNORES = ('.DS_Store', )
 
 REFERENCES = {  # TODO: What this is used for should be implemented different
     'routes': {
-        'datalab_init': 'v1/datalab/init'
+        'datalab_init': 'v1/datalab/init',
+        'datalab_init_section': 'v1/datalab/init/{}'
     },
     'binaries': {
         'pg_dump': {
@@ -64,11 +69,74 @@ AWS_S3_STORAGE_BUCKETNAME: str = os.getenv('BUCKET_NAME', 'pma-api-backups')
 S3_BACKUPS_DIR_PATH = 'database/backups/'
 S3_DATASETS_DIR_PATH = 'datasets/versions/'
 S3_UI_DATA_DIR_PATH = 'ui/versions/'
+# Endpoint of an S3-compatible service to use instead of AWS, e.g. for tests
+AWS_S3_ENDPOINT_URL: str = os.getenv('AWS_S3_ENDPOINT_URL') or None
+# Size of parts of multipart transfers, and parts transferred in parallel
+S3_TRANSFER_PART_BYTES = \
+    int(os.getenv('S3_TRANSFER_PART_BYTES', 8 * 1024 * 1024))
+S3_TRANSFER_CONCURRENCY = int(os.getenv('S3_TRANSFER_CONCURRENCY', 10))
+# Age of local index of objects on AWS S3, in CLOUD_INDEX_PATH, after which
+# it is refreshed
+CLOUD_INDEX_TTL_SECONDS = int(os.getenv('CLOUD_INDEX_TTL_SECONDS', 5 * 60))
+# Largest dataset file accepted for upload, and size of chunks it is uploaded
+# in. Each chunk is forwarded to AWS S3 as a part, so must be at least 5 MiB.
+UPLOAD_MAX_BYTES = int(os.getenv('UPLOAD_MAX_BYTES', 256 * 1024 * 1024))
+UPLOAD_CHUNK_BYTES = S3_TRANSFER_PART_BYTES
+# Time after which an interrupted upload is aborted, if not resumed
+UPLOAD_MAX_IDLE_SECONDS = 24 * 60 * 60
 
 SQLALCHEMY_MODEL_ATTR_QUERY_IGNORES = ('_sa_instance_state', )
 LOCAL_DEVELOPMENT_URL: str = os.getenv(
     'LOCAL_DEVELOPMENT_URL', 'http://localhost:5000')
 ASYNC_SECONDS_BETWEEN_STATUS_CHECKS = 5
+# Task progress is published to clients streaming it at most this often, and
+# written to the result backend, for clients polling it, at most this often
+TASK_PROGRESS_PUBLISH_SECONDS = 0.25
+TASK_PROGRESS_BACKEND_SECONDS = 5
+# Task progress may be streamed to clients, rather than polled. Each stream
+# holds a web worker while open, so enable only where workers are
+# asynchronous, e.g. served by 'gunicorn --worker-class gevent'
+TASK_PROGRESS_STREAMING = \
+    os.getenv('TASK_PROGRESS_STREAMING', 'false').lower() == 'true'
+# Streams of task progress send a comment when otherwise idle this long, so
+# that proxies keep them open, and end after this long, to be reconnected
+# by the client: within gunicorn's default timeout of sync workers
+TASK_PROGRESS_HEARTBEAT_SECONDS = 10
+TASK_PROGRESS_STREAM_MAX_SECONDS = 25
+# Time latest task progress is kept for clients which connect late
+TASK_PROGRESS_SNAPSHOT_SECONDS = 24 * 60 * 60
+# Lock of a task is taken over if its holder has not renewed its lease for
+# this long, e.g. if its worker is frozen or unreachable
+TASK_LOCK_LEASE_SECONDS = int(os.getenv('TASK_LOCK_LEASE_SECONDS', 2 * 60))
+# Number of most requested cache keys to regenerate after dataset activation
+CACHE_WARM_UP_SIZE = 100
+CACHE_ACCESS_FLUSH_SECONDS = 60
+# Number of cache records kept, the least recently accessed evicted beyond it
+CACHE_MAX_RECORDS = int(os.getenv('CACHE_MAX_RECORDS', 10000))
+# Number of most recently used parsed workbooks to keep in
+# PARSED_WORKBOOKS_DIR
+PARSED_WORKBOOKS_KEEP = 10
+# Number of processes preparing data worksheets for upload in parallel
+DATA_SHEET_WORKERS = int(os.getenv('DATA_SHEET_WORKERS', os.cpu_count() or 1))
+# Number of database connections loading data in parallel, on Postgres
+DATA_LOAD_CONNECTIONS = int(os.getenv('DATA_LOAD_CONNECTIONS', 4))
+# Postgres schemas of dataset tables: read by the API, and being loaded
+DATASET_SCHEMA = 'pma_api_dataset'
+SHADOW_DATASET_SCHEMA = 'pma_api_dataset_shadow'
+# Replaced dataset schemas are kept, renamed with this prefix and a timestamp
+DATASET_SNAPSHOT_SCHEMA_PREFIX = 'pma_api_snapshot_'
+DATASET_SNAPSHOTS_KEEP = int(os.getenv('DATASET_SNAPSHOTS_KEEP', 2))
+# Size of dataset files to keep in DATASET_STORE_DIR, least recently used
+# evicted first, but not if used in the last DATASET_STORE_MIN_IDLE_SECONDS
+DATASET_STORE_MAX_BYTES = \
+    int(os.getenv('DATASET_STORE_MAX_BYTES', 1024 * 1024 * 1024))
+DATASET_STORE_MIN_IDLE_SECONDS = 60 * 60
+# Number of processes dumping and restoring table data in parallel, with
+# pg_dump and pg_restore. Local backups are directories, as pg_dump can only
+# dump in parallel to those.
+BACKUP_JOBS = int(os.getenv('BACKUP_JOBS', min(os.cpu_count() or 1, 4)))
+# Time spent on data of each table, per backup and restore
+BACKUP_TIMINGS_LOG_PATH = os.path.join(LOGS_DIR, 'backup-timings.log')
 
 # CELERY_QUEUE is also specified in makefile
 CELERY_QUEUE = 'pma-api-{}'.format(ENV_NAME)
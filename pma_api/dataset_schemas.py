@@ -0,0 +1,365 @@
+"""Blue/green activation of datasets, using Postgres schemas.
+
+Dataset tables are read from the live dataset schema, which every connection
+has first in its search path, followed by 'public', where tables shared by
+all datasets (e.g. 'task') are. A new dataset is loaded into a shadow schema
+meanwhile, and once loaded and cached, swapped in by renaming schemas in one
+short transaction. Reads never block on, or see, a dataset being loaded.
+
+The schema swapped out is kept as a snapshot, renamed with a timestamp, so
+that rolling back is swapping it back in. Snapshots make backing up before
+activating unnecessary; off-box backups can be taken afterwards instead.
+
+Only Postgres is supported. Elsewhere, datasets are loaded in place.
+"""
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterable, Iterator, List
+
+from flask import Flask
+from sqlalchemy import Table, event, text
+from sqlalchemy.engine import Connection
+
+from pma_api.config import DATASET_SCHEMA, SHADOW_DATASET_SCHEMA, \
+    DATASET_SNAPSHOT_SCHEMA_PREFIX, DATASET_SNAPSHOTS_KEEP
+from pma_api.error import PmaApiDbInteractionError
+
+
+def is_supported() -> bool:
+    """Are datasets loaded into a shadow schema?
+
+    Returns:
+        bool: True if using Postgres
+    """
+    from pma_api.models import db
+
+    return db.engine.dialect.name == 'postgresql'
+
+
+def search_path_statement(schema: str) -> str:
+    """Get statement setting search path to schema, followed by 'public'
+
+    Args:
+        schema (str): Schema
+
+    Returns:
+        str: SQL statement
+    """
+    return 'SET search_path TO "{}", public'.format(schema)
+
+
+def install(app: Flask):
+    """Make connections of app read dataset tables from the live schema
+
+    Until the first dataset is activated, there is no live schema, in which
+    case tables are read from 'public' as before.
+
+    Args:
+        app (Flask): The Flask app
+    """
+    from pma_api.models import db
+
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name != 'postgresql' \
+            or event.contains(engine, 'connect', _set_live_search_path):
+        return
+    event.listen(engine, 'connect', _set_live_search_path, insert=True)
+
+
+def _set_live_search_path(dbapi_connection, _connection_record):
+    """Set search path of a new connection to the live schema
+
+    Args:
+        dbapi_connection: A psycopg2 connection
+        _connection_record: Pool record of connection
+    """
+    autocommit: bool = dbapi_connection.autocommit
+    dbapi_connection.autocommit = True
+    cursor = dbapi_connection.cursor()
+    cursor.execute(search_path_statement(DATASET_SCHEMA))
+    cursor.close()
+    dbapi_connection.autocommit = autocommit
+
+
+def schema_exists(connection: Connection, schema: str) -> bool:
+    """Does schema exist?
+
+    Args:
+        connection (Connection): Database connection
+        schema (str): Schema
+
+    Returns:
+        bool: True if exists
+    """
+    return connection.execute(
+        text('SELECT EXISTS (SELECT 1 FROM pg_namespace '
+             'WHERE nspname = :schema)'), schema=schema).scalar()
+
+
+def create_shared_tables(tables: Iterable[Table]):
+    """Create tables shared by all datasets in 'public', if not existing
+
+    Side effects:
+        - Creates tables
+
+    Args:
+        tables (list(Table)): Tables not in dataset schemas
+    """
+    from pma_api.models import db
+
+    with db.engine.begin() as connection:
+        connection.execute('SET LOCAL search_path TO public')
+        db.metadata.create_all(connection, tables=list(tables))
+
+
+def create_shadow_schema(tables: Iterable[Table]):
+    """Create a new shadow schema, with empty tables
+
+    Any previous shadow schema is dropped.
+
+    Side effects:
+        - Drops and creates schema and tables
+
+    Args:
+        tables (list(Table)): Tables to create in shadow schema
+    """
+    from pma_api.models import db
+
+    with db.engine.begin() as connection:
+        connection.execute('DROP SCHEMA IF EXISTS "{0}" CASCADE;'
+                           'CREATE SCHEMA "{0}";'
+                           .format(SHADOW_DATASET_SCHEMA))
+        connection.execute('SET LOCAL search_path TO "{}"'
+                           .format(SHADOW_DATASET_SCHEMA))
+        db.metadata.create_all(connection, tables=list(tables),
+                               checkfirst=False)
+
+
+def drop_shadow_schema():
+    """Drop shadow schema, if any
+
+    Side effects:
+        - Drops schema and its tables
+    """
+    from pma_api.models import db
+
+    with db.engine.begin() as connection:
+        connection.execute('DROP SCHEMA IF EXISTS "{}" CASCADE'
+                           .format(SHADOW_DATASET_SCHEMA))
+
+
+def copy_into_shadow_schema(table: Table):
+    """Copy all records of a live table into its shadow table
+
+    Sequences of the shadow table are not advanced, so this is only meant
+    for tables without serial columns, e.g. 'cache'. If there is no live
+    table yet, this does nothing.
+
+    Side effects:
+        - Inserts records in shadow table
+
+    Args:
+        table (Table): Table, created in both schemas
+    """
+    from pma_api.models import db
+
+    columns: str = ', '.join('"{}"'.format(x.name) for x in table.columns)
+    with db.engine.begin() as connection:
+        if connection.execute(text('SELECT to_regclass(:table)'),
+                              table=table.name).scalar() is None:
+            return
+        connection.execute(
+            'INSERT INTO "{schema}"."{table}" ({columns}) '
+            'SELECT {columns} FROM "{table}"'
+            .format(schema=SHADOW_DATASET_SCHEMA, table=table.name,
+                    columns=columns))
+
+
+@contextmanager
+def shadow_session() -> Iterator[Connection]:
+    """Make db.session read and write tables of the shadow schema
+
+    Until exiting, sessions are bound to one connection, whose search path
+    has the shadow schema first, followed by 'public'. The shadow schema
+    need not exist yet.
+
+    Side effects:
+        - Removes current session, on entering and exiting
+        - Configures new sessions
+
+    Yields:
+        Connection: Connection sessions are bound to
+    """
+    from pma_api.models import db
+
+    factory = db.session.session_factory
+    default_options: dict = dict(factory.kw)
+    connection: Connection = db.engine.connect()
+    try:
+        with connection.begin():
+            connection.execute(search_path_statement(SHADOW_DATASET_SCHEMA))
+        db.session.remove()
+        # Tables are otherwise bound to the engine, whatever the session bind
+        factory.configure(bind=connection, binds={})
+        yield connection
+    finally:
+        db.session.remove()
+        factory.kw = default_options
+        connection.invalidate()  # not returned to pool with this search path
+        connection.close()
+
+
+def _rename_schema(connection: Connection, schema: str, new_name: str):
+    """Rename schema
+
+    Args:
+        connection (Connection): Database connection
+        schema (str): Schema
+        new_name (str): New name of schema
+    """
+    connection.execute('ALTER SCHEMA "{}" RENAME TO "{}"'
+                       .format(schema, new_name))
+
+
+def new_snapshot_name() -> str:
+    """Get name for a new snapshot schema, timestamped with current time
+
+    Names sort in the order snapshots were taken.
+
+    Returns:
+        str: Schema name
+    """
+    return DATASET_SNAPSHOT_SCHEMA_PREFIX + \
+        datetime.utcnow().strftime('%Y%m%d%H%M%S%f')
+
+
+def snapshot_schemas(connection: Connection) -> List[str]:
+    """Get snapshot schemas, newest first
+
+    Args:
+        connection (Connection): Database connection
+
+    Returns:
+        list(str): Schema names
+    """
+    return [x for x, in connection.execute(
+        text('SELECT nspname FROM pg_namespace '
+             'WHERE left(nspname, length(:prefix)) = :prefix '
+             'ORDER BY nspname DESC'),
+        prefix=DATASET_SNAPSHOT_SCHEMA_PREFIX)]
+
+
+def list_snapshots() -> List[str]:
+    """List dataset snapshots, newest first
+
+    Returns:
+        list(str): Snapshot schema names
+    """
+    from pma_api.models import db
+
+    with db.engine.connect() as connection:
+        return snapshot_schemas(connection)
+
+
+def _snapshot_live_schema(connection: Connection, tables: Iterable[Table]):
+    """Rename live schema to a new snapshot schema
+
+    Until the first dataset is activated, there is no live schema, and
+    dataset tables are in 'public'. In that case, those tables are moved into
+    the snapshot schema instead.
+
+    Args:
+        connection (Connection): Database connection, in a transaction
+        tables (list(Table)): Dataset tables
+    """
+    snapshot: str = new_snapshot_name()
+    if schema_exists(connection, DATASET_SCHEMA):
+        _rename_schema(connection, DATASET_SCHEMA, snapshot)
+        return
+
+    public_tables: List[str] = [
+        x.name for x in tables if connection.execute(
+            text('SELECT to_regclass(:table)'),
+            table='public."{}"'.format(x.name)).scalar() is not None]
+    if not public_tables:
+        return
+    connection.execute('CREATE SCHEMA "{}"'.format(snapshot))
+    for table in public_tables:
+        connection.execute('ALTER TABLE public."{}" SET SCHEMA "{}"'
+                           .format(table, snapshot))
+
+
+def prune_snapshots(keep: int = DATASET_SNAPSHOTS_KEEP):
+    """Drop all but the newest snapshot schemas
+
+    Side effects:
+        - Drops schemas
+
+    Args:
+        keep (int): Number of snapshots to keep
+    """
+    from pma_api.models import db
+
+    for schema in list_snapshots()[keep:]:
+        with db.engine.begin() as connection:
+            connection.execute('DROP SCHEMA "{}" CASCADE'.format(schema))
+
+
+def activate_shadow_schema(tables: Iterable[Table], lock=None):
+    """Swap shadow schema in as the live schema
+
+    The live dataset is kept as a snapshot, so that it can be swapped back
+    in. Snapshots but the newest are then dropped.
+
+    Side effects:
+        - Renames schemas
+        - Drops snapshot schemas
+
+    Args:
+        tables (list(Table)): Dataset tables
+        lock (TaskLock): Lock of the task swapping the schema in, if any,
+        checked to be still held in the transaction renaming schemas
+
+    Raises:
+        PmaApiTaskLockLostError: If lock was taken over by another task
+    """
+    from pma_api.models import db
+
+    with db.engine.begin() as connection:
+        if lock:
+            lock.assert_held(connection)
+        _snapshot_live_schema(connection, tables)
+        _rename_schema(connection, SHADOW_DATASET_SCHEMA, DATASET_SCHEMA)
+    prune_snapshots()
+
+
+def activate_snapshot(snapshot: str = None):
+    """Swap a snapshot back in as the live schema, to roll back
+
+    The live schema is kept as a new snapshot in turn, so that rolling back
+    to the newest snapshot can be undone by doing so again.
+
+    Side effects:
+        - Renames schemas
+
+    Args:
+        snapshot (str): Name of snapshot schema. Defaults to the newest.
+
+    Raises:
+        PmaApiDbInteractionError: If there is no such snapshot
+    """
+    from pma_api.models import db
+
+    with db.engine.begin() as connection:
+        snapshots: List[str] = snapshot_schemas(connection)
+        if snapshot is None and snapshots:
+            snapshot = snapshots[0]
+        if snapshot not in snapshots:
+            raise PmaApiDbInteractionError(
+                'There is no dataset snapshot to roll back to.'
+                if snapshot is None else
+                'There is no dataset snapshot named "{}".'.format(snapshot))
+        if schema_exists(connection, DATASET_SCHEMA):
+            _rename_schema(connection, DATASET_SCHEMA, new_snapshot_name())
+        _rename_schema(connection, snapshot, DATASET_SCHEMA)
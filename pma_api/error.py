@@ -18,6 +18,18 @@ class ExistingDatasetError(PmaApiDbInteractionError):
     """Dataset already exists in db"""
 
 
+class PmaApiDatasetValidationError(PmaApiDbInteractionError):
+    """Dataset failed validation, before anything was loaded"""
+
+    def __init__(self, *args: str, violations: list = None, **kwargs):
+        self.violations: list = violations or []
+        super().__init__(*args, **kwargs)
+
+
+class PmaApiUploadError(PmaApiException):
+    """Upload rejected, e.g. as too large or not a dataset file"""
+
+
 class PmaApiTaskDenialError(PmaApiException):
     """Task denial exception"""
     msg = 'There is currently a task actively running. A request to start a ' \
@@ -28,3 +40,7 @@ class PmaApiTaskDenialError(PmaApiException):
             super().__init__(*args, **kwargs)
         else:
             super().__init__(PmaApiTaskDenialError.msg, **kwargs)
+
+
+class PmaApiTaskLockLostError(PmaApiException):
+    """Task lost its lock, e.g. as another task took over its lease"""
@@ -0,0 +1,166 @@
+"""Cross-process invalidation of in-process caches.
+
+When a dataset is activated, e.g. by a Celery worker, the md5 of the new API
+data is published over Postgres NOTIFY. Each web worker listens for it on a
+background thread, and calls back anything subscribed, so that in-process
+caches can be dropped.
+
+While a worker is not listening, e.g. when not using Postgres, or while
+reconnecting, `is_listening()` is False, and in-process caches should not be
+relied upon.
+"""
+import logging
+import select
+import threading
+from time import sleep
+from typing import Callable, List
+
+from flask import Flask
+from sqlalchemy import text
+
+CHANNEL = 'pma_api_dataset_activated'
+SECONDS_BETWEEN_POLLS = 60
+SECONDS_BETWEEN_RECONNECTS = 5
+
+subscribers: List[Callable[[str], None]] = []
+_listening = threading.Event()
+_listener_lock = threading.Lock()
+_listener: threading.Thread = None
+
+
+def subscribe(callback: Callable[[str], None]) -> Callable[[str], None]:
+    """Subscribe to dataset activation
+
+    Can be used as a decorator.
+
+    Args:
+        callback (Callable): Function called with md5 of the activated API
+        data. It is also called with None whenever notifications may have
+        been missed.
+
+    Returns:
+        Callable: The callback
+    """
+    subscribers.append(callback)
+
+    return callback
+
+
+def notify_subscribers(md5: str = None):
+    """Call back all subscribers
+
+    Args:
+        md5 (str): md5 of the activated API data, if known
+    """
+    for callback in subscribers:
+        try:
+            callback(md5)
+        except Exception as err:
+            logging.error('Cache invalidation callback {} failed: {}'
+                          .format(callback.__name__, err))
+
+
+def publish(md5: str = None):
+    """Publish dataset activation to all workers
+
+    The notification is sent in its own transaction. Subscribers in the
+    current process are called back directly.
+
+    Args:
+        md5 (str): md5 of the activated API data. If not supplied, that of the
+        current API data.
+    """
+    from pma_api.models import db, ApiMetadata
+
+    if md5 is None:
+        api_data = ApiMetadata.get_current_api_data()
+        md5 = api_data.md5_checksum if api_data else ''
+    if db.engine.dialect.name == 'postgresql':
+        with db.engine.begin() as connection:
+            connection.execute(text('SELECT pg_notify(:channel, :md5)'),
+                               channel=CHANNEL, md5=md5)
+    notify_subscribers(md5)
+
+
+def is_listening() -> bool:
+    """Is this process listening for dataset activation?
+
+    Returns:
+        bool: True if listening
+    """
+    return _listening.is_set()
+
+
+def start_listener(app: Flask):
+    """Start listening for dataset activation on a background thread
+
+    Only Postgres is supported; otherwise, this does nothing. Only one
+    listener is started per process.
+
+    Args:
+        app (Flask): The Flask app
+    """
+    global _listener
+    from pma_api.models import db
+
+    with app.app_context():
+        if db.engine.dialect.name != 'postgresql':
+            return
+    with _listener_lock:
+        if _listener and _listener.is_alive():
+            return
+        _listener = threading.Thread(
+            target=_listen, args=(app,), name='pma-api-invalidation',
+            daemon=True)
+        _listener.start()
+
+
+def _listen(app: Flask):
+    """Listen for dataset activation, reconnecting whenever disconnected
+
+    Args:
+        app (Flask): The Flask app
+    """
+    from pma_api.models import db
+
+    with app.app_context():
+        engine = db.engine
+    while True:
+        try:
+            connection = engine.raw_connection()
+            connection.detach()  # not returned to the pool
+            connection.connection.autocommit = True
+            try:
+                connection.cursor().execute('LISTEN ' + CHANNEL)
+                _listening.set()
+                # Anything cached before now may have missed a notification
+                notify_subscribers()
+                _poll(connection.connection)
+            finally:
+                _listening.clear()
+                connection.close()
+        except Exception as err:
+            logging.error('Cache invalidation listener disconnected: {}'
+                          .format(err))
+        notify_subscribers()
+        sleep(SECONDS_BETWEEN_RECONNECTS)
+
+
+def _poll(connection):
+    """Wait for notifications, calling back subscribers for each
+
+    Args:
+        connection: A psycopg2 connection, which is listening
+
+    Raises:
+        psycopg2.Error: If the connection is lost
+    """
+    while True:
+        if select.select([connection], [], [], SECONDS_BETWEEN_POLLS) \
+                == ([], [], []):
+            connection.cursor().execute('SELECT 1')  # detect lost connection
+            continue
+        connection.poll()
+        while connection.notifies:
+            notification = connection.notifies.pop(0)
+            notify_subscribers(notification.payload)
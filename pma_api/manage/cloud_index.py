@@ -0,0 +1,293 @@
+"""Local index of objects on AWS S3, e.g. dataset files.
+
+Listing objects with their metadata takes a request per object, so the
+listing of each prefix is kept in an index file: the name, size, entity tag,
+md5 checksum where known, modification time, owner and metadata of each
+object. Once older than CLOUD_INDEX_TTL_SECONDS, it is refreshed
+incrementally: objects are listed, and metadata is requested only of those
+new or changed since. Uploads and deletes through this API update it
+directly.
+
+Readers are served the index as it is while it is refreshed in the
+background, so only the first listing of a prefix waits on AWS S3.
+
+Example usage:
+    datasets = list_objects(S3_DATASETS_DIR_PATH)
+"""
+import json
+import os
+import threading
+from time import time
+from typing import Dict, List
+
+from pma_api.config import CLOUD_INDEX_PATH, CLOUD_INDEX_TTL_SECONDS, \
+    AWS_S3_STORAGE_BUCKETNAME as BUCKET
+from pma_api.manage import s3_transfer
+
+Entry = Dict[str, object]
+
+_index_lock = threading.Lock()  # of index file, within process
+_refresh_locks: Dict[str, threading.Lock] = {}  # by prefix
+
+
+def load_index(path: str = CLOUD_INDEX_PATH) -> Dict[str, Dict]:
+    """Load index
+
+    Args:
+        path (str): Path to index file
+
+    Returns:
+        dict(str, dict): Time 'refreshed', and 'objects' by key, by prefix
+    """
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_index(index: Dict[str, Dict], path: str = CLOUD_INDEX_PATH):
+    """Save index
+
+    The file is written under a temporary name and then renamed, so that an
+    incomplete index is never loaded.
+
+    Side effects:
+        - Makes directory (if doesn't exist)
+        - Writes file
+
+    Args:
+        index (dict(str, dict)): Index
+        path (str): Path to index file
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path: str = '{}.{}.{}.tmp'.format(
+        path, os.getpid(), threading.get_ident())
+    with open(temp_path, 'w') as file:
+        json.dump(index, file)
+    os.replace(temp_path, path)
+
+
+def update_index(prefix: str, objects: Dict[str, Entry] = None,
+                 refreshed: float = None, put: Entry = None,
+                 remove: str = None, path: str = CLOUD_INDEX_PATH):
+    """Update listing of a prefix in index, leaving those of others as saved
+
+    Side effects:
+        - Writes file
+
+    Args:
+        prefix (str): Prefix of keys of objects
+        objects (dict(str, dict)): Objects by key, replacing those listed,
+        except those recorded as uploaded since refresh began
+        refreshed (float): Time refresh began
+        put (dict): Object to add or replace
+        remove (str): Key of object to remove
+        path (str): Path to index file
+    """
+    with _index_lock:
+        index: Dict[str, Dict] = load_index(path)
+        listing: Dict = index.setdefault(prefix, {'objects': {}})
+        if objects is not None:
+            listing['objects'] = {
+                **{k: v for k, v in listing['objects'].items()
+                   if v.get('recorded', 0) > (refreshed or 0)},
+                **objects}
+        if refreshed is not None:
+            listing['refreshed'] = refreshed
+        if put:
+            listing['objects'][put['key']] = put
+        if remove:
+            listing['objects'].pop(remove, None)
+        save_index(index, path)
+
+
+def etag_md5(etag: str) -> str:
+    """Get md5 checksum of object from entity tag, if it is that
+
+    Args:
+        etag (str): Entity tag
+
+    Returns:
+        str: md5 checksum, or None if uploaded in parts
+    """
+    etag = etag.strip('"')
+
+    return None if '-' in etag else etag
+
+
+def fetch_entry(key: str, owner: str = '', bucket: str = BUCKET) -> Entry:
+    """Get entry of an object, requesting its metadata
+
+    Args:
+        key (str): Key of object
+        owner (str): Display name of owner of object, if listed
+        bucket (str): Bucket
+
+    Raises:
+        botocore.exceptions.ClientError: If there is no such object
+
+    Returns:
+        dict: Entry
+    """
+    head: Dict = s3_transfer.client().head_object(Bucket=bucket, Key=key)
+
+    return {
+        'key': key,
+        'name': os.path.basename(key),
+        'size': head['ContentLength'],
+        'etag': head['ETag'].strip('"'),
+        'md5': etag_md5(head['ETag']),
+        'last_modified': head['LastModified'].timestamp(),
+        'owner': owner,
+        'metadata': head['Metadata']}
+
+
+def refresh(prefix: str, bucket: str = BUCKET, path: str = CLOUD_INDEX_PATH) \
+        -> Dict[str, Entry]:
+    """Refresh listing of a prefix
+
+    Metadata is requested only of objects new or changed since the last
+    refresh.
+
+    Side effects:
+        - Writes file
+
+    Args:
+        prefix (str): Prefix of keys of objects
+        bucket (str): Bucket
+        path (str): Path to index file
+
+    Returns:
+        dict(str, dict): Objects by key
+    """
+    refreshed: float = time()
+    known: Dict[str, Entry] = \
+        load_index(path).get(prefix, {}).get('objects', {})
+    objects: Dict[str, Entry] = {}
+    pages = s3_transfer.client().get_paginator('list_objects_v2').paginate(
+        Bucket=bucket, Prefix=prefix, FetchOwner=True)
+    for page in pages:
+        for obj in page.get('Contents', []):
+            key: str = obj['Key']
+            entry: Entry = known.get(key)
+            if not entry or entry['etag'] != obj['ETag'].strip('"') \
+                    or entry['size'] != obj['Size']:
+                entry = fetch_entry(
+                    key, obj.get('Owner', {}).get('DisplayName', ''), bucket)
+            objects[key] = entry
+    update_index(prefix, objects=objects, refreshed=refreshed, path=path)
+
+    return objects
+
+
+def refresh_in_background(prefix: str, bucket: str = BUCKET,
+                          path: str = CLOUD_INDEX_PATH):
+    """Refresh listing of a prefix in a thread, unless one already is
+
+    Side effects:
+        - Writes file, from a thread
+
+    Args:
+        prefix (str): Prefix of keys of objects
+        bucket (str): Bucket
+        path (str): Path to index file
+    """
+    lock: threading.Lock = \
+        _refresh_locks.setdefault(prefix, threading.Lock())
+    if not lock.acquire(blocking=False):
+        return
+
+    def run():
+        """Refresh, then release lock"""
+        # noinspection PyBroadException
+        try:
+            refresh(prefix, bucket, path)
+        except Exception:
+            pass  # index is left as it is, and refreshed when next read
+        finally:
+            lock.release()
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def list_objects(prefix: str, max_age: float = CLOUD_INDEX_TTL_SECONDS,
+                 bucket: str = BUCKET, path: str = CLOUD_INDEX_PATH) \
+        -> List[Entry]:
+    """Get objects listed under prefix
+
+    If the listing is older than max_age, it is returned as it is, and
+    refreshed in the background. Only if it has never been listed is it
+    refreshed first.
+
+    Side effects:
+        - Writes file (if refreshed)
+
+    Args:
+        prefix (str): Prefix of keys of objects
+        max_age (float): Seconds after which listing is refreshed. If 0,
+        it is refreshed first.
+        bucket (str): Bucket
+        path (str): Path to index file
+
+    Returns:
+        list(dict): Entries of objects
+    """
+    listing: Dict = load_index(path).get(prefix, {})
+    if 'refreshed' not in listing or not max_age:
+        return list(refresh(prefix, bucket, path).values())
+    if time() - listing['refreshed'] > max_age:
+        refresh_in_background(prefix, bucket, path)
+
+    return list(listing['objects'].values())
+
+
+def indexed_prefixes(key: str, path: str = CLOUD_INDEX_PATH) -> List[str]:
+    """Get prefixes listed in index that a key is under
+
+    Args:
+        key (str): Key of object
+        path (str): Path to index file
+
+    Returns:
+        list(str): Prefixes
+    """
+    return [x for x in load_index(path) if key.startswith(x)]
+
+
+def record_upload(key: str, md5: str = None, bucket: str = BUCKET,
+                  path: str = CLOUD_INDEX_PATH):
+    """Add object uploaded to listings of index it is under, if any
+
+    Side effects:
+        - Writes file
+
+    Args:
+        key (str): Key of object
+        md5 (str): md5 checksum of object, if known. It is otherwise only
+        known if the object was uploaded in one part.
+        bucket (str): Bucket
+        path (str): Path to index file
+    """
+    prefixes: List[str] = indexed_prefixes(key, path)
+    if not prefixes:
+        return
+    entry: Entry = fetch_entry(key, bucket=bucket)
+    entry['md5'] = md5 or entry['md5']
+    entry['recorded'] = time()
+    for prefix in prefixes:
+        update_index(prefix, put=entry, path=path)
+
+
+def record_delete(key: str, path: str = CLOUD_INDEX_PATH):
+    """Remove object deleted from listings of index it is under, if any
+
+    Side effects:
+        - Writes file
+
+    Args:
+        key (str): Key of object
+        path (str): Path to index file
+    """
+    for prefix in indexed_prefixes(key, path):
+        update_index(prefix, remove=key, path=path)
@@ -0,0 +1,261 @@
+"""Differences between two versions of a dataset.
+
+Worksheets are read column by column, from the parsed workbook cache, and
+rows are aligned on their natural key: 'code' for metadata worksheets,
+English text and language for translations, and survey, indicator and
+characteristics for data points, across all data worksheets. Rows are then
+reported as added, removed, or changed, with the values which changed.
+Numbers are compared with a tolerance, as workbooks saved by different
+software may round them differently.
+
+Example usage:
+    with Workbook(old_path) as old, Workbook(new_path) as new:
+        diff = diff_workbooks(old, new)
+"""
+import os
+import re
+from math import isclose
+from typing import Dict, List, Tuple
+
+from pma_api.config import IGNORE_FIELD_PREFIX
+from pma_api.manage.db_mgmt import ORDERED_METADATA_SHEET_MODEL_MAP, \
+    download_dataset, get_datasheet_names
+from pma_api.manage.validation import DATA_POINT_KEY, is_empty
+from pma_api.manage.workbook import Workbook
+
+Key = Tuple
+Row = Dict[str, object]
+
+# Columns rows of worksheets are aligned on
+SHEET_KEYS: Dict[str, Tuple[str, ...]] = {
+    **{x: ('code',) for x in ORDERED_METADATA_SHEET_MODEL_MAP},
+    'translation': ('english', 'language_code')}
+REL_TOLERANCE = 1e-9
+ABS_TOLERANCE = 1e-9
+
+
+def normalized(value):
+    """Normalize cell value for comparison
+
+    Args:
+        value: Cell value
+
+    Returns:
+        Value, or None if empty
+    """
+    return None if is_empty(value) else value
+
+
+def values_equal(old, new, rel_tol: float = REL_TOLERANCE,
+                 abs_tol: float = ABS_TOLERANCE) -> bool:
+    """Are cell values equal, numbers within tolerance?
+
+    Args:
+        old: Normalized cell value
+        new: Normalized cell value
+        rel_tol (float): Relative tolerance of numbers
+        abs_tol (float): Absolute tolerance of numbers
+
+    Returns:
+        bool: True if equal
+    """
+    if isinstance(old, (int, float)) and isinstance(new, (int, float)):
+        return isclose(old, new, rel_tol=rel_tol, abs_tol=abs_tol)
+
+    return old == new
+
+
+def keyed_rows(columns: Dict[str, List], key: Tuple[str, ...]) \
+        -> Dict[Key, Row]:
+    """Get rows of worksheet by key
+
+    Columns with the ignore prefix are left out.
+
+    Args:
+        columns (dict(str, list)): Cell values by header, excluding header
+        key (tuple(str)): Columns rows are keyed by
+
+    Returns:
+        dict(tuple, dict): Normalized cell values by header, by key. Rows
+        with an empty key are left out.
+    """
+    headers: List[str] = [x for x in columns if x not in key]
+    headers = [x for x in headers
+               if not str(x).startswith(IGNORE_FIELD_PREFIX)]
+    keys = zip(*(columns[x] for x in key))
+    rows = zip(*(columns[x] for x in headers))
+
+    return {tuple(normalized(x) for x in k): dict(zip(headers, (
+        normalized(x) for x in row)))
+        for k, row in zip(keys, rows) if any(not is_empty(x) for x in k)}
+
+
+def diff_rows(old: Dict[Key, Row], new: Dict[Key, Row],
+              key: Tuple[str, ...], rel_tol: float = REL_TOLERANCE,
+              abs_tol: float = ABS_TOLERANCE) -> Dict[str, List[Dict]]:
+    """Diff rows aligned on key
+
+    Args:
+        old (dict(tuple, dict)): Old rows by key
+        new (dict(tuple, dict)): New rows by key
+        key (tuple(str)): Columns rows are keyed by
+        rel_tol (float): Relative tolerance of numbers
+        abs_tol (float): Absolute tolerance of numbers
+
+    Returns:
+        dict(str, list): Keys of rows 'added' and 'removed', and keys of
+        rows 'changed', with old and new values of each changed column
+    """
+    changed: List[Dict] = []
+    for k in old.keys() & new.keys():
+        old_row, new_row = old[k], new[k]
+        changes: Dict[str, Dict] = {
+            x: {'old': old_row.get(x), 'new': new_row.get(x)}
+            for x in sorted(old_row.keys() | new_row.keys())
+            if not values_equal(old_row.get(x), new_row.get(x),
+                                rel_tol, abs_tol)}
+        if changes:
+            changed.append({**dict(zip(key, k)), 'changes': changes})
+
+    return {
+        'added': [dict(zip(key, k)) for k in new.keys() - old.keys()],
+        'removed': [dict(zip(key, k)) for k in old.keys() - new.keys()],
+        'changed': changed}
+
+
+def data_points(wb: Workbook) -> Dict[Key, Row]:
+    """Get data points of all data worksheets, by natural key
+
+    Args:
+        wb (Workbook): API data workbook
+
+    Returns:
+        dict(tuple, dict): Normalized cell values by header, by survey,
+        indicator and characteristic codes
+    """
+    rows: Dict[Key, Row] = {}
+    for sheet in get_datasheet_names(wb):
+        _, columns = wb.sheet_by_name(sheet).columns()
+        rows.update(keyed_rows(columns, DATA_POINT_KEY))
+
+    return rows
+
+
+def sheet_rows(wb: Workbook, sheet: str) -> Dict[Key, Row]:
+    """Get rows of a worksheet other than data, by natural key
+
+    Args:
+        wb (Workbook): API data workbook
+        sheet (str): Worksheet name
+
+    Returns:
+        dict(tuple, dict): Normalized cell values by header, by key. Empty
+        if there is no such worksheet.
+    """
+    if sheet not in wb.sheet_names():
+        return {}
+    _, columns = wb.sheet_by_name(sheet).columns()
+
+    return keyed_rows(columns, SHEET_KEYS[sheet])
+
+
+def sort_rows(rows: List[Dict]) -> List[Dict]:
+    """Sort rows of a diff, for stable output
+
+    Args:
+        rows (list(dict)): Rows, by key column
+
+    Returns:
+        list(dict): Rows
+    """
+    return sorted(rows, key=lambda x: [
+        (v is not None, str(v)) for k, v in x.items() if k != 'changes'])
+
+
+def diff_workbooks(old: Workbook, new: Workbook,
+                   rel_tol: float = REL_TOLERANCE,
+                   abs_tol: float = ABS_TOLERANCE) -> Dict:
+    """Diff two versions of a dataset
+
+    Args:
+        old (Workbook): Old API data workbook
+        new (Workbook): New API data workbook
+        rel_tol (float): Relative tolerance of numbers
+        abs_tol (float): Absolute tolerance of numbers
+
+    Returns:
+        dict: Diff of each worksheet, or of all data worksheets as 'data';
+        number of rows added, removed and changed in each; and codes of
+        surveys and indicators of which data points differ, as 'affected'
+    """
+    sheets: Dict[str, Dict[str, List[Dict]]] = {
+        x: diff_rows(sheet_rows(old, x), sheet_rows(new, x), key,
+                     rel_tol, abs_tol)
+        for x, key in SHEET_KEYS.items()}
+    sheets['data'] = diff_rows(data_points(old), data_points(new),
+                               DATA_POINT_KEY, rel_tol, abs_tol)
+    for diff in sheets.values():
+        for change, rows in diff.items():
+            diff[change] = sort_rows(rows)
+
+    data_rows: List[Dict] = [x for rows in sheets['data'].values()
+                             for x in rows]
+
+    return {
+        'old': {'name': os.path.basename(old.path), 'md5': old.md5},
+        'new': {'name': os.path.basename(new.path), 'md5': new.md5},
+        'summary': {sheet: {change: len(rows)
+                            for change, rows in diff.items()}
+                    for sheet, diff in sheets.items()},
+        'affected': {
+            'survey': sorted({x['survey_code'] for x in data_rows}),
+            'indicator': sorted({x['indicator_code'] for x in data_rows})},
+        'sheets': sheets}
+
+
+def active_dataset_version() -> int:
+    """Get version number of the active dataset
+
+    Returns:
+        int: Version number, or None if there is no active dataset, or its
+        name has no version
+    """
+    from pma_api.models import ApiMetadata
+
+    api_data: ApiMetadata = ApiMetadata.get_current_api_data()
+    version: List[str] = \
+        re.findall(r'-v([0-9]+)$', api_data.name) if api_data else []
+
+    return int(version[0]) if version else None
+
+
+def diff_datasets(new: str, old: str = None) -> Dict:
+    """Diff two versions of a dataset, downloading them if need be
+
+    Side effects:
+        - Downloads dataset files from AWS S3, if not in local dataset store
+
+    Args:
+        new (str): Version number of new dataset, or path to its file
+        old (str): Version number of old dataset, or path to its file.
+        Defaults to the active dataset.
+
+    Raises:
+        FileNotFoundError: If a dataset is not found
+
+    Returns:
+        dict: Diff. See `diff_workbooks()`.
+    """
+    if old is None:
+        old = active_dataset_version()
+        if old is None:
+            raise FileNotFoundError('There is no active dataset to diff.')
+    datasets: List[str] = [str(old), str(new)]
+    for dataset in datasets:
+        if not os.path.isfile(dataset) and not dataset.isdigit():
+            raise FileNotFoundError(
+                'There is no dataset file or version "{}".'.format(dataset))
+    paths: List[str] = [x if os.path.isfile(x) else download_dataset(int(x))
+                        for x in datasets]
+    with Workbook(paths[0]) as old_wb, Workbook(paths[1]) as new_wb:
+        return diff_workbooks(old_wb, new_wb)
@@ -0,0 +1,225 @@
+"""Local store of dataset files, keyed by md5 checksum.
+
+Dataset files downloaded from AWS S3 are kept in a directory per checksum,
+under their own name, along with an index of the name and checksum of each
+dataset version, so that a version downloaded before is served from disk.
+Files are verified against their checksum whenever served, and removed if
+corrupt. The least recently used files are evicted once the store exceeds its
+size bound, but not while they may still be in use.
+
+Example usage:
+    path = lookup(version_number)
+    if not path:
+        path = add(download(...), version_number)
+"""
+import json
+import os
+import re
+import shutil
+from time import time
+from typing import Dict, List
+
+from pma_api.config import DATASET_STORE_DIR, DATASET_STORE_MAX_BYTES, \
+    DATASET_STORE_MIN_IDLE_SECONDS
+from pma_api.manage.workbook import file_md5, remember_file_md5
+
+INDEX_FILENAME = 'index.json'
+INCOMING_DIRNAME = 'incoming'
+MD5_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+
+def load_index(store_dir: str = DATASET_STORE_DIR) -> Dict[str, Dict]:
+    """Load index of dataset versions
+
+    Args:
+        store_dir (str): Directory of store
+
+    Returns:
+        dict(str, dict): 'name' and 'md5' of file, by version number
+    """
+    try:
+        with open(os.path.join(store_dir, INDEX_FILENAME)) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_index(index: Dict[str, Dict], store_dir: str = DATASET_STORE_DIR):
+    """Save index of dataset versions
+
+    The file is written under a temporary name and then renamed, so that an
+    incomplete index is never loaded.
+
+    Side effects:
+        - Writes file
+
+    Args:
+        index (dict(str, dict)): 'name' and 'md5' of file, by version number
+        store_dir (str): Directory of store
+    """
+    path: str = os.path.join(store_dir, INDEX_FILENAME)
+    temp_path: str = '{}.{}.tmp'.format(path, os.getpid())
+    with open(temp_path, 'w') as file:
+        json.dump(index, file)
+    os.replace(temp_path, path)
+
+
+def incoming_dir(store_dir: str = DATASET_STORE_DIR) -> str:
+    """Get directory to download files into, before adding them
+
+    Each process has its own, so that concurrent downloads of a file do not
+    clobber one another.
+
+    Side effects:
+        - Creates directory
+
+    Args:
+        store_dir (str): Directory of store
+
+    Returns:
+        str: Path to directory
+    """
+    path: str = os.path.join(store_dir, INCOMING_DIRNAME, str(os.getpid()))
+    os.makedirs(path, exist_ok=True)
+
+    return path
+
+
+def verified_path(md5: str, name: str,
+                  store_dir: str = DATASET_STORE_DIR) -> str:
+    """Get path of a stored file, if intact, marking it as recently used
+
+    Side effects:
+        - Updates modification time of directory of file
+        - Removes file, if corrupt
+
+    Args:
+        md5 (str): md5 checksum of file
+        name (str): Name of file
+        store_dir (str): Directory of store
+
+    Returns:
+        str: Path to file, or None if not stored or corrupt
+    """
+    entry_dir: str = os.path.join(store_dir, md5)
+    path: str = os.path.join(entry_dir, name)
+    if not os.path.isfile(path):
+        return None
+    if file_md5(path) != md5:
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        return None
+    os.utime(entry_dir)
+
+    return path
+
+
+def lookup(version_number: int, store_dir: str = DATASET_STORE_DIR) -> str:
+    """Get path of a stored dataset version
+
+    Args:
+        version_number (int): Version number of dataset
+        store_dir (str): Directory of store
+
+    Returns:
+        str: Path to file, or None if not stored or corrupt
+    """
+    entry: Dict = load_index(store_dir).get(str(version_number))
+    if not entry:
+        return None
+
+    return verified_path(entry['md5'], entry['name'], store_dir)
+
+
+def add(path: str, version_number: int,
+        store_dir: str = DATASET_STORE_DIR) -> str:
+    """Move a downloaded dataset file into store
+
+    Side effects:
+        - Moves file
+        - Updates index
+        - Evicts least recently used files, if store exceeds its size bound
+
+    Args:
+        path (str): Path to file, e.g. in `incoming_dir()`
+        version_number (int): Version number of dataset
+        store_dir (str): Directory of store
+
+    Returns:
+        str: Path to file in store
+    """
+    md5: str = file_md5(path)  # memoized, if checksummed while downloaded
+    name: str = os.path.basename(path)
+    entry_dir: str = os.path.join(store_dir, md5)
+    os.makedirs(entry_dir, exist_ok=True)
+    stored_path: str = os.path.join(entry_dir, name)
+    os.replace(path, stored_path)
+    remember_file_md5(stored_path, md5)
+
+    index: Dict[str, Dict] = load_index(store_dir)
+    index[str(version_number)] = {'name': name, 'md5': md5}
+    save_index(index, store_dir)
+    prune(store_dir)
+
+    return stored_path
+
+
+def forget(version_number: int, store_dir: str = DATASET_STORE_DIR):
+    """Remove dataset version from index, e.g. once deleted from storage
+
+    The file is left to be evicted, as other versions may have the same
+    checksum.
+
+    Side effects:
+        - Updates index
+
+    Args:
+        version_number (int): Version number of dataset
+        store_dir (str): Directory of store
+    """
+    index: Dict[str, Dict] = load_index(store_dir)
+    if index.pop(str(version_number), None):
+        save_index(index, store_dir)
+
+
+def dir_size(path: str) -> int:
+    """Get total size of files in directory
+
+    Args:
+        path (str): Path to directory
+
+    Returns:
+        int: Size in bytes
+    """
+    return sum(os.path.getsize(os.path.join(path, x))
+               for x in os.listdir(path))
+
+
+def prune(store_dir: str = DATASET_STORE_DIR,
+          max_bytes: int = DATASET_STORE_MAX_BYTES,
+          min_idle_seconds: int = DATASET_STORE_MIN_IDLE_SECONDS):
+    """Evict least recently used files, until store is within size bound
+
+    Files used recently are never evicted, as they may still be in use, e.g.
+    by a dataset being activated.
+
+    Side effects:
+        - Removes directories
+
+    Args:
+        store_dir (str): Directory of store
+        max_bytes (int): Size bound of store
+        min_idle_seconds (int): Time since last use, before a file may be
+        evicted
+    """
+    entry_dirs: List[str] = [os.path.join(store_dir, x)
+                             for x in os.listdir(store_dir)
+                             if MD5_PATTERN.match(x)]
+    entry_dirs.sort(key=os.path.getmtime, reverse=True)
+    size: int = 0  # of files kept
+    for entry_dir in entry_dirs:
+        entry_size: int = dir_size(entry_dir)
+        if size + entry_size > max_bytes \
+                and time() - os.path.getmtime(entry_dir) > min_idle_seconds:
+            shutil.rmtree(entry_dir, ignore_errors=True)
+        else:
+            size += entry_size
@@ -0,0 +1,572 @@
+"""Uploads of dataset files to AWS S3, streamed as they are received.
+
+Files are uploaded to the admin portal in chunks, and each chunk is
+forwarded to AWS S3 as one part of a multipart upload as soon as it is
+received, so that no more than a chunk of a file is held in memory, and none
+of it written to disk. The name, version and size of a file are checked
+before its first chunk is forwarded, the type of file by its first bytes,
+and each chunk against the size and offset declared. AWS S3 checks each part
+against the md5 checksum of the chunk as received.
+
+The md5 checksum of the file is computed as its chunks are received, in
+order, by the process receiving them. If they were not all received in
+order by one process, e.g. as the upload was resumed, the file is read back
+from AWS S3 once complete instead.
+
+Chunks may be retried, and interrupted uploads resumed: the multipart upload
+of each file is recorded in UPLOADS_DIR under the id the client gave it, and
+parts already received are listed by AWS S3, so that the client need send
+only the others. Uploads idle for longer than UPLOAD_MAX_IDLE_SECONDS are
+aborted.
+
+Files not sent in chunks, e.g. as smaller than one, are streamed to AWS S3
+in parts likewise.
+
+Example usage:
+    url = receive_chunk(upload_id, filename, index, data, ...)
+    if url:
+        ...  # all chunks received
+"""
+import json
+import os
+import re
+import threading
+from base64 import b64encode
+from hashlib import md5
+from time import time
+from typing import BinaryIO, Dict, List, Tuple
+
+from pma_api.config import ACCEPTED_DATASET_EXTENSIONS as EXTENSIONS, \
+    AWS_S3_STORAGE_BUCKETNAME as BUCKET, S3_DATASETS_DIR_PATH, UPLOADS_DIR, \
+    UPLOAD_MAX_BYTES, UPLOAD_MAX_IDLE_SECONDS
+from pma_api.error import ExistingDatasetError, PmaApiDbInteractionError, \
+    PmaApiUploadError
+from pma_api.manage import cloud_index, s3_transfer
+from pma_api.manage.db_mgmt import list_cloud_datasets
+from pma_api.models import Dataset
+
+DEFAULT_EXTENSION = 'xlsx'
+# First bytes of files of each type: xlsx files are zip archives, and xls
+# files compound documents
+FILE_SIGNATURES: Dict[str, bytes] = {
+    'xlsx': b'PK\x03\x04',
+    'xls': b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'}
+MIN_PART_BYTES = 5 * 1024 * 1024  # but for the last part
+UPLOAD_ID_PATTERN = re.compile(r'^[0-9A-Za-z-]{1,64}$')
+
+_checksums_lock = threading.Lock()
+# Number of chunks added, in order, and checksum, by upload id
+_checksums: Dict[str, Tuple[int, s3_transfer.S3Checksum]] = {}
+
+
+def filename_with_ext(filename: str) -> str:
+    """Get file name, with default extension if it has none accepted
+
+    Args:
+        filename (str): File name
+
+    Returns:
+        str: File name
+    """
+    has_ext: bool = any(filename.endswith('.' + x) for x in EXTENSIONS)
+
+    return filename if has_ext else filename + '.' + DEFAULT_EXTENSION
+
+
+def file_url(filename: str) -> str:
+    """Get url of dataset file on AWS S3
+
+    Args:
+        filename (str): File name
+
+    Returns:
+        str: Url
+    """
+    return 'https://{bucket}.s3.amazonaws.com/{path}{object}'.format(
+        bucket=BUCKET,
+        path=S3_DATASETS_DIR_PATH,
+        object=filename)
+
+
+def check_dataset(filename: str, size: int = None) -> Dict[str, str]:
+    """Check dataset file may be uploaded, before receiving it
+
+    Args:
+        filename (str): File name, with extension
+        size (int): Size of file in bytes, if known
+
+    Raises:
+        PmaApiUploadError: If file is too large, or its name has no version
+        ExistingDatasetError: If dataset version already exists
+
+    Returns:
+        dict(str, str): Metadata of object to upload file to
+    """
+    if size is not None and size > UPLOAD_MAX_BYTES:
+        raise PmaApiUploadError(
+            'File is {} bytes, but may be at most {} bytes.'.format(
+                size, UPLOAD_MAX_BYTES))
+    try:
+        dataset = Dataset(filename)
+    except (IndexError, ValueError):
+        raise PmaApiUploadError(
+            'File name "{}" does not have a dataset version, e.g. '
+            '"api_data-2019.01.01-v1.xlsx".'.format(filename))
+
+    uploaded_versions: List[int] = \
+        [int(x['version_number']) for x in list_cloud_datasets(max_age=0)]
+    if dataset.version_number in uploaded_versions:
+        raise ExistingDatasetError(
+            'ExistingDatasetError: Dataset version "{}" already exists.'
+            .format(str(dataset.version_number)))
+
+    return {
+        'dataset_display_name': dataset.dataset_display_name,
+        'version_number': str(dataset.version_number),
+        'dataset_type': dataset.dataset_type}
+
+
+def check_signature(filename: str, data: bytes):
+    """Check first bytes of file are of its type
+
+    Args:
+        filename (str): File name, with extension
+        data (bytes): First bytes of file
+
+    Raises:
+        PmaApiUploadError: If they are not
+    """
+    ext: str = filename.rsplit('.', 1)[-1]
+    signature: bytes = FILE_SIGNATURES.get(ext, b'')
+    if not data.startswith(signature):
+        raise PmaApiUploadError(
+            'File "{}" is not a valid .{} file.'.format(filename, ext))
+
+
+class CheckedReader:
+    """Reader of an uploaded file, checking it as it is read.
+
+    The type of file is checked by its first bytes, and its size against
+    UPLOAD_MAX_BYTES.
+    """
+
+    def __init__(self, stream: BinaryIO, filename: str,
+                 max_bytes: int = UPLOAD_MAX_BYTES):
+        """Initialize
+
+        Args:
+            stream (BinaryIO): Stream, opened for reading
+            filename (str): File name, with extension
+            max_bytes (int): Largest size of file
+        """
+        self.stream: BinaryIO = stream
+        self.filename: str = filename
+        self.max_bytes: int = max_bytes
+        self.size: int = 0
+
+    def read(self, size: int = -1) -> bytes:
+        """Read data from stream, checking it
+
+        Args:
+            size (int): Number of bytes to read, or -1 for all
+
+        Raises:
+            PmaApiUploadError: If file is not of its type, or too large
+
+        Returns:
+            bytes: Data
+        """
+        data: bytes = self.stream.read(size)
+        if not self.size:
+            check_signature(self.filename, data)
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            raise PmaApiUploadError(
+                'File may be at most {} bytes.'.format(self.max_bytes))
+
+        return data
+
+
+def upload_stream(filename: str, stream: BinaryIO) -> str:
+    """Upload dataset file not sent in chunks, streaming it in parts
+
+    Side effects:
+        - Uploads to cloud
+        - Adds file to local index of cloud objects
+
+    Args:
+        filename (str): File name
+        stream (BinaryIO): File, opened for reading
+
+    Raises:
+        PmaApiUploadError: If file may not be uploaded
+        ExistingDatasetError: If dataset version already exists
+
+    Returns:
+        str: Url where file is stored
+    """
+    filename: str = filename_with_ext(filename)
+    metadata: Dict[str, str] = check_dataset(filename)
+    key: str = S3_DATASETS_DIR_PATH + filename
+    md5_checksum: str = s3_transfer.upload_stream(
+        CheckedReader(stream, filename), key, metadata)
+    cloud_index.record_upload(key, md5=md5_checksum)
+
+    return file_url(filename)
+
+
+def state_path(upload_id: str) -> str:
+    """Get path to record of a chunked upload
+
+    Args:
+        upload_id (str): Id client gave upload
+
+    Raises:
+        PmaApiUploadError: If id is not valid
+
+    Returns:
+        str: Path
+    """
+    if not UPLOAD_ID_PATTERN.match(upload_id):
+        raise PmaApiUploadError('Upload id "{}" is not valid.'
+                                .format(upload_id))
+
+    return os.path.join(UPLOADS_DIR, upload_id + '.json')
+
+
+def load_state(upload_id: str) -> Dict:
+    """Load record of a chunked upload
+
+    Args:
+        upload_id (str): Id client gave upload
+
+    Returns:
+        dict: Record, or None if there is no such upload
+    """
+    try:
+        with open(state_path(upload_id)) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def save_state(upload_id: str, state: Dict):
+    """Save record of a chunked upload
+
+    Side effects:
+        - Makes directory (if doesn't exist)
+        - Writes file
+
+    Args:
+        upload_id (str): Id client gave upload
+        state (dict): Record
+    """
+    path: str = state_path(upload_id)
+    os.makedirs(UPLOADS_DIR, exist_ok=True)
+    temp_path: str = '{}.{}.tmp'.format(path, os.getpid())
+    with open(temp_path, 'w') as file:
+        json.dump(state, file)
+    os.replace(temp_path, path)
+
+
+def abort(upload_id: str):
+    """Abort a chunked upload, discarding parts received
+
+    Side effects:
+        - Aborts multipart upload to cloud
+        - Removes record of upload
+
+    Args:
+        upload_id (str): Id client gave upload
+    """
+    with _checksums_lock:
+        _checksums.pop(upload_id, None)
+    state: Dict = load_state(upload_id)
+    if not state:
+        return
+    s3_transfer.client().abort_multipart_upload(
+        Bucket=BUCKET, Key=state['key'], UploadId=state['s3_upload_id'])
+    os.remove(state_path(upload_id))
+
+
+def prune(max_idle_seconds: int = UPLOAD_MAX_IDLE_SECONDS):
+    """Abort chunked uploads idle for too long
+
+    Side effects:
+        - Aborts multipart uploads to cloud
+        - Removes records of uploads
+
+    Args:
+        max_idle_seconds (int): Time since last chunk was received, before
+        upload is aborted
+    """
+    if not os.path.isdir(UPLOADS_DIR):
+        return
+    for filename in os.listdir(UPLOADS_DIR):
+        path: str = os.path.join(UPLOADS_DIR, filename)
+        if filename.endswith('.json') \
+                and time() - os.path.getmtime(path) > max_idle_seconds:
+            # noinspection PyBroadException
+            try:
+                abort(filename[:-len('.json')])
+            except Exception:
+                os.remove(path)  # upload already gone from cloud
+    with _checksums_lock:
+        for upload_id in list(_checksums):
+            if not os.path.exists(state_path(upload_id)):
+                del _checksums[upload_id]
+
+
+def add_to_checksum(upload_id: str, index: int, data: bytes,
+                    chunk_bytes: int):
+    """Add chunk received to md5 checksum of file, if next in order
+
+    A chunk received again is skipped. Once one is received out of order,
+    the checksum is dropped, for the file to be read back instead.
+
+    Side effects:
+        - Updates checksum kept in memory
+
+    Args:
+        upload_id (str): Id client gave upload
+        index (int): Index of chunk, from 0
+        data (bytes): Chunk
+        chunk_bytes (int): Size of each chunk but the last
+    """
+    with _checksums_lock:
+        added, checksum = _checksums.get(upload_id) or \
+            (0, s3_transfer.S3Checksum(part_bytes=chunk_bytes))
+        if index < added:
+            return
+        if index > added:
+            _checksums.pop(upload_id, None)
+            return
+        checksum.update(data)
+        _checksums[upload_id] = (added + 1, checksum)
+
+
+def file_checksum(upload_id: str, state: Dict) -> s3_transfer.S3Checksum:
+    """Take md5 checksum of file of a chunked upload, if of all chunks
+
+    Side effects:
+        - Removes checksum kept in memory
+
+    Args:
+        upload_id (str): Id client gave upload
+        state (dict): Record of upload
+
+    Returns:
+        S3Checksum: Checksum, or None if not all chunks were added
+    """
+    with _checksums_lock:
+        added, checksum = _checksums.pop(upload_id, (0, None))
+
+    return checksum if added == state['total_chunks'] else None
+
+
+def start(upload_id: str, filename: str, total_bytes: int,
+          total_chunks: int, chunk_bytes: int) -> Dict:
+    """Start a chunked upload, unless already started
+
+    Side effects:
+        - Starts multipart upload to cloud
+        - Writes record of upload
+        - Aborts chunked uploads idle for too long
+
+    Args:
+        upload_id (str): Id client gave upload
+        filename (str): File name, with extension
+        total_bytes (int): Size of file
+        total_chunks (int): Number of chunks
+        chunk_bytes (int): Size of each chunk but the last
+
+    Raises:
+        PmaApiUploadError: If file may not be uploaded, or upload was started
+        for another
+        ExistingDatasetError: If dataset version already exists
+
+    Returns:
+        dict: Record of upload
+    """
+    state: Dict = load_state(upload_id)
+    if state and state['filename'] != filename:
+        raise PmaApiUploadError('Upload "{}" is of another file.'
+                                .format(upload_id))
+    if state:
+        return state
+
+    metadata: Dict[str, str] = check_dataset(filename, total_bytes)
+    if total_chunks > 1 and chunk_bytes < MIN_PART_BYTES:
+        raise PmaApiUploadError('Chunks must be at least {} bytes.'
+                                .format(MIN_PART_BYTES))
+    if total_chunks != max(1, -(-total_bytes // chunk_bytes)):
+        raise PmaApiUploadError('Number of chunks does not match file size.')
+    prune()
+
+    key: str = S3_DATASETS_DIR_PATH + filename
+    response: Dict = s3_transfer.client().create_multipart_upload(
+        Bucket=BUCKET, Key=key, Metadata=metadata)
+    state: Dict = {
+        'key': key,
+        's3_upload_id': response['UploadId'],
+        'filename': filename,
+        'total_bytes': total_bytes,
+        'total_chunks': total_chunks,
+        'chunk_bytes': chunk_bytes}
+    save_state(upload_id, state)
+
+    return state
+
+
+def received_parts(state: Dict) -> Dict[int, Dict]:
+    """Get parts of a chunked upload received by AWS S3
+
+    Args:
+        state (dict): Record of upload
+
+    Returns:
+        dict(int, dict): 'PartNumber', 'ETag' and 'Size' of each part, by
+        part number
+    """
+    pages = s3_transfer.client().get_paginator('list_parts').paginate(
+        Bucket=BUCKET, Key=state['key'], UploadId=state['s3_upload_id'])
+
+    return {x['PartNumber']: x for page in pages
+            for x in page.get('Parts', [])}
+
+
+def status(upload_id: str) -> Dict:
+    """Get status of a chunked upload, e.g. to resume it
+
+    Args:
+        upload_id (str): Id client gave upload
+
+    Raises:
+        PmaApiUploadError: If there is no such upload
+
+    Returns:
+        dict: File name, number of chunks, and indexes of those received
+    """
+    state: Dict = load_state(upload_id)
+    if not state:
+        raise PmaApiUploadError('There is no upload "{}" in progress.'
+                                .format(upload_id))
+
+    return {
+        'filename': state['filename'],
+        'total_chunks': state['total_chunks'],
+        'received': sorted(x - 1 for x in received_parts(state))}
+
+
+def complete(upload_id: str, state: Dict) -> str:
+    """Complete a chunked upload, if all chunks were received
+
+    Side effects:
+        - Completes multipart upload to cloud
+        - Reads file back from cloud, if its checksum was not computed as
+        it was received
+        - Removes record of upload
+        - Adds file to local index of cloud objects
+
+    Args:
+        upload_id (str): Id client gave upload
+        state (dict): Record of upload
+
+    Raises:
+        PmaApiUploadError: If chunks are missing, or of the wrong size
+        PmaApiDbInteractionError: If checksum of file does not match, in
+        which case it is deleted
+
+    Returns:
+        str: Url where file is stored
+    """
+    parts: Dict[int, Dict] = received_parts(state)
+    missing: List[int] = [x for x in range(state['total_chunks'])
+                          if x + 1 not in parts]
+    if missing:
+        raise PmaApiUploadError(
+            'Chunks {} of upload "{}" were not received.'.format(
+                ', '.join(str(x) for x in missing), upload_id))
+    if sum(x['Size'] for x in parts.values()) != state['total_bytes']:
+        raise PmaApiUploadError('Size of file received does not match.')
+
+    checksum: s3_transfer.S3Checksum = file_checksum(upload_id, state)
+    response: Dict = s3_transfer.client().complete_multipart_upload(
+        Bucket=BUCKET, Key=state['key'], UploadId=state['s3_upload_id'],
+        MultipartUpload={'Parts': [
+            {'PartNumber': k, 'ETag': parts[k]['ETag']}
+            for k in sorted(parts)]})
+    os.remove(state_path(upload_id))
+    if checksum and not checksum.matches(response['ETag']):
+        s3_transfer.client().delete_object(Bucket=BUCKET, Key=state['key'])
+        raise PmaApiDbInteractionError(
+            'Checksum of file uploaded to AWS S3 does not match.\n'
+            '- File uploaded: ' + state['key'])
+    md5_checksum: str = checksum.hexdigest() if checksum \
+        else s3_transfer.object_md5(state['key'])
+    cloud_index.record_upload(state['key'], md5=md5_checksum)
+
+    return file_url(state['filename'])
+
+
+def receive_chunk(upload_id: str, filename: str, index: int, data: bytes,
+                  offset: int, chunk_bytes: int, total_bytes: int,
+                  total_chunks: int) -> str:
+    """Receive a chunk of a file, forwarding it to AWS S3 as a part
+
+    Chunks may be sent again, e.g. if a request failed. Once the last is
+    received, the file is complete.
+
+    Side effects:
+        - Uploads part to cloud
+        - Adds chunk to md5 checksum of file
+        - Starts or completes upload
+
+    Args:
+        upload_id (str): Id client gave upload
+        filename (str): File name
+        index (int): Index of chunk, from 0
+        data (bytes): Chunk
+        offset (int): Offset of chunk in file
+        chunk_bytes (int): Size of each chunk but the last
+        total_bytes (int): Size of file
+        total_chunks (int): Number of chunks
+
+    Raises:
+        PmaApiUploadError: If file may not be uploaded, or chunk is not as
+        declared
+        ExistingDatasetError: If dataset version already exists
+        PmaApiDbInteractionError: If checksum of file does not match, in
+        which case it is deleted
+        botocore.exceptions.ClientError: If cloud storage fails
+
+    Returns:
+        str: Url where file is stored, if complete, else None
+    """
+    filename: str = filename_with_ext(filename)
+    state: Dict = start(upload_id, filename, total_bytes, total_chunks,
+                        chunk_bytes)
+    last: bool = index == state['total_chunks'] - 1
+    expected_bytes: int = state['total_bytes'] - offset if last \
+        else state['chunk_bytes']
+    if not 0 <= index < state['total_chunks'] \
+            or offset != index * state['chunk_bytes'] \
+            or len(data) != expected_bytes:
+        raise PmaApiUploadError(
+            'Chunk {} of upload "{}" is not of the size or offset declared.'
+            .format(index, upload_id))
+    if index == 0:
+        try:
+            check_signature(filename, data)
+        except PmaApiUploadError:
+            abort(upload_id)
+            raise
+
+    s3_transfer.client().upload_part(
+        Bucket=BUCKET, Key=state['key'], UploadId=state['s3_upload_id'],
+        PartNumber=index + 1, Body=data,
+        ContentMD5=b64encode(md5(data).digest()).decode())
+    add_to_checksum(upload_id, index, data, state['chunk_bytes'])
+    os.utime(state_path(upload_id))  # not idle
+
+    return complete(upload_id, state) if last else None
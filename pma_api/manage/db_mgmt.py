@@ -4,38 +4,44 @@ import glob
 import logging
 import ntpath
 import os
-import subprocess
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from copy import copy
-from datetime import datetime
-from typing import List, Dict, Union, Iterable
+from datetime import datetime, timezone
+from io import StringIO
+from typing import List, Dict, Tuple, Union, Iterable
 
-import boto3
-import xlrd
 from xlrd.sheet import Sheet
 from xlrd.book import Book
 import sqlalchemy
 from flask import Flask, current_app
 from flask_user import UserManager
-from sqlalchemy import Table
+from sqlalchemy import Table, text
 # noinspection PyProtectedMember
 from sqlalchemy.engine import Connection
 from sqlalchemy.exc import OperationalError, IntegrityError, DatabaseError
 
 from pma_api import create_app
 from pma_api.config import DATA_DIR, BACKUPS_DIR, Config, \
-    IGNORE_SHEET_PREFIX, DATA_SHEET_PREFIX, AWS_S3_STORAGE_BUCKETNAME as \
-    BUCKET, S3_BACKUPS_DIR_PATH, S3_DATASETS_DIR_PATH, S3_UI_DATA_DIR_PATH, \
-    UI_DATA_DIR, DATASETS_DIR, API_DATASET_FILE_PREFIX as API_PREFIX, \
+    AWS_S3_STORAGE_BUCKETNAME as BUCKET, S3_BACKUPS_DIR_PATH, \
+    S3_DATASETS_DIR_PATH, S3_UI_DATA_DIR_PATH, UI_DATA_DIR, DATASETS_DIR, \
+    DATA_LOAD_CONNECTIONS, \
+    API_DATASET_FILE_PREFIX as API_PREFIX, \
     UI_DATASET_FILE_PREFIX as UI_PREFIX, HEROKU_INSTANCE_APP_NAME as APP_NAME,\
-    FILE_LIST_IGNORES, TEMP_DIR
+    FILE_LIST_IGNORES, TEMP_DIR, BACKUP_JOBS, CLOUD_INDEX_TTL_SECONDS
 from pma_api.error import PmaApiDbInteractionError, PmaApiException
 from pma_api.models import db, Cache, Characteristic, CharacteristicGroup, \
     Task, Country, Data, EnglishString, Geography, Indicator, ApiMetadata, \
     Survey, Translation, Dataset, User
-from pma_api.utils import most_common
+from pma_api.models.api_base import prune_ignored_fields
+from pma_api.models.string import StringInterner
+from pma_api.utils import CodeAllocator
 from pma_api.manage.utils import log_process_stderr, run_proc, \
     _get_bin_path_from_ref_config
+from pma_api.manage import cloud_index, dataset_store, pg_archive, \
+    s3_transfer
+from pma_api.manage.transforms import transform_columns
+from pma_api.manage.workbook import Workbook, Worksheet, sheet_rows
 
 # Sorted in order should be executed
 ORDERED_METADATA_SHEET_MODEL_MAP = OrderedDict({  # str,db.Model
@@ -51,6 +57,8 @@ DATASET_WB_SHEET_MODEL_MAP = {
     **ORDERED_METADATA_SHEET_MODEL_MAP,
     **{'data': Data},
     **{'translation': Translation}}
+# Unlogged table data is loaded into in parallel, on Postgres
+DATA_STAGING_TABLE = 'datum_staging'
 root_connection_info = {
     'hostname': Config.DB_ROOT_HOST,
     'port': Config.DB_ROOT_PORT,
@@ -220,72 +228,19 @@ def init_from_source(path, model):
         db.session.commit()
 
 
-def remove_stata_undefined_token_from_wb(wb: xlrd.book.Book):
-    """Remove all instances of Stata undefined token '.' from wb
-
-    Args:
-        wb (xlrd.book.Book): workbook object
-
-    Returns:
-        xlrd.book.Book: Formatted workbook
-    """
-    numeric_types = (int, float, complex)
-    field_types_to_format = (x.__name__ for x in numeric_types)
-    book = copy(wb)
-    sheet_names = [x for x in book.sheet_names()
-                   if not str(x).startswith(IGNORE_SHEET_PREFIX)]
-    data_sheet_names = [x for x in sheet_names
-                        if str(x).startswith(DATA_SHEET_PREFIX)]
-    sheets = [book.sheet_by_name(x) for x in data_sheet_names]
-
-    # For de-bug purposes
-    # noinspection PyUnusedLocal
-    none_in_field_vals = False
-    # noinspection PyUnusedLocal
-    empty_in_field_vals = False
-
-    for sheet in sheets:
-        for i in range(sheet.ncols):
-            col = sheet.col(i)
-            # field_name = col[0].value  # For de-bug
-
-            field_vals = [x.value for x in col[1:] if x.value]
-            sample_size = 50
-            sample = field_vals[:sample_size]
-            sample_types = [type(x).__name__ for x in sample]
-            if len(sample_types) > 0:
-                most_common_type = most_common(sample_types)
-            else:
-                most_common_type = None
-            field_data_type = most_common_type
-
-            # modify wb.sheet.col
-            if field_data_type in field_types_to_format:
-                for cell in col:
-                    if cell.value == '.':
-                        # TODO: Will this do the trick?
-                        cell.value = None
-
-            # For de-bug purposes
-            if None in field_vals:
-                # noinspection PyUnusedLocal
-                none_in_field_vals = True
-            if '' in field_vals:
-                # noinspection PyUnusedLocal
-                empty_in_field_vals = True
-
-    return book
-
-
-def commit_from_sheet(ws: Sheet, model: db.Model, **kwargs):
-    """Initialize DB table data from XLRD Worksheet.
+def commit_from_sheet(ws: Union[Worksheet, Sheet], model: db.Model,
+                      interner: StringInterner = None, **kwargs):
+    """Initialize DB table data from worksheet.
 
     Initialize table data from source data associated with corresponding
-    data model.
+    data model. English strings of all rows are interned in bulk first, and
+    records are then inserted in one batch, and committed once.
 
     Args:
-        ws (xlrd.sheet.Sheet): XLRD worksheet object.
+        ws (Union[Worksheet, xlrd.sheet.Sheet]): Worksheet object.
         model (class): SqlAlchemy model class.
+        interner (StringInterner): Interner of English strings, e.g. shared
+        by all worksheets of a dataset. Defaults to a new one.
     """
     survey, indicator, characteristic = '', '', ''
     if model == Data:
@@ -293,9 +248,9 @@ def commit_from_sheet(ws: Sheet, model: db.Model, **kwargs):
         indicator = kwargs['indicator']
         characteristic = kwargs['characteristic']
     header = None
+    rows: List[Tuple[list, Dict]] = []
 
-    for i, row in enumerate(ws.get_rows()):
-        row = [r.value for r in row]
+    for i, row in enumerate(sheet_rows(ws)):
         if i == 0:
             header = row
         else:
@@ -313,8 +268,17 @@ def commit_from_sheet(ws: Sheet, model: db.Model, **kwargs):
                 char2_code = row_dict.get('char2_code')
                 char2_id = characteristic.get(char2_code)
                 row_dict['char2_id'] = char2_id
+            rows.append((row, row_dict))
+
+    interner: StringInterner = interner or StringInterner()
+    if hasattr(model, 'english_strings'):
+        interner.intern(x for _, row_dict in rows
+                        for x in model.english_strings(row_dict))
+    records: List[db.Model] = []
+    with interner:
+        for i, (row, row_dict) in enumerate(rows, 2):
             try:
-                record = model(**row_dict)
+                records.append(model(**row_dict))
             except (DatabaseError, ValueError, AttributeError, KeyError,
                     IntegrityError, Exception) as err:
                 msg = 'Error when processing data import.\n' \
@@ -323,38 +287,372 @@ def commit_from_sheet(ws: Sheet, model: db.Model, **kwargs):
                       '- Cell values: {}\n\n' \
                       '- Original Error:\n' + \
                       type(err).__name__ + ': ' + str(err)
-                msg = msg.format(ws.name, i + 1, row)
+                msg = msg.format(ws.name, i, row)
                 logging.error(msg)
                 raise PmaApiDbInteractionError(msg)
 
-            db.session.add(record)
+    db.session.bulk_save_objects(records)
+    db.session.commit()
+
+
+def data_sheet_record(row_dict: Dict, survey: Dict[str, int],
+                      indicator: Dict[str, int],
+                      characteristic: Dict[str, int]) -> Dict:
+    """Convert a data worksheet row into a 'datum' table record
+
+    Does what initializing a Data model instance does, without the
+    database: prunes ignored fields, resolves codes to foreign keys,
+    converts empty strings to None and coerces values to column types. The
+    record code is not set.
+
+    Args:
+        row_dict (dict): Row cell values by header
+        survey (dict): Survey ids by code
+        indicator (dict): Indicator ids by code
+        characteristic (dict): Characteristic ids by code
+
+    Raises:
+        KeyError: If a required code did not resolve
+        TypeError: If a header is not a column
+        ValueError: If a value cannot be coerced to its column type
+
+    Returns:
+        dict: Column values by column name, for all columns but 'id' and
+        'code'
+    """
+    kwargs: Dict = dict(row_dict)
+    prune_ignored_fields(kwargs)
+    kwargs['is_total'] = bool(kwargs['is_total'])
+    for code_key, id_key, code_ids, table, required in (
+            ('survey_code', 'survey_id', survey, 'survey', True),
+            ('indicator_code', 'indicator_id', indicator, 'indicator', True),
+            ('char1_code', 'char1_id', characteristic, 'characteristic',
+             False),
+            ('char2_code', 'char2_id', characteristic, 'characteristic',
+             False)):
+        code = kwargs.pop(code_key, None)
+        fk_id = kwargs.pop(id_key, None)
+        if fk_id != '' and fk_id is not None:
+            kwargs[id_key] = fk_id
+        elif (code == '' or code is None) and not required:
+            kwargs[id_key] = None
+        elif code in code_ids:
+            kwargs[id_key] = code_ids[code]
+        else:
+            msg = 'No record with code "{}" in "{}"'.format(code, table)
+            raise KeyError(msg)
+
+    columns: Dict[str, sqlalchemy.Column] = \
+        {x.name: x for x in Data.__table__.columns}
+    for key in kwargs:
+        if key not in columns or key in ('id', 'code'):
+            raise TypeError('"{}" is an invalid keyword argument for Data'
+                            .format(key))
+
+    record: Dict = {}
+    for name, column in columns.items():
+        if name in ('id', 'code'):
+            continue
+        value = kwargs.get(name)
+        if value == '' or value is None:
+            record[name] = None
+        elif column.type.python_type is int:
+            number = float(value)
+            if not number.is_integer():
+                raise ValueError('"{}" is not an integer, for column "{}"'
+                                 .format(value, name))
+            record[name] = int(number)
+        else:
+            record[name] = column.type.python_type(value)
+
+    return record
+
+
+def prepare_data_sheet(wb_path: str, sheetname: str, **kwargs) \
+        -> Tuple[Dict[str, List], List[tuple], List[Dict]]:
+    """Parse data worksheet into records ready to insert
+
+    Worksheet columns are run through the pre-insert transforms first. This
+    needs no application or database, so that data worksheets can be
+    prepared in parallel in other processes.
+
+    Args:
+        wb_path (str): Path to workbook file
+        sheetname (str): Name of worksheet containing data
+        **kwargs: Ids by code for 'survey', 'indicator' and 'characteristic'.
+        See `data_sheet_record()`.
+
+    Raises:
+        PmaApiDbInteractionError: If a row could not be converted
+
+    Returns:
+        dict(str, list), list(tuple), list(dict): Column values by column
+        name, for all columns but 'id' and 'code', in row order; natural key
+        of each record, from which its code is derived; and reports of the
+        pre-insert transforms
+    """
+    with Workbook(wb_path) as wb:
+        header, sheet_columns = wb.sheet_by_name(sheetname).columns()
+    sheet_columns, reports = transform_columns(sheetname, sheet_columns)
+
+    columns: Dict[str, List] = {}
+    keys: List[tuple] = []
+    for i, row in enumerate(zip(*sheet_columns.values())):
+        row_dict: Dict = dict(zip(sheet_columns.keys(), row))
+        keys.append(Data.natural_key(row_dict))
+        try:
+            record: Dict = data_sheet_record(row_dict=row_dict, **kwargs)
+        except (ValueError, KeyError, TypeError) as err:
+            msg = 'Error when processing data import.\n' \
+                  '- Worksheet name: {}\n' \
+                  '- Row number: {}\n' \
+                  '- Cell values: {}\n\n' \
+                  '- Original Error:\n' + \
+                  type(err).__name__ + ': ' + str(err)
+            msg = msg.format(sheetname, i + 2, list(row))
+            raise PmaApiDbInteractionError(msg)
+        for name, value in record.items():
+            columns.setdefault(name, []).append(value)
+
+    return columns, keys, reports
 
-    # TODO: After adding FunctionalTask class, is this necessary?
-    # TODO 2019.04.08-jef: This is really not ideal. This exists here because
-    #  every model creates new EnglishString records, and given how we
-    #  currently create and generate unique codes, it appears we /may/ need to
-    #  commit both the original record and the english string record. So,
-    #  for such models, everything will have already been committed, hence
-    #  why we currently run this additional 'commit_needed' step/check.
-    # sheet_rows: int = ws.nrows - 1
-    # db_rows: int = len(model.query.all())
-    # commit_needed: bool = db_rows < sheet_rows
-    # if commit_needed:
-    #     db.session.commit()
 
+def data_records(columns: Dict[str, List], keys: List[tuple],
+                 codes: CodeAllocator) -> Tuple[List[str], List[tuple]]:
+    """Get prepared data worksheet columns as records with codes
 
-def format_book(wb: Book) -> Book:
-    """Format workbook by making edits to prevent edge case errors
+    Record codes are allocated here, in row order, from the natural key of
+    each record, as they must be unique across all data.
 
     Args:
-        wb (xlrd.book.Book): workbook object
+        columns (dict(str, list)): Column values by column name, as returned
+        by `prepare_data_sheet()`
+        keys (list(tuple)): Natural key of each record
+        codes (CodeAllocator): Allocator of codes of all data
 
     Returns:
-        xlrd.book.Book: Formatted workbook
+        list(str), list(tuple): Column names, and records
+    """
+    if not columns:
+        return [], []
+    names: List[str] = list(columns.keys())
+    records: List[tuple] = list(zip(*columns.values()))
+    record_codes: List[str] = codes.allocate(keys)
+
+    return names + ['code'], \
+        [x + (code,) for x, code in zip(records, record_codes)]
+
+
+def insert_data_columns(columns: Dict[str, List], keys: List[tuple],
+                        codes: CodeAllocator):
+    """Insert prepared data worksheet records into the 'datum' table
+
+    Side effects:
+        - Inserts records in current session's transaction
+
+    Args:
+        columns (dict(str, list)): Column values by column name, as returned
+        by `prepare_data_sheet()`
+        keys (list(tuple)): Natural key of each record
+        codes (CodeAllocator): Allocator of codes of all data
     """
-    book: Book = remove_stata_undefined_token_from_wb(wb)
+    names, records = data_records(columns, keys, codes)
+    if records:
+        db.session.execute(Data.__table__.insert(),
+                           [dict(zip(names, x)) for x in records])
+
 
-    return book
+def qualified_table_name(table: str, schema: str = None) -> str:
+    """Get table name, qualified with schema if any
+
+    Args:
+        table (str): Table name
+        schema (str): Schema name
+
+    Returns:
+        str: Table name, to use in SQL statements
+    """
+    return table if not schema else '"{}".{}'.format(schema, table)
+
+
+def create_data_staging_table(engine: sqlalchemy.engine.Engine,
+                              schema: str = None):
+    """Create empty Postgres staging table for the 'datum' table
+
+    The staging table is unlogged, and has the columns of the 'datum' table
+    but 'id', without any constraints or indexes, plus a 'row_order' column.
+    Any previous staging table is dropped.
+
+    Side effects:
+        - Drops and creates table, in its own transaction
+
+    Args:
+        engine (sqlalchemy.engine.Engine): Postgres database engine
+        schema (str): Schema of 'datum' table, to create staging table in.
+        Defaults to the first in the search path.
+    """
+    with engine.begin() as connection:
+        connection.execute(
+            'DROP TABLE IF EXISTS {staging};'
+            'CREATE UNLOGGED TABLE {staging} (LIKE {table});'
+            'ALTER TABLE {staging} DROP COLUMN id;'
+            'ALTER TABLE {staging} ADD COLUMN row_order bigint;'
+            .format(staging=qualified_table_name(DATA_STAGING_TABLE, schema),
+                    table=qualified_table_name(Data.__tablename__, schema)))
+
+
+def stage_data_columns(engine: sqlalchemy.engine.Engine,
+                       columns: Dict[str, List], keys: List[tuple],
+                       codes: CodeAllocator, first_row: int = 0,
+                       n_connections: int = DATA_LOAD_CONNECTIONS,
+                       schema: str = None) -> int:
+    """Load prepared data worksheet records into the staging table
+
+    Records are split into partitions, each of which is copied into the
+    staging table over its own pooled connection, concurrently.
+
+    Side effects:
+        - Inserts records in staging table, committed per partition
+
+    Args:
+        engine (sqlalchemy.engine.Engine): Postgres database engine
+        columns (dict(str, list)): Column values by column name, as returned
+        by `prepare_data_sheet()`
+        keys (list(tuple)): Natural key of each record
+        codes (CodeAllocator): Allocator of codes of all data
+        first_row (int): Order of first record among all records staged
+        n_connections (int): Number of connections to load over
+        schema (str): Schema of staging table. Defaults to the first in the
+        search path.
+
+    Returns:
+        int: Number of records staged
+    """
+    names, records = data_records(columns, keys, codes)
+    if not records:
+        return 0
+    statement: str = 'COPY {} ({}) FROM STDIN WITH (FORMAT csv)'.format(
+        qualified_table_name(DATA_STAGING_TABLE, schema),
+        ', '.join(names + ['row_order']))
+
+    def copy_partition(offset: int):
+        """Copy partition of records starting at offset"""
+        buffer = StringIO()
+        writer = csv.writer(buffer)
+        for i, record in enumerate(
+                records[offset:offset + partition_size], offset):
+            writer.writerow(record + (first_row + i,))
+        buffer.seek(0)
+        connection = engine.raw_connection()
+        try:
+            connection.cursor().copy_expert(statement, buffer)
+            connection.commit()
+        finally:
+            connection.close()
+
+    partition_size: int = -(-len(records) // max(n_connections, 1))
+    offsets = range(0, len(records), partition_size)
+    with ThreadPoolExecutor(max_workers=len(offsets)) as executor:
+        list(executor.map(copy_partition, offsets))  # raises any error
+
+    return len(records)
+
+
+def merge_data_staging_table():
+    """Insert all records of the staging table into the 'datum' table
+
+    Records get ids in the order they were staged. The staging table is
+    dropped afterwards.
+
+    Side effects:
+        - Inserts records and drops staging table, in current session's
+        transaction
+    """
+    names: str = ', '.join(x.name for x in Data.__table__.columns
+                           if x.name != 'id')
+    db.session.execute(
+        'INSERT INTO {table} ({names}) '
+        'SELECT {names} FROM {staging} ORDER BY row_order'
+        .format(table=Data.__tablename__, names=names,
+                staging=DATA_STAGING_TABLE))
+    db.session.execute('DROP TABLE {}'.format(DATA_STAGING_TABLE))
+
+
+def defer_constraints(tables: Iterable[Table]) -> List[str]:
+    """Drop constraints and indexes of Postgres tables, to be built later
+
+    All constraints but primary keys, and all indexes not backing a
+    constraint, are dropped, so that records can be loaded without index
+    maintenance or checks per record.
+
+    Side effects:
+        - Drops constraints and indexes, in current session's transaction
+
+    Args:
+        tables (list(Table)): Tables
+
+    Returns:
+        list(str): Statements to build dropped constraints and indexes, in
+        order: unique, check and exclusion constraints, indexes, and foreign
+        keys last, as these may depend on unique constraints
+    """
+    names: List[str] = [x.name for x in tables]
+    constraints: List[tuple] = db.session.execute(text(
+        'SELECT cls.relname, con.conname, con.contype, '
+        'pg_get_constraintdef(con.oid) '
+        'FROM pg_constraint con '
+        'JOIN pg_class cls ON cls.oid = con.conrelid '
+        'JOIN pg_namespace nsp ON nsp.oid = cls.relnamespace '
+        "WHERE nsp.nspname = current_schema() AND con.contype <> 'p' "
+        'AND cls.relname = ANY(:tables)'), {'tables': names}).fetchall()
+    indexes: List[tuple] = db.session.execute(text(
+        'SELECT idx.tablename, idx.indexname, idx.indexdef '
+        'FROM pg_indexes idx '
+        'WHERE idx.schemaname = current_schema() '
+        'AND idx.tablename = ANY(:tables) '
+        'AND NOT EXISTS (SELECT 1 FROM pg_constraint con '
+        'WHERE con.conindid = to_regclass(quote_ident(idx.indexname)))'),
+        {'tables': names}).fetchall()
+    foreign_keys: List[tuple] = [x for x in constraints if x[2] == 'f']
+    others: List[tuple] = [x for x in constraints if x[2] != 'f']
+
+    for table, name, _, _ in foreign_keys + others:
+        db.session.execute('ALTER TABLE "{}" DROP CONSTRAINT "{}"'
+                           .format(table, name))
+    for _, name, _ in indexes:
+        db.session.execute('DROP INDEX "{}"'.format(name))
+
+    return \
+        ['ALTER TABLE "{}" ADD CONSTRAINT "{}" {}'.format(table, name, x)
+         for table, name, _, x in others] + \
+        [x for _, _, x in indexes] + \
+        ['ALTER TABLE "{}" ADD CONSTRAINT "{}" {}'.format(table, name, x)
+         for table, name, _, x in foreign_keys]
+
+
+def build_deferred_constraints(statements: List[str],
+                               tables: Iterable[Table]):
+    """Build constraints and indexes dropped by `defer_constraints()`
+
+    Each is built in bulk, over all records loaded. Tables are then analyzed,
+    so that the query planner has statistics about them.
+
+    Side effects:
+        - Creates constraints and indexes, and analyzes tables, in current
+        session's transaction, which is then committed
+
+    Args:
+        statements (list(str)): Statements returned by `defer_constraints()`
+        tables (list(Table)): Tables to analyze
+
+    Raises:
+        IntegrityError: If loaded records violate a constraint
+    """
+    for statement in statements:
+        db.session.execute(statement)
+    for table in tables:
+        db.session.execute('ANALYZE "{}"'.format(table.name))
+    db.session.commit()
 
 
 def register_administrative_metadata(wb_path):
@@ -396,18 +694,17 @@ def drop_tables(tables: Iterable[Table] = None):
             db.drop_all()
 
 
-def get_datasheet_names(wb: Book) -> List[str]:
+def get_datasheet_names(wb: Union[Workbook, Book]) -> List[str]:
     """Gets data sheet names from a workbook
 
     Args:
-        wb (Book): Pre-loaded XLRD Workbook obj
+        wb (Union[Workbook, Book]): Workbook obj
 
     Returns:
         list(str): List of datasheet names
     """
-    data_sheets: List[xlrd.sheet] = \
-        [x for x in wb.sheets() if x.name.startswith('data')]
-    datasheet_names: List[str] = [x.name for x in data_sheets]
+    datasheet_names: List[str] = \
+        [x for x in wb.sheet_names() if x.startswith('data')]
 
     return datasheet_names
 
@@ -547,22 +844,15 @@ def backup_local_using_heroku_postgres(
     return path
 
 
-def backup_using_pgdump(path: str = new_backup_path()) -> str:
-    """Backup using pg_dump
-
-    Args:
-        path (str): Path of file to save
+def register_pgpass() -> str:
+    """Register credentials of database in .pgpass file, for pg_dump
 
     Side effects:
         - Grants full permissions to .pgpass file
         - Reads and writes to .pgpass file
-        - Runs pg_dump process, storing result to file system
-
-    Raises:
-        PmaApiDbInteractionError: If errors during process
 
     Returns:
-        str: path to backup file saved
+        str: Path to .pgpass file
     """
     pgpass_url_base = '{hostname}:{port}:{database}:{username}:{password}'
     pgpass_url: str = pgpass_url_base.format(**db_connection_info)
@@ -570,24 +860,107 @@ def backup_using_pgdump(path: str = new_backup_path()) -> str:
     grant_full_permissions_to_file(pgpass_path)
     update_pgpass(path=pgpass_path, creds=pgpass_url)
 
-    cmd_base: str = \
-        'pg_dump --format=custom --host={hostname} --port={port} ' \
-        '--username={username} --dbname={database} --file {path}'
-    cmd: str = cmd_base.format(**db_connection_info, path=path)
-    output: Dict = run_proc(cmd)
+    return pgpass_path
 
-    errors: str = output['stderr']
-    if errors:
-        with open(os.path.expanduser('~/.pgpass'), 'r') as file:
+
+def pgdump_command(path: str = '', jobs: int = 1) -> List[str]:
+    """Get pg_dump command, dumping verbosely
+
+    Args:
+        path (str): Path of directory to dump to. If not given, dumps in
+        custom format to standard output.
+        jobs (int): Number of tables to dump in parallel, if to a directory
+
+    Returns:
+        list(str): Command
+    """
+    cmd: List[str] = [
+        pg_archive.bin_path('pg_dump'), '--verbose',
+        '--host={hostname}'.format(**db_connection_info),
+        '--port={port}'.format(**db_connection_info),
+        '--username={username}'.format(**db_connection_info),
+        '--dbname={database}'.format(**db_connection_info)]
+    if not path:
+        return cmd + ['--format=custom']
+
+    return cmd + ['--format=directory', '--jobs={}'.format(jobs),
+                  '--file={}'.format(path)]
+
+
+def backup_using_pgdump(path: str = '', jobs: int = BACKUP_JOBS) -> str:
+    """Backup using pg_dump
+
+    The backup is a directory, the data of several tables dumped to it in
+    parallel.
+
+    Args:
+        path (str): Path of directory to save, which must not exist.
+        Defaults to a new one, named by time.
+        jobs (int): Number of tables to dump in parallel
+
+    Side effects:
+        - Grants full permissions to .pgpass file
+        - Reads and writes to .pgpass file
+        - Runs pg_dump process, storing result to file system
+        - Records time spent on data of each table
+
+    Raises:
+        PmaApiDbInteractionError: If errors during process
+
+    Returns:
+        str: path to backup directory saved
+    """
+    path: str = path or new_backup_path()
+    pgpass_path: str = register_pgpass()
+    try:
+        timings: Dict = pg_archive.run(pgdump_command(path, jobs), jobs=jobs)
+    except PmaApiDbInteractionError as err:
+        with open(pgpass_path, 'r') as file:
             pgpass_contents: str = file.read()
-        msg = '\n' + errors + \
-            'Offending command: ' + cmd + \
-            'Pgpass contents: ' + pgpass_contents
+        msg = str(err) + 'Pgpass contents: ' + pgpass_contents
         raise PmaApiDbInteractionError(msg)
+    pg_archive.record_timings('backup', path, timings)
 
     return path
 
 
+@aws_s3
+def backup_to_s3_using_pgdump(filename: str = '') -> str:
+    """Backup using pg_dump, streaming backup to AWS S3
+
+    The backup is in custom format, uploaded in parts as pg_dump writes it,
+    without writing a file. pg_dump can only dump in parallel to a directory,
+    so tables are dumped one at a time.
+
+    Args:
+        filename (str): Name of file to save
+
+    Side effects:
+        - Reads and writes to .pgpass file
+        - Runs pg_dump process, uploading result to cloud
+        - Records time spent on data of each table
+
+    Raises:
+        PmaApiDbInteractionError: If errors during process
+
+    Returns:
+        str: File name of uploaded file
+    """
+    filename: str = filename or os.path.basename(new_backup_path())
+    filepath: str = S3_BACKUPS_DIR_PATH + filename
+    register_pgpass()
+    try:
+        timings: Dict = pg_archive.run(
+            pgdump_command(),
+            consume=lambda x: s3_transfer.upload_stream(x, filepath))
+    except BaseException:
+        delete_s3_file(filepath)  # may be incomplete
+        raise
+    pg_archive.record_timings('backup', filepath, timings)
+
+    return filename
+
+
 def backup_local(path: str = '', silent: bool = False) -> str:
     """Backup database locally
 
@@ -627,6 +1000,8 @@ def backup_local(path: str = '', silent: bool = False) -> str:
 def store_file_on_s3(path: str, storage_dir: str = ''):
     """Given path to file on local file system, upload file to AWS S3
 
+    The file is uploaded in parts, in parallel, and its checksum verified.
+
     Prerequisites:
         Environmental variable setup: https://boto3.amazonaws.com/v1/
     documentation/api/latest/guide/quickstart.html#configuration
@@ -644,13 +1019,12 @@ def store_file_on_s3(path: str, storage_dir: str = ''):
     local_backup_first = False if os.path.exists(path) else True
     filename = ntpath.basename(path)
 
-    s3 = boto3.resource(
-        's3',
-        aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
-        aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'))
-
     if local_backup_first:
         backup_local(path)
+        if pg_archive.is_directory_backup(path):
+            filename: str = store_directory_on_s3(path, storage_dir)
+            pg_archive.remove_backup(path)
+            return filename
 
     # Datasets only: This only applies to datasets, so might want refactor.
     # noinspection PyBroadException
@@ -663,31 +1037,49 @@ def store_file_on_s3(path: str, storage_dir: str = ''):
     except Exception:
         metadata: Dict[str, str] = {}
 
-    # TODO Troubleshoot slow upload: https://github.com/boto/boto3/issues/409
-    #  Until fixed, print these statements.
-    #  Experiments (seconds): 62, 61, 104, 68, 59, 58, 0, 65
-    msg1 = 'Backing up to cloud: {}'.format(filename) + \
-           '\nThis normally takes seconds, but due to intermittent issues ' \
-           'with Amazon Web Services S3 file storage service, this has known '\
-           'to occasionally take between 1-2 minutes.'
+    msg1 = 'Backing up to cloud: {}'.format(filename)
     msg2 = 'Backup of file complete. Seconds elapsed: {}'
-    with open(path, 'rb') as f:
-        filepath = storage_dir + filename
-        print(msg1)
-        t1 = datetime.now()
-        s3.Bucket(BUCKET).put_object(
-            Key=filepath,
-            Metadata=metadata,
-            Body=f)
-        t2 = datetime.now()
-        elapsed_seconds: int = int((t2 - t1).total_seconds())
-        print(msg2.format(elapsed_seconds))
+    filepath = storage_dir + filename
+    print(msg1)
+    t1 = datetime.now()
+    md5: str = s3_transfer.upload_file(
+        path=path, key=filepath, metadata=metadata)
+    cloud_index.record_upload(filepath, md5=md5)
+    t2 = datetime.now()
+    elapsed_seconds: int = int((t2 - t1).total_seconds())
+    print(msg2.format(elapsed_seconds))
     if local_backup_first:
         os.remove(path)
 
     return filename
 
 
+@aws_s3
+def store_directory_on_s3(path: str, storage_dir: str = '') -> str:
+    """Upload a directory to AWS S3, as a tar archive streamed as written
+
+    Side effects:
+        - Uploads to cloud
+
+    Args:
+        path (str): Path to local directory
+        storage_dir (str): Subdirectory path where file should be stored
+
+    Returns:
+        str: File name of uploaded file
+    """
+    filename: str = os.path.basename(path) + pg_archive.TAR_EXTENSION
+    filepath: str = storage_dir + filename
+    try:
+        pg_archive.stream_tar(
+            path, lambda x: s3_transfer.upload_stream(x, filepath))
+    except BaseException:
+        delete_s3_file(filepath)  # may be incomplete
+        raise
+
+    return filename
+
+
 def backup_ui_data(path: str = get_ui_data()) -> str:
     """Given path to file on local file system, push file to AWS S3
 
@@ -729,6 +1121,8 @@ def backup_db_cloud(path_or_filename: str = '', silent: bool = False):
 
     If path_or_filename is a path, uploads from already stored backup at path.
     Else if it is a path_or_filename, creates new backup and then uploads that.
+    If neither, and on development, streams new backup to the cloud as it is
+    created. Directory backups are uploaded as tar archives.
 
     Args:
         path_or_filename (str): Either path to a backup file, or file name. If
@@ -740,6 +1134,8 @@ def backup_db_cloud(path_or_filename: str = '', silent: bool = False):
         - backup_local()
         - backup_to_s3()
     """
+    if not path_or_filename and os.getenv('ENV_NAME') == 'development':
+        return backup_to_s3_using_pgdump()
     if not path_or_filename:
         path = new_backup_path()
     else:
@@ -752,10 +1148,14 @@ def backup_db_cloud(path_or_filename: str = '', silent: bool = False):
 
     if local_backup_first:
         backup_local(path=path, silent=silent)
-    filename: str = \
-        store_file_on_s3(path=path, storage_dir=S3_BACKUPS_DIR_PATH)
+    if pg_archive.is_directory_backup(path):
+        filename: str = \
+            store_directory_on_s3(path=path, storage_dir=S3_BACKUPS_DIR_PATH)
+    else:
+        filename: str = \
+            store_file_on_s3(path=path, storage_dir=S3_BACKUPS_DIR_PATH)
     if local_backup_first:
-        os.remove(path)
+        pg_archive.remove_backup(path)
 
     return filename
 
@@ -794,8 +1194,7 @@ def s3_signed_url(url: str, sleep: int = 1) -> str:
     import time
 
     bucket, key = url.replace('https://', '').split('.s3.amazonaws.com/')
-    s3 = boto3.client('s3')
-    signed_url: str = s3.generate_presigned_url(
+    signed_url: str = s3_transfer.client().generate_presigned_url(
         ClientMethod='get_object',
         ExpiresIn=7 * 24 * 60 * 60,  # 7 days; maximum
         Params={
@@ -861,18 +1260,23 @@ def restore_using_heroku_postgres(
 
 def restore_using_pgrestore(
         path: str, attempt: int = 1, dropdb: bool = False,
-        silent: bool = False):
+        silent: bool = False, jobs: int = BACKUP_JOBS):
     """Restore postgres datagbase using pg_restore
 
+    The data of several tables is restored in parallel. Backups in custom
+    format, and not only directories, can be restored in parallel.
+
     Args:
-        path (str): Path of file to restore
+        path (str): Path of file or directory to restore
         attempt (int): Attempt number
         dropdb (bool): Drop database in process?
         silent (bool): Don't print updates?
+        jobs (int): Number of tables to restore in parallel
 
     Side effects:
         - Restores database
         - Drops database (if dropdb)
+        - Records time spent on data of each table
     """
     system_bin_paths: List[str] = \
         ['pg_restore', '/usr/local/bin/pg_restore']
@@ -892,43 +1296,30 @@ def restore_using_pgrestore(
     max_attempts: int = len(pg_restore_paths)
 
     try:
-        cmd_base: str = '{pg_restore_path} --exit-on-error --create {drop}' \
-            '--dbname={database} --host={hostname} --port={port} ' \
-            '--username={username} {path}'
-
-        cmd_str: str = cmd_base.format(
-            **root_connection_info,
-            path=path,
-            pg_restore_path=pg_restore_path,
-            drop='--clean ' if dropdb else '')
-        cmd: List[str] = cmd_str.split(' ')
-
-        proc = subprocess.Popen(
-            cmd, stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            universal_newlines=True)
+        cmd: List[str] = [
+            pg_restore_path, '--verbose', '--exit-on-error', '--create',
+            '--jobs={}'.format(jobs),
+            '--dbname={database}'.format(**root_connection_info),
+            '--host={hostname}'.format(**root_connection_info),
+            '--port={port}'.format(**root_connection_info),
+            '--username={username}'.format(**root_connection_info), path]
+        if dropdb:
+            cmd.insert(2, '--clean')
 
+        try:
+            timings: Dict = pg_archive.run(cmd, jobs=jobs)
+        except PmaApiDbInteractionError as err:
+            log_process_stderr(str(err), err_msg=db_mgmt_err)
+            raise err
+        pg_archive.record_timings('restore', path, timings)
         if not silent:
-            try:
-                for line in iter(proc.stdout.readline, ''):
-                    print(line.encode('utf-8'))
-            except AttributeError:
-                print(proc.stdout)
-
-        errors = proc.stderr.read()
-        if errors:
-            msg = '\n' + errors + \
-                'Offending command: ' + cmd_str
-            log_process_stderr(msg, err_msg=db_mgmt_err)
-            raise PmaApiDbInteractionError(msg)
-
-        proc.stderr.close()
-        proc.stdout.close()
-        proc.wait()
+            print('Restore complete. Seconds elapsed: {}'.format(
+                int(timings['seconds'])))
     except FileNotFoundError as err:
         if attempt < max_attempts:
             restore_using_pgrestore(
-                path=path, dropdb=dropdb, silent=silent, attempt=attempt+1)
+                path=path, dropdb=dropdb, silent=silent, jobs=jobs,
+                attempt=attempt+1)
         else:
             raise err
 
@@ -1011,6 +1402,10 @@ def download_file_from_s3(
         filename: str, file_dir: str, dl_dir: str = TEMP_DIR) -> str:
     """Download a file from AWS S3
 
+    The file is downloaded in byte ranges, in parallel, and its checksum
+    verified. The md5 checksum is memoized, so that the file need not be
+    read again to fingerprint it.
+
     Args:
         filename (str): Name of file to restore
         file_dir (str): Path to dir where file is stored
@@ -1025,12 +1420,11 @@ def download_file_from_s3(
     if not os.path.exists(TEMP_DIR):
         os.mkdir(TEMP_DIR)
 
-    s3 = boto3.resource('s3')
     download_from_path: str = os.path.join(file_dir, filename)
     download_to_path: str = os.path.join(dl_dir, filename)
 
     try:
-        s3.Bucket(BUCKET).download_file(download_from_path, download_to_path)
+        s3_transfer.download_file(download_from_path, download_to_path)
     except ClientError as err:
         msg = 'The file requested was not found on AWS S3.\n' \
             if err.response['Error']['Code'] == '404' \
@@ -1056,6 +1450,8 @@ def dataset_version_to_name(version_number: int) -> str:
     err = 'Dataset version {} not found.'.format(str(version_number))
     filename: str = ''
     datasets: List[Dict[str, str]] = list_cloud_datasets()
+    if not any(int(d['version_number']) == version_number for d in datasets):
+        datasets: List[Dict[str, str]] = list_cloud_datasets(max_age=0)
     for d in datasets:
         if int(d['version_number']) == version_number:
             filename: str = d['name']
@@ -1067,22 +1463,29 @@ def dataset_version_to_name(version_number: int) -> str:
 
 
 def download_dataset(version_number: int) -> str:
-    """Download dataset file from AWS S3
+    """Get dataset file from local dataset store, downloading it if need be
+
+    Files are downloaded from AWS S3 only if not in the store, or corrupt,
+    and are then added to it.
 
     Args:
         version_number (int): Version number of dataset file to download
 
     Returns:
-        str: Path to downloaded file
+        str: Path to file in local dataset store. It may be evicted once
+        unused for a while, and should not be removed by callers.
     """
-    filename: str = dataset_version_to_name(version_number)
+    stored_file_path: str = dataset_store.lookup(version_number)
+    if stored_file_path:
+        return stored_file_path
 
+    filename: str = dataset_version_to_name(version_number)
     downloaded_file_path: str = download_file_from_s3(
         filename=filename,
         file_dir=S3_DATASETS_DIR_PATH,
-        dl_dir=TEMP_DIR)
+        dl_dir=dataset_store.incoming_dir())
 
-    return downloaded_file_path
+    return dataset_store.add(downloaded_file_path, version_number)
 
 
 @aws_s3
@@ -1096,8 +1499,7 @@ def list_s3_objects(bucket_name: str = BUCKET) \
     Returns:
         list[boto3.resources.factory.s3.ObjectSummary]: List of S3 objects
     """
-    s3 = boto3.resource('s3')
-    objects = s3.Bucket(bucket_name).objects.all()
+    objects = s3_transfer.resource().Bucket(bucket_name).objects.all()
     # result: List[boto3.resources.factory.s3.ObjectSummary]
     result: List = [x for x in objects]
 
@@ -1177,9 +1579,9 @@ def list_filtered_s3_files(
             basic_metadata.append(obj_dict)
 
         # Get metadata explicitly stored in S3 object
+        # client: botocore.client.S3
+        client = s3_transfer.client()
         for x in basic_metadata:
-            # client: botocore.client.S3
-            client = boto3.client('s3')
             obj_metadata_request: Dict = \
                 client.head_object(Bucket=BUCKET, Key=x['key'])
             obj_metadata: Dict[str, str] = obj_metadata_request['Metadata']
@@ -1217,22 +1619,41 @@ def list_cloud_ui_data() -> [str]:
     return files
 
 
-def list_cloud_datasets(detailed: bool = True) \
+@aws_s3
+def list_cloud_datasets(
+        detailed: bool = True, max_age: float = CLOUD_INDEX_TTL_SECONDS) \
         -> Union[List[str], List[Dict[str, str]]]:
     """List pma api dataset spec files on AWS S3
 
+    Files are listed from the local index of cloud objects, which is
+    refreshed in the background once older than max_age. See
+    pma_api.manage.cloud_index.
+
     Args:
-        detailed (bool): 'detailed' param to pass down to
-        list_filtered_s3_files function.
+        detailed (bool): Include metadata, as list_filtered_s3_files does?
+        max_age (float): Seconds after which index is refreshed. If 0, it is
+        refreshed first.
 
     Returns:
         list: List of file names if not detailed, else list of objects
         containing file names and metadata.
     """
-    # files: List[str] if not detailed else List[Dict[str, str]]
-    files: List = list_filtered_s3_files(
-        path=S3_DATASETS_DIR_PATH,
-        detailed=detailed)
+    # objects: List[Dict[str, object]]
+    objects: List = [x for x in cloud_index.list_objects(
+        S3_DATASETS_DIR_PATH, max_age=max_age)
+        if x['key'] != S3_DATASETS_DIR_PATH]
+
+    if not detailed:
+        return sorted(x['name'] for x in objects)
+
+    objects.sort(key=lambda x: x['last_modified'], reverse=True)
+    files: List[Dict[str, str]] = [{
+        'name': x['name'],
+        'owner': x['owner'],
+        'last_modified': _format_datetime(
+            datetime.fromtimestamp(x['last_modified'], timezone.utc)),
+        'id': x['etag'][0:6],
+        **x['metadata']} for x in objects]
 
     return files
 
@@ -1297,7 +1718,7 @@ def list_local_ui_data(path: str = UI_DATA_DIR) -> [str]:
 
 
 def list_local_backups(path: str = BACKUPS_DIR) -> [str]:
-    """List available local backups
+    """List available local backups, files and directories
 
     Args:
         path (str): Path to backups directory
@@ -1305,7 +1726,9 @@ def list_local_backups(path: str = BACKUPS_DIR) -> [str]:
     Returns:
         list: backups
     """
-    filenames = list_local_files(path=path)
+    filenames = list_local_files(path=path) + \
+        [x for x in os.listdir(path)
+         if pg_archive.is_directory_backup(os.path.join(path, x))]
 
     return filenames
 
@@ -1407,6 +1830,10 @@ def restore_db_cloud(filename: str, silent: bool = False):
             filename=filename,
             file_dir=S3_BACKUPS_DIR_PATH,
             dl_dir=BACKUPS_DIR)
+        if filename.endswith(pg_archive.TAR_EXTENSION):
+            archive_path: str = path
+            path: str = pg_archive.extract_tar(archive_path, BACKUPS_DIR)
+            os.remove(archive_path)
         restore_db_local(path=path, silent=silent)
     else:
         # TODO: make same as test file
@@ -1458,8 +1885,8 @@ def restore_db_local(path: str, silent: bool = False):
 
     backup_local(emergency_backup)
 
-    if os.path.getsize(emergency_backup) == 0:  # no db existed
-        os.remove(emergency_backup)
+    if pg_archive.is_empty_backup(emergency_backup):  # no db existed
+        pg_archive.remove_backup(emergency_backup)
 
     # noinspection PyBroadException
     # drop_db(hard=True)
@@ -1474,8 +1901,7 @@ def restore_db_local(path: str, silent: bool = False):
         else:
             raise err
 
-    if os.path.exists(emergency_backup):
-        os.remove(emergency_backup)
+    pg_archive.remove_backup(emergency_backup)
 
 
 @aws_s3
@@ -1487,11 +1913,10 @@ def delete_s3_file(file_path: str):
 
     Side effects:
         - deletes file
+        - removes file from local index of cloud objects
     """
-    import boto3
-
-    s3 = boto3.resource('s3')
-    s3.Object(BUCKET, file_path).delete()
+    s3_transfer.client().delete_object(Bucket=BUCKET, Key=file_path)
+    cloud_index.record_delete(file_path)
 
 
 def delete_backup(filename: str):
@@ -1516,8 +1941,10 @@ def delete_dataset(version_number: int):
 
     Side effects:
         - deletes file
+        - removes version from local dataset store index
     """
     filename: str = dataset_version_to_name(version_number)
     file_path: str = os.path.join(S3_DATASETS_DIR_PATH, filename)
 
     delete_s3_file(file_path)
+    dataset_store.forget(version_number)
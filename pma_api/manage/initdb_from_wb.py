@@ -1,30 +1,46 @@
 """Database management"""
 import os
-from collections import OrderedDict
+from collections import OrderedDict, deque
+from contextlib import ExitStack
 from time import time
-from typing import List, Dict, Union, Generator
+from typing import Deque, List, Dict, Tuple, Union, Generator
 
-import xlrd
+from billiard.pool import ApplyResult, Pool
 from flask import Flask, current_app
 from sqlalchemy import Table
 from sqlalchemy.exc import OperationalError, DatabaseError
 
+from pma_api import dataset_schemas, invalidation
+from pma_api.config import DATA_SHEET_WORKERS, SHADOW_DATASET_SCHEMA
 from pma_api.manage.functional_subtask import FunctionalSubtask
 from pma_api.manage.multistep_task import MultistepTask
+from pma_api.manage.workbook import Workbook
 from pma_api.manage.db_mgmt import get_api_data, get_ui_data, \
     register_administrative_metadata, restore_db, backup_db, connection_error,\
     env_access_err_tell, env_access_err_msg, caching_error, drop_tables, \
     ORDERED_METADATA_SHEET_MODEL_MAP, DATASET_WB_SHEET_MODEL_MAP, \
-    get_datasheet_names, commit_from_sheet, seed_users
+    get_datasheet_names, commit_from_sheet, seed_users, prepare_data_sheet, \
+    insert_data_columns, create_data_staging_table, stage_data_columns, \
+    merge_data_staging_table, defer_constraints, build_deferred_constraints
 from pma_api.manage.utils import get_table_models
+from pma_api.manage.validation import assert_valid_workbook
 from pma_api.error import PmaApiDbInteractionError
-from pma_api.models import db, Cache, Characteristic, Indicator, Survey, Task
+from pma_api.utils import CodeAllocator
+from pma_api.models import db, ApiMetadata, Cache, CacheAccess, \
+    Characteristic, Indicator, Survey, Task
+from pma_api.models.string import StringInterner
+from pma_api.task_locks import TaskLock
 
 
 ALL_MODELS: tuple = get_table_models()
-NODROP_MODELS: tuple = (Task,)
+# Cache is kept, so that stale responses can be served until regenerated
+NODROP_MODELS: tuple = (Task, Cache, CacheAccess)
 DROP_MODELS = tuple(x for x in ALL_MODELS if x not in NODROP_MODELS)
 DROP_TABLES: List[Table] = list(x.__table__ for x in DROP_MODELS)
+# On Postgres, datasets are loaded into a shadow schema, with a cache of their
+# own, warmed up before being swapped in. Other tables are shared.
+SHADOW_TABLES: List[Table] = DROP_TABLES + [Cache.__table__]
+SHARED_TABLES: List[Table] = [Task.__table__, CacheAccess.__table__]
 
 
 class InitDbFromWb(MultistepTask):
@@ -37,13 +53,16 @@ class InitDbFromWb(MultistepTask):
     task_name = 'Initializing database from {}'
     restore_msg = 'An issue occurred. Restoring database to state it was in ' \
                   'prior to task initialization.'
+    discard_msg = 'An issue occurred. Discarding dataset being loaded.'
 
     def __init__(
             self, _app: Flask = current_app,
             api_file_path: str = get_api_data(),
             ui_file_path: str = get_ui_data(),
             silent: bool = False,
-            callback: Generator = None):
+            callback: Generator = None,
+            skip_if_unchanged: bool = False,
+            lock: TaskLock = None):
         """Task for creation of database
 
         Args:
@@ -52,23 +71,40 @@ class InitDbFromWb(MultistepTask):
             api_file_path: path to "API data file" spec xls file
             ui_file_path: path to "UIdata file" spec xls file
             callback: Callback function for progress yields
+            skip_if_unchanged: If the data files are those of the active
+            dataset, only refresh the cache, rather than loading them?
+            lock: Lock held by task, if any; the dataset is not swapped in
+            if it was taken over meanwhile
         """
         self._app: Flask = _app
         self.api_file_path: str = api_file_path
         self.ui_file_path: str = ui_file_path
-        self.api_wb = None
-        self.ui_wb = None
+        self.api_wb: Workbook = None
+        self.ui_wb: Workbook = None
         self.backup_path: str = ''
         self.callback: Generator = callback
+        self.lock: TaskLock = lock
         self.warnings = {}
         self.indicator_code_ids: Dict[str, int] = {}
         self.characteristic_code_ids: Dict[str, int] = {}
         self.survey_code_ids: Dict[str, int] = {}
+        self.data_sheet_pool: Pool = None
+        self.data_sheet_queue: Deque[str] = deque()
+        self.data_sheet_results: Dict[str, ApplyResult] = {}
+        self.data_codes = CodeAllocator()
+        self.strings = StringInterner()
+        self.data_rows_staged: int = None  # None until staging table created
+        self.deferred_constraints: List[str] = []
+        self.uses_shadow_schema: bool = False
+        self.unchanged: bool = False
+        self.transform_reports: List[Dict] = []
         self.seconds_elapsed: int = 0
         self.final_status = {
             'success': False,
+            'unchanged': self.unchanged,
             'seconds_elapsed': self.seconds_elapsed,
             'warnings': self.warnings,
+            'transform_reports': self.transform_reports,
         }
 
         # TODO 2019.04-10-jef: At this point, I have an issue where I want
@@ -90,6 +126,9 @@ class InitDbFromWb(MultistepTask):
                 subtask_queue=onload_subtasks)
 
         with _app.app_context():
+            self.uses_shadow_schema = dataset_schemas.is_supported()
+            self.unchanged = skip_if_unchanged and self.is_active_dataset()
+            self.final_status['unchanged'] = self.unchanged
             self.subtasks: OrderedDict = self.create_subtasks()
         self.subtask_queue: List[str] = [x for x in self.subtasks.keys()]
 
@@ -117,13 +156,29 @@ class InitDbFromWb(MultistepTask):
         Returns:
             OrderedDict: Collection of subtask objects
         """
+        if self.unchanged:
+            return OrderedDict({
+                'refresh_cache': {
+                    'prints': 'Dataset is already active. Refreshing cache',
+                    'pct_starts_at': 25,  # 25-99
+                    'func': self._create_cache
+                }})
         # TODO 2019.04.04-jef: 1. Refactor subtask dicts to subtask class objs
         #  ...afterwards, edits can be made to MultistepTask class to remove
         #  the ugly 'if dict, do this, else...' conditionals.
+        # Backups are skipped when loading into a shadow schema, as the live
+        # dataset is kept as a snapshot. Callers back up once active instead.
+        skipped_subtasks: Tuple[str] = () if not self.uses_shadow_schema \
+            else ('backup1', 'backup2')
         sub_tasks_static: Dict = {  # starts off where onload_subtasks ended
+            'validate': {
+                'prints': 'Validating dataset',
+                'pct_starts_at': 25,  # 25
+                'func': self._validate
+            },
             'backup1': {
                 'prints': 'Backing up database',
-                'pct_starts_at': 25,  # 25-29
+                'pct_starts_at': 26,  # 26-29
                 'func': lambda x=1: self._backup(num=x)
             },
             'reset_db': {
@@ -137,17 +192,37 @@ class InitDbFromWb(MultistepTask):
                 'pct_starts_at': 38,  # 38-39
                 'func': lambda: self.init_api_worksheet('translation')
             },
-            # Data: 39-89
+            # Data: 39-87
+            'merge_data': {
+                'prints': 'Merging data',
+                'pct_starts_at': 88,  # 88-89
+                'func': self._merge_data
+            },
             'translations_ui': {
                 'prints': 'Uploading UI language translations',
-                'pct_starts_at': 90,  # 90-91
+                'pct_starts_at': 90,  # 90
                 'func': self.init_client_ui_data
             },
+            'build_constraints': {
+                'prints': 'Building indexes and constraints',
+                'pct_starts_at': 91,  # 91
+                'func': self._build_constraints
+            },
+            'register_metadata': {
+                'prints': 'Registering dataset',
+                'pct_starts_at': 92,  # 92
+                'func': self._register_metadata
+            },
             'create_cache': {
                 'prints': 'Caching',
-                'pct_starts_at': 92,  # 92-94
+                'pct_starts_at': 93,  # 93
                 'func': self._create_cache
             },
+            'activate': {
+                'prints': 'Activating dataset',
+                'pct_starts_at': 94,  # 94
+                'func': self._activate
+            },
             'backup2': {
                 'prints': 'Backing up and finishing',
                 'pct_starts_at': 95,  # 95-99
@@ -171,7 +246,7 @@ class InitDbFromWb(MultistepTask):
             self._calc_subtask_grp_pcts(
             subtask_grp_list=metadata_list, start=float(31), stop=float(37))
 
-        # Data: 35-89
+        # Data: 39-87
         data_list: List[Dict[str, FunctionalSubtask]] = [
             {
                 'upload_data_{}'.format(x):
@@ -186,10 +261,11 @@ class InitDbFromWb(MultistepTask):
 
         data_dict: Dict[str, Dict[str, Union[str, int]]] = \
             self._calc_subtask_grp_pcts(
-            subtask_grp_list=data_list, start=float(39), stop=float(89))
+            subtask_grp_list=data_list, start=float(39), stop=float(88))
 
         sub_tasks_unsorted: Dict[str, Dict[str, Union[str, float]]] = {
-            **sub_tasks_static,
+            **{k: v for k, v in sub_tasks_static.items()
+               if k not in skipped_subtasks},
             **metadata_dict,
             **data_dict}
 
@@ -205,25 +281,25 @@ class InitDbFromWb(MultistepTask):
         return sub_tasks
 
     def load_api_wb(self):
-        """Load API workbook data into memory as instance attr
+        """Open API workbook as instance attr
+
+        Worksheets are read from file one at a time, as they are uploaded.
 
         Side effects:
-            - Reads file
+            - Opens file
             - Sets attribute
         """
-        with xlrd.open_workbook(self.api_file_path) as book:
-            self.api_wb: xlrd.book.Book = book
+        self.api_wb = Workbook(self.api_file_path)
 
     def load_ui_wb(self):
-        """Load UI workbook data into memory as instance attr
+        """Open UI workbook as instance attr
 
         Side effects:
-            - Reads file
+            - Opens file
             - Sets attribute
         """
         if self.ui_file_path:
-            with xlrd.open_workbook(self.ui_file_path) as book:
-                self.ui_wb: xlrd.book.Book = book
+            self.ui_wb = Workbook(self.ui_file_path)
 
     def load_source_data_files(self):
         """Load data necessary to initialize DB.
@@ -235,18 +311,53 @@ class InitDbFromWb(MultistepTask):
         self.load_api_wb()
         self.load_ui_wb()
 
+    def is_active_dataset(self) -> bool:
+        """Are the data files loaded those of the active dataset?
+
+        Compares md5 checksums of the files, computed when loaded, with those
+        registered for the active dataset. The worksheets of such files are
+        also already parsed, as parsed workbooks are cached by checksum.
+
+        Returns:
+            bool: True if the API data file, and the UI data file if any,
+            are those of the active dataset
+        """
+        try:
+            api_data: ApiMetadata = ApiMetadata.get_current_api_data()
+            ui_data: ApiMetadata = ApiMetadata.get_current_ui_data()
+        except DatabaseError:  # e.g. no dataset was ever activated
+            db.session.rollback()
+            return False
+
+        if not api_data or api_data.md5_checksum != self.api_wb.md5:
+            return False
+        if not self.ui_wb:
+            return True
+
+        return bool(ui_data) and ui_data.md5_checksum == self.ui_wb.md5
+
+    def close_source_data_files(self):
+        """Close source data files, if open
+
+        Side effects:
+            - Closes files
+        """
+        for wb in (self.api_wb, self.ui_wb):
+            if wb:
+                wb.close()
+
     def init_client_ui_data(self):
         """Load client UI language data into DB
 
         Side effects:
-            - xlrd.open_workbook
             - commit_from_sheet
         """
         sheetname: str = 'translation'
         if self.ui_wb:
             commit_from_sheet(
                 ws=self.ui_wb.sheet_by_name(sheetname),  # Sheet
-                model=DATASET_WB_SHEET_MODEL_MAP[sheetname]),  # db.Model
+                model=DATASET_WB_SHEET_MODEL_MAP[sheetname],  # db.Model
+                interner=self.strings)
 
     def set_relational_metadata(self):
         """Set instance attrs for required relational keys for 'Data' upload
@@ -282,14 +393,22 @@ class InitDbFromWb(MultistepTask):
             commit_from_sheet(
                 ws=self.api_wb.sheet_by_name(sheetname),  # Sheet
                 model=DATASET_WB_SHEET_MODEL_MAP[sheetname],  # db.Model
-                **kwargs)
+                interner=self.strings, **kwargs)
 
     def init_api_data_worksheet(self, sheetname: str):
         """Init data worksheet
 
+        Data worksheets are parsed, coerced and have their foreign keys
+        resolved in a process pool, ahead of being uploaded. Only inserting
+        them into the database happens here, one at a time. On Postgres,
+        they are rather loaded into a staging table over several
+        connections at once, and merged into the 'datum' table afterwards.
+
         Side effects:
-            - Creates records in db
+            - Creates records in db, or in staging table
             - Creates instance attributes if not already exist
+            - Starts preparing upcoming data worksheets
+            - Adds reports of pre-insert transforms
 
         Args:
             sheetname (str): Name of worksheet containing data
@@ -302,12 +421,86 @@ class InitDbFromWb(MultistepTask):
         if any(not getattr(self, x) for x in attr_names):
             self.set_relational_metadata()
 
-        commit_from_sheet(
-            ws=self.api_wb.sheet_by_name(sheetname),
-            model=DATASET_WB_SHEET_MODEL_MAP['data'],
-            survey=self.survey_code_ids,
-            indicator=self.indicator_code_ids,
-            characteristic=self.characteristic_code_ids)
+        columns, keys, reports = self._prepared_data_sheet(sheetname)
+        if db.engine.dialect.name == 'postgresql':
+            schema: str = \
+                SHADOW_DATASET_SCHEMA if self.uses_shadow_schema else None
+            if self.data_rows_staged is None:
+                create_data_staging_table(db.engine, schema=schema)
+                self.data_rows_staged = 0
+            self.data_rows_staged += stage_data_columns(
+                db.engine, columns, keys, self.data_codes,
+                first_row=self.data_rows_staged, schema=schema)
+        else:
+            insert_data_columns(columns, keys, self.data_codes)
+        self.transform_reports += reports
+
+    def _prepared_data_sheet(self, sheetname: str) \
+            -> Tuple[Dict[str, List], List[tuple], List[Dict]]:
+        """Get data worksheet prepared for upload
+
+        Up to DATA_SHEET_WORKERS data worksheets are prepared at a time, in
+        the order they are uploaded, so that at most that many are held in
+        memory. The pool is billiard's, as Celery's, so that a Celery worker
+        process, which is daemonic, may have child processes. Without
+        multiple workers, worksheets are prepared in this process instead.
+
+        Side effects:
+            - Starts process pool, if not already started
+            - Submits upcoming data worksheets to process pool
+
+        Args:
+            sheetname (str): Name of worksheet containing data
+
+        Returns:
+            dict(str, list), list(tuple), list(dict): Column values by column
+            name, natural keys of records, and reports of pre-insert
+            transforms
+        """
+        kwargs: Dict[str, Dict[str, int]] = {
+            'survey': self.survey_code_ids,
+            'indicator': self.indicator_code_ids,
+            'characteristic': self.characteristic_code_ids}
+        if DATA_SHEET_WORKERS < 2:
+            return prepare_data_sheet(self.api_file_path, sheetname, **kwargs)
+
+        if not self.data_sheet_pool:
+            self.data_sheet_pool = Pool(DATA_SHEET_WORKERS)
+            self.data_sheet_queue.extend(get_datasheet_names(self.api_wb))
+        if sheetname in self.data_sheet_queue:
+            self.data_sheet_queue.remove(sheetname)
+            self.data_sheet_queue.appendleft(sheetname)
+        while self.data_sheet_queue \
+                and len(self.data_sheet_results) < DATA_SHEET_WORKERS:
+            upcoming: str = self.data_sheet_queue.popleft()
+            self.data_sheet_results[upcoming] = \
+                self.data_sheet_pool.apply_async(
+                    prepare_data_sheet, (self.api_file_path, upcoming), kwargs)
+
+        return self.data_sheet_results.pop(sheetname).get()
+
+    def _stop_data_sheet_pool(self):
+        """Stop process pool preparing data worksheets, if started
+
+        Side effects:
+            - Discards pending data worksheets
+            - Terminates process pool
+        """
+        if not self.data_sheet_pool:
+            return
+        self.data_sheet_pool.terminate()
+        self.data_sheet_pool.join()
+        self.data_sheet_pool = None
+        self.data_sheet_queue.clear()
+        self.data_sheet_results = {}
+
+    def _validate(self):
+        """Validate source data files, before anything is changed
+
+        Raises:
+            PmaApiDatasetValidationError: Listing all violations, if any
+        """
+        assert_valid_workbook(self.api_wb, self.ui_wb)
 
     def _backup(self, num: int = None):
         """Backup state of database
@@ -330,17 +523,65 @@ class InitDbFromWb(MultistepTask):
     def _reset_db(self):
         """Reset database
 
+        On Postgres, the live dataset is left as it is, and an empty shadow
+        schema is created to load the new one into instead.
+
         Side effects:
-            - Drops data and schema
-            - Creates new schema
+            - Drops data and schema, or any shadow schema
+            - Creates new schema, or shadow schema
             - Seeds initial, default users
-            - Registers administrative metadata
+            - On Postgres, drops constraints and indexes until data is loaded
         """
-        drop_tables(DROP_TABLES)
-        self._create_schema()
+        if self.uses_shadow_schema:
+            dataset_schemas.create_shared_tables(SHARED_TABLES)
+            dataset_schemas.create_shadow_schema(SHADOW_TABLES)
+        else:
+            drop_tables(DROP_TABLES)
+            self._create_schema()
         seed_users()
+        if db.engine.dialect.name == 'postgresql':
+            self.deferred_constraints = defer_constraints(DROP_TABLES)
+            db.session.commit()
+
+    def _merge_data(self):
+        """Merge data from staging table, if data was staged
+
+        Side effects:
+            - Creates records in db
+            - Drops staging table
+        """
+        if self.data_rows_staged is None:
+            return
+        merge_data_staging_table()
+        self.data_rows_staged = None
+
+    def _build_constraints(self):
+        """Build constraints and indexes deferred until data was loaded
+
+        Side effects:
+            - Creates constraints and indexes
+            - On Postgres, analyzes tables
+        """
+        if db.engine.dialect.name != 'postgresql':
+            return
+        build_deferred_constraints(self.deferred_constraints, DROP_TABLES)
+        self.deferred_constraints = []
+
+    def _register_metadata(self):
+        """Register administrative metadata
+
+        This is done only once all data is loaded, as the md5 of the API data
+        marks cached responses generated from other data as stale.
+
+        Side effects:
+            - Registers administrative metadata
+            - Notifies all workers of the new API data, unless loaded into
+            shadow schema
+        """
         register_administrative_metadata(self.api_file_path)
         register_administrative_metadata(self.ui_file_path)
+        if not self.uses_shadow_schema:
+            invalidation.publish()
 
     @staticmethod
     def _create_schema():
@@ -348,22 +589,54 @@ class InitDbFromWb(MultistepTask):
         db.create_all()
 
     def _create_cache(self):
-        """Cache specific routes"""
+        """Regenerate cache for datalab init and most requested routes
+
+        When loading into a shadow schema, the live cache is copied into it
+        first, so that its most requested routes are regenerated as well.
+        If the dataset is unchanged, the live cache is refreshed in place.
+        """
+        if self.uses_shadow_schema and not self.unchanged:
+            dataset_schemas.copy_into_shadow_schema(Cache.__table__)
         try:
-            Cache.cache_datalab_init(self._app)
+            Cache.warm_up(self._app)
         except RuntimeError as err:
             self.warnings['caching'] = caching_error.format(err)
 
+    def _activate(self):
+        """Swap dataset loaded into shadow schema in, if any
+
+        Side effects:
+            - Swaps shadow schema in as the live schema, keeping the live
+            dataset as a snapshot
+            - Notifies all workers of the new API data
+
+        Raises:
+            PmaApiTaskLockLostError: If lock was taken over by another task,
+            which then owns the shadow schema, so it is left as is
+        """
+        if not self.uses_shadow_schema:
+            return
+        db.session.commit()
+        md5: str = ApiMetadata.get_current_api_data().md5_checksum
+        dataset_schemas.activate_shadow_schema(SHADOW_TABLES, lock=self.lock)
+        invalidation.publish(md5)
+
     def run(self) -> Dict:
         """Create a fresh database instance.
 
-        Runs task execution, handles errors, and reports result.
+        Runs task execution, handles errors, and reports result. On
+        Postgres, subtasks read and write the shadow schema, and the live
+        dataset is only replaced once the new one is fully loaded. If the
+        dataset is unchanged and was to be skipped, only the cache is
+        refreshed.
 
         Side effects:
             - Runs subtasks
             - Sets attributes
 
         Raises:
+            PmaApiDatasetValidationError: If dataset is invalid, in which
+            case nothing was changed.
             PmaApiDbInteractionError: If tried to recover from issues but
             failed.
 
@@ -372,12 +645,20 @@ class InitDbFromWb(MultistepTask):
         """
         with self._app.app_context():
             try:
-                for subtask_name in self.subtask_queue:
-                    self.begin(subtask_name)
+                with ExitStack() as stack:
+                    if self.uses_shadow_schema and not self.unchanged:
+                        stack.enter_context(dataset_schemas.shadow_session())
+                    for subtask_name in self.subtask_queue:
+                        self.begin(subtask_name)
             except (DatabaseError, AttributeError) as err:
                 db.session.rollback()
-                restore_db(self.backup_path)
-                print(self.restore_msg)
+                if self.uses_shadow_schema:
+                    dataset_schemas.drop_shadow_schema()
+                    print(self.discard_msg)
+                else:
+                    restore_db(self.backup_path)
+                    invalidation.publish()
+                    print(self.restore_msg)
 
                 msg: str = str(err)
                 if isinstance(err, OperationalError):
@@ -387,6 +668,9 @@ class InitDbFromWb(MultistepTask):
                         msg: str = env_access_err_msg\
                             .format(type(err).__name__ + ': ' + str(err))
                 raise PmaApiDbInteractionError(msg)
+            finally:
+                self._stop_data_sheet_pool()
+                self.close_source_data_files()
 
         self.seconds_elapsed = int(time() - self.start_time)
         self.final_status['seconds_elapsed'] = self.seconds_elapsed
@@ -0,0 +1,324 @@
+"""Runs of pg_dump and pg_restore, and archives of their backups.
+
+Tools are run verbosely, and each message they write is timestamped as it
+arrives, so as to time the data of each table: from the message that it is
+being dumped or restored, to the message that it is finished if run in
+parallel, or else to the message of the next table. Timings are appended to
+BACKUP_TIMINGS_LOG_PATH as JSON lines.
+
+Directory backups are transferred as tar archives, streamed as they are
+written or read.
+
+Example usage:
+    timings = run(['pg_dump', '--verbose', ...], jobs=4)
+    record_timings('backup', path, timings)
+"""
+import json
+import os
+import re
+import shutil
+import subprocess
+import tarfile
+import threading
+from datetime import datetime
+from io import TextIOWrapper
+from time import monotonic
+from typing import BinaryIO, Callable, Dict, List
+
+from pma_api.config import BACKUP_TIMINGS_LOG_PATH, LOGS_DIR
+from pma_api.error import PmaApiDbInteractionError
+from pma_api.manage.utils import _get_bin_path_from_ref_config
+
+TABLE_STARTED = re.compile(
+    r'(?:dumping contents of|processing data for) table "?([^"\n]+?)"?\s*$')
+TABLE_FINISHED = re.compile(r'finished item \d+ TABLE DATA (\S+)')
+TOC_FILENAME = 'toc.dat'
+TAR_EXTENSION = '.tar'
+
+
+def bare_table_name(table: str) -> str:
+    """Get name of table without schema
+
+    Args:
+        table (str): Name of table, qualified or not
+
+    Returns:
+        str: Name of table
+    """
+    return table.split('.')[-1]
+
+
+def bin_path(bin_name: str) -> str:
+    """Get path to binary: on the path, or the designated system or project
+    binary
+
+    Args:
+        bin_name (str): Name of binary, e.g. 'pg_dump'
+
+    Returns:
+        str: Path to binary, or its name if not found
+    """
+    system_bin: str = \
+        _get_bin_path_from_ref_config(bin_name=bin_name, system=True)
+    project_bin: str = \
+        _get_bin_path_from_ref_config(bin_name=bin_name, project=True)
+
+    return shutil.which(bin_name) or shutil.which(system_bin) \
+        or project_bin or bin_name
+
+
+class TableTimer:
+    """Timer of the data of each table, from messages of pg_dump or
+    pg_restore.
+
+    Messages that a table is finished name it without its schema, so tables
+    of the same name are taken to finish in the order they started.
+    """
+
+    def __init__(self, parallel: bool = False):
+        """Initialize
+
+        Args:
+            parallel (bool): Are tables dumped or restored in parallel? If
+            not, each table finishes when the next starts.
+        """
+        self.parallel: bool = parallel
+        self.started: Dict[str, float] = {}  # in order started
+        self.seconds: Dict[str, float] = {}
+
+    def finish(self, table: str, at: float):
+        """Record table as finished
+
+        Args:
+            table (str): Qualified name of table
+            at (float): Time, by time.monotonic()
+        """
+        self.seconds[table] = round(at - self.started.pop(table), 3)
+
+    def line(self, line: str, at: float):
+        """Read a message
+
+        Args:
+            line (str): Message
+            at (float): Time message arrived, by time.monotonic()
+        """
+        started = TABLE_STARTED.search(line)
+        if started:
+            if not self.parallel:
+                self.close(at)
+            self.started.setdefault(started.group(1), at)
+            return
+        finished = TABLE_FINISHED.search(line)
+        if finished:
+            name: str = finished.group(1)
+            table: str = next((x for x in self.started
+                               if bare_table_name(x) == name), None)
+            if table:
+                self.finish(table, at)
+
+    def close(self, at: float):
+        """Record all tables started as finished
+
+        Args:
+            at (float): Time, by time.monotonic()
+        """
+        for table in list(self.started):
+            self.finish(table, at)
+
+
+def run(cmd: List[str], jobs: int = 1,
+        consume: Callable[[BinaryIO], object] = None) -> Dict:
+    """Run pg_dump or pg_restore, timing the data of each table
+
+    Args:
+        cmd (list(str)): Command, with '--verbose'
+        jobs (int): Number of jobs command runs in parallel
+        consume (callable): Function reading standard output of command,
+        e.g. an archive written to it. If not given, output is discarded.
+
+    Raises:
+        FileNotFoundError: If there is no such binary
+        PmaApiDbInteractionError: If command fails
+
+    Returns:
+        dict: Seconds in all, number of jobs, and seconds by table
+    """
+    timer = TableTimer(parallel=jobs > 1)
+    lines: List[str] = []
+    began: float = monotonic()
+    proc = subprocess.Popen(
+        cmd, stdout=subprocess.PIPE if consume else subprocess.DEVNULL,
+        stderr=subprocess.PIPE)
+
+    def read_messages():
+        """Read and time messages, as they arrive"""
+        for line in TextIOWrapper(proc.stderr, errors='replace'):
+            lines.append(line)
+            timer.line(line, monotonic())
+
+    reader = threading.Thread(target=read_messages, daemon=True)
+    reader.start()
+    try:
+        if consume:
+            consume(proc.stdout)
+    except BaseException:
+        proc.kill()
+        raise
+    finally:
+        if proc.stdout:
+            proc.stdout.close()
+        proc.wait()
+        reader.join()
+    ended: float = monotonic()
+    timer.close(ended)
+
+    if proc.returncode:
+        raise PmaApiDbInteractionError(
+            '\n' + ''.join(lines) + 'Offending command: ' + ' '.join(cmd))
+
+    return {
+        'seconds': round(ended - began, 3),
+        'jobs': jobs,
+        'tables': timer.seconds}
+
+
+def record_timings(operation: str, target: str, timings: Dict):
+    """Append timings of a backup or restore to log
+
+    Side effects:
+        - Makes directory (if doesn't exist)
+        - Writes to logfile
+
+    Args:
+        operation (str): 'backup' or 'restore'
+        target (str): Path or name of backup
+        timings (dict): Timings, as returned by `run()`
+    """
+    os.makedirs(LOGS_DIR, exist_ok=True)
+    with open(BACKUP_TIMINGS_LOG_PATH, 'a') as log:
+        log.write(json.dumps({
+            'datetime': str(datetime.now()),
+            'operation': operation,
+            'target': target,
+            **timings}) + '\n')
+
+
+def is_directory_backup(path: str) -> bool:
+    """Is backup a directory, as written by pg_dump --format=directory?
+
+    Args:
+        path (str): Path to backup
+
+    Returns:
+        bool: True if so
+    """
+    return os.path.isdir(path)
+
+
+def is_empty_backup(path: str) -> bool:
+    """Is backup missing or empty, e.g. as there was no database to dump?
+
+    Args:
+        path (str): Path to backup file or directory
+
+    Returns:
+        bool: True if so
+    """
+    if is_directory_backup(path):
+        return not os.path.isfile(os.path.join(path, TOC_FILENAME))
+
+    return not os.path.isfile(path) or os.path.getsize(path) == 0
+
+
+def remove_backup(path: str):
+    """Remove backup file or directory
+
+    Side effects:
+        - Removes file or directory, if it exists
+
+    Args:
+        path (str): Path to backup
+    """
+    if is_directory_backup(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def stream_tar(path: str, consume: Callable[[BinaryIO], object]):
+    """Stream a directory as a tar archive, as it is written
+
+    Args:
+        path (str): Path to directory
+        consume (callable): Function reading archive, in order
+
+    Raises:
+        OSError: If directory could not be read
+    """
+    read_fd, write_fd = os.pipe()
+    errors: List[BaseException] = []
+
+    def write():
+        """Write archive into pipe"""
+        try:
+            with open(write_fd, 'wb') as pipe, \
+                    tarfile.open(fileobj=pipe, mode='w|') as tar:
+                tar.add(path, arcname=os.path.basename(path))
+        except BaseException as err:
+            errors.append(err)
+
+    writer = threading.Thread(target=write, daemon=True)
+    writer.start()
+    try:
+        with open(read_fd, 'rb') as pipe:
+            consume(pipe)
+    finally:
+        writer.join()
+    if errors:
+        raise errors[0]
+
+
+def _in_directory(member: tarfile.TarInfo, directory: str) -> bool:
+    """Is archive member a file or directory within a directory?
+
+    Args:
+        member (TarInfo): Archive member
+        directory (str): Relative path of directory
+
+    Returns:
+        bool: True if within directory, and not a link or device
+    """
+    parts: List[str] = member.name.split('/')
+    if os.path.isabs(member.name) or '..' in parts:
+        return False
+
+    return parts[0] == directory and (member.isdir() or member.isfile())
+
+
+def extract_tar(path: str, dir_path: str) -> str:
+    """Extract a directory backup archived by `stream_tar()`
+
+    Side effects:
+        - Writes directory
+
+    Args:
+        path (str): Path to archive
+        dir_path (str): Directory to extract into
+
+    Raises:
+        PmaApiDbInteractionError: If archive has anything but one directory
+
+    Returns:
+        str: Path to directory extracted
+    """
+    with tarfile.open(path) as tar:
+        members: List[tarfile.TarInfo] = tar.getmembers()
+        top: str = members[0].name if members else ''
+        if not members or not members[0].isdir() \
+                or not all(_in_directory(x, top) for x in members):
+            raise PmaApiDbInteractionError(
+                'Backup archive does not contain just one directory.\n'
+                '- Archive: ' + path)
+        tar.extractall(dir_path, members=members)
+
+    return os.path.join(dir_path, top)
@@ -0,0 +1,348 @@
+"""Transfers of files to and from AWS S3.
+
+Files are uploaded in parts, and downloaded in byte ranges, transferred in
+parallel. Their md5 checksums are computed on the fly, as they are read or
+written in order, and verified against the entity tag S3 gives the object.
+
+One client is reused per process. Set AWS_S3_ENDPOINT_URL to transfer to an
+S3-compatible service instead, e.g. a local stand-in for tests.
+"""
+import os
+import threading
+from hashlib import md5
+from typing import BinaryIO, Dict, List
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+
+from pma_api.config import AWS_S3_STORAGE_BUCKETNAME as BUCKET, \
+    AWS_S3_ENDPOINT_URL, S3_TRANSFER_PART_BYTES, S3_TRANSFER_CONCURRENCY
+from pma_api.error import PmaApiDbInteractionError
+from pma_api.manage.workbook import Md5Writer, remember_file_md5
+
+_client_lock = threading.Lock()
+_clients: Dict[int, object] = {}  # by process id
+_resources = threading.local()
+
+
+def connection_kwargs() -> Dict[str, str]:
+    """Get keyword arguments of S3 clients and resources
+
+    Returns:
+        dict: Endpoint and credentials, where set
+    """
+    return {
+        'endpoint_url': AWS_S3_ENDPOINT_URL,
+        'aws_access_key_id': os.getenv('AWS_ACCESS_KEY_ID'),
+        'aws_secret_access_key': os.getenv('AWS_SECRET_ACCESS_KEY')}
+
+
+def client():
+    """Get S3 client of this process, created when first needed
+
+    Clients can be shared by threads, but not by forked processes.
+
+    Returns:
+        botocore.client.S3: Client
+    """
+    pid: int = os.getpid()
+    if pid not in _clients:
+        with _client_lock:
+            if pid not in _clients:
+                _clients.clear()
+                _clients[pid] = boto3.session.Session().client(
+                    's3', **connection_kwargs())
+
+    return _clients[pid]
+
+
+def resource():
+    """Get S3 resource of this thread, created when first needed
+
+    Unlike clients, resources cannot be shared by threads.
+
+    Returns:
+        boto3.resources.factory.s3.ServiceResource: Resource
+    """
+    if getattr(_resources, 'pid', None) != os.getpid():
+        _resources.resource = boto3.session.Session().resource(
+            's3', **connection_kwargs())
+        _resources.pid = os.getpid()
+
+    return _resources.resource
+
+
+def transfer_config() -> TransferConfig:
+    """Get configuration of transfers
+
+    Files of at least one part are transferred in parts.
+
+    Returns:
+        TransferConfig: Configuration
+    """
+    return TransferConfig(
+        multipart_threshold=S3_TRANSFER_PART_BYTES,
+        multipart_chunksize=S3_TRANSFER_PART_BYTES,
+        max_concurrency=S3_TRANSFER_CONCURRENCY,
+        use_threads=True)
+
+
+class S3Checksum:
+    """md5 checksum of a file, and entity tag of it as an S3 object.
+
+    The entity tag of an object uploaded in one part is its md5 checksum,
+    and of one uploaded in parts, the md5 checksum of the md5 checksums of its
+    parts, followed by the number of parts.
+    """
+
+    def __init__(self, part_bytes: int = S3_TRANSFER_PART_BYTES):
+        """Initialize
+
+        Args:
+            part_bytes (int): Size of parts, if uploaded in parts
+        """
+        self.part_bytes: int = part_bytes
+        self.checksum = md5()
+        self.part_digests: List[bytes] = []
+        self.part_checksum = md5()
+        self.part_size: int = 0
+
+    def update(self, data: bytes):
+        """Add data to checksum
+
+        Args:
+            data (bytes): Data, in order
+        """
+        self.checksum.update(data)
+        view = memoryview(data)
+        while view:
+            size: int = min(len(view), self.part_bytes - self.part_size)
+            self.part_checksum.update(view[:size])
+            self.part_size += size
+            view = view[size:]
+            if self.part_size == self.part_bytes:
+                self.part_digests.append(self.part_checksum.digest())
+                self.part_checksum = md5()
+                self.part_size = 0
+
+    def hexdigest(self) -> str:
+        """Get md5 checksum
+
+        Returns:
+            str: md5 hex digest
+        """
+        return self.checksum.hexdigest()
+
+    def etag(self, n_parts: int = None) -> str:
+        """Get entity tag
+
+        Args:
+            n_parts (int): Number of parts uploaded in, if known. Defaults to
+            the number of parts of this size, if there are any.
+
+        Returns:
+            str: Entity tag, or None if not of n_parts parts of this size
+        """
+        digests: List[bytes] = self.part_digests + \
+            ([self.part_checksum.digest()] if self.part_size else [])
+        if n_parts is None and not self.part_digests:
+            return self.hexdigest()
+        if n_parts is not None and n_parts != len(digests):
+            return None
+
+        return '{}-{}'.format(md5(b''.join(digests)).hexdigest(),
+                              len(digests))
+
+    def matches(self, etag: str) -> bool:
+        """Does entity tag match, where comparable?
+
+        Entity tags of objects uploaded in parts of another size cannot be
+        compared. Those of objects encrypted with AWS KMS are not checksums,
+        so such encryption is not supported.
+
+        Args:
+            etag (str): Entity tag of object
+
+        Returns:
+            bool: False if known not to match
+        """
+        etag = etag.strip('"')
+        if '-' not in etag:
+            return etag == self.hexdigest()
+        expected: str = self.etag(n_parts=int(etag.split('-')[1]))
+
+        return expected is None or etag == expected
+
+
+class ChecksumReader:
+    """Reader of a file, computing its checksum as it is read.
+
+    It cannot seek, so that readers such as boto3 read in order.
+    """
+
+    def __init__(self, file: BinaryIO, checksum: S3Checksum):
+        """Initialize
+
+        Args:
+            file (BinaryIO): File, opened for reading
+            checksum (S3Checksum): Checksum to update
+        """
+        self.file: BinaryIO = file
+        self.checksum: S3Checksum = checksum
+
+    def read(self, size: int = -1) -> bytes:
+        """Read data from file, and add it to checksum
+
+        Args:
+            size (int): Number of bytes to read, or -1 for all
+
+        Returns:
+            bytes: Data
+        """
+        data: bytes = self.file.read(size)
+        self.checksum.update(data)
+
+        return data
+
+
+def etag(key: str, bucket: str = BUCKET) -> str:
+    """Get entity tag of an object
+
+    Args:
+        key (str): Key of object
+        bucket (str): Bucket
+
+    Raises:
+        botocore.exceptions.ClientError: If there is no such object
+
+    Returns:
+        str: Entity tag
+    """
+    return client().head_object(Bucket=bucket, Key=key)['ETag']
+
+
+def upload_stream(stream: BinaryIO, key: str,
+                  metadata: Dict[str, str] = None,
+                  bucket: str = BUCKET) -> str:
+    """Upload a stream, in parts transferred in parallel as it is read
+
+    The stream is read in order, once, so it need not be seekable, e.g. the
+    output of a process.
+
+    Side effects:
+        - Uploads to cloud
+
+    Args:
+        stream (BinaryIO): Stream, opened for reading
+        key (str): Key of object to upload to
+        metadata (dict(str, str)): Metadata of object
+        bucket (str): Bucket
+
+    Raises:
+        PmaApiDbInteractionError: If checksum of object does not match
+
+    Returns:
+        str: md5 checksum of data uploaded
+    """
+    checksum = S3Checksum()
+    client().upload_fileobj(
+        ChecksumReader(stream, checksum), bucket, key,
+        ExtraArgs={'Metadata': metadata or {}}, Config=transfer_config())
+    if not checksum.matches(etag(key, bucket)):
+        raise PmaApiDbInteractionError(
+            'Checksum of file uploaded to AWS S3 does not match.\n'
+            '- File uploaded: ' + key)
+
+    return checksum.hexdigest()
+
+
+def upload_file(path: str, key: str, metadata: Dict[str, str] = None,
+                bucket: str = BUCKET) -> str:
+    """Upload a file, in parts transferred in parallel
+
+    Side effects:
+        - Uploads to cloud
+
+    Args:
+        path (str): Path to file
+        key (str): Key of object to upload to
+        metadata (dict(str, str)): Metadata of object
+        bucket (str): Bucket
+
+    Raises:
+        PmaApiDbInteractionError: If checksum of object does not match
+
+    Returns:
+        str: md5 checksum of file
+    """
+    with open(path, 'rb') as file:
+        return upload_stream(file, key, metadata, bucket)
+
+
+def download_file(key: str, path: str, bucket: str = BUCKET) -> str:
+    """Download a file, in byte ranges transferred in parallel
+
+    The md5 checksum of the file is memoized, so that the file need not be
+    read again to fingerprint it.
+
+    Side effects:
+        - Writes file, or removes it if incomplete
+
+    Args:
+        key (str): Key of object
+        path (str): Path to download file to
+        bucket (str): Bucket
+
+    Raises:
+        botocore.exceptions.ClientError: If there is no such object
+        PmaApiDbInteractionError: If checksum of file does not match
+
+    Returns:
+        str: md5 checksum of file
+    """
+    object_etag: str = etag(key, bucket)
+    checksum = S3Checksum()
+    try:
+        with open(path, 'wb') as file:
+            client().download_fileobj(bucket, key, Md5Writer(file, checksum),
+                                      Config=transfer_config())
+        if not checksum.matches(object_etag):
+            raise PmaApiDbInteractionError(
+                'Checksum of file downloaded from AWS S3 does not match.\n'
+                '- File requested: ' + key)
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    remember_file_md5(path, checksum.hexdigest())
+
+    return checksum.hexdigest()
+
+
+def object_md5(key: str, bucket: str = BUCKET) -> str:
+    """Get md5 checksum of an object, reading it in order
+
+    Side effects:
+        - Downloads object, without writing it
+
+    Args:
+        key (str): Key of object
+        bucket (str): Bucket
+
+    Raises:
+        botocore.exceptions.ClientError: If there is no such object
+        PmaApiDbInteractionError: If checksum of object does not match
+
+    Returns:
+        str: md5 checksum of object
+    """
+    response: Dict = client().get_object(Bucket=bucket, Key=key)
+    checksum = S3Checksum()
+    for data in response['Body'].iter_chunks(S3_TRANSFER_PART_BYTES):
+        checksum.update(data)
+    if not checksum.matches(response['ETag']):
+        raise PmaApiDbInteractionError(
+            'Checksum of file read from AWS S3 does not match.\n'
+            '- File requested: ' + key)
+
+    return checksum.hexdigest()
@@ -0,0 +1,138 @@
+"""Pre-insert transforms of worksheet columns.
+
+A transform takes the columns of a worksheet, as lists of cell values by
+header, and returns transformed columns along with a report for each column
+it looked at. Transforms registered with `register_transform()` are run in
+order by `transform_columns()`.
+
+Example usage:
+    @register_transform
+    def strip_text(sheetname, columns):
+        ...
+        return columns, reports
+"""
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+STATA_UNDEFINED_TOKEN = '.'
+
+Columns = Dict[str, List]
+ColumnReport = Dict[str, object]
+Transform = Callable[[str, Columns], Tuple[Columns, List[ColumnReport]]]
+
+PRE_INSERT_TRANSFORMS: List[Transform] = []
+
+
+def register_transform(transform: Transform) -> Transform:
+    """Add transform to the end of the pre-insert pipeline
+
+    Can be used as a decorator.
+
+    Args:
+        transform (Transform): Transform to add
+
+    Returns:
+        Transform: The transform
+    """
+    PRE_INSERT_TRANSFORMS.append(transform)
+
+    return transform
+
+
+def transform_columns(sheetname: str, columns: Columns,
+                      transforms: List[Transform] = None) \
+        -> Tuple[Columns, List[ColumnReport]]:
+    """Run worksheet columns through pre-insert transforms
+
+    Args:
+        sheetname (str): Worksheet name
+        columns (dict(str, list)): Cell values by header, excluding header
+        transforms (list(Transform)): Transforms to run, in order. Defaults
+        to all registered transforms.
+
+    Returns:
+        dict(str, list), list(dict): Transformed columns, and reports of all
+        transforms
+    """
+    reports: List[ColumnReport] = []
+    for transform in PRE_INSERT_TRANSFORMS if transforms is None \
+            else transforms:
+        columns, transform_reports = transform(sheetname, columns)
+        reports += transform_reports
+
+    return columns, reports
+
+
+def is_number(value) -> bool:
+    """Is value a number, or a string of one?
+
+    Args:
+        value: Cell value
+
+    Returns:
+        bool: True if a number
+    """
+    if isinstance(value, (int, float)):
+        return True
+    try:
+        float(value)
+    except (TypeError, ValueError):
+        return False
+
+    return True
+
+
+@register_transform
+def clean_stata_undefined_tokens(sheetname: str, columns: Columns) \
+        -> Tuple[Columns, List[ColumnReport]]:
+    """Type columns, replacing Stata undefined token '.' where not text
+
+    Each column is typed from all of its values at once, as a numpy array,
+    ignoring empty cells and '.' tokens. A column is 'numeric' if all such
+    values are numbers or strings of numbers, 'text' if not, and 'empty' if
+    there are none. In numeric and empty columns, '.' tokens are replaced
+    with None, so that they are inserted as NULL rather than as the string
+    '.', which Postgres rejects from numeric columns. In text columns, they
+    are kept. Values are otherwise left as they are, to be coerced to the
+    type of the database column they are inserted into.
+
+    Args:
+        sheetname (str): Worksheet name
+        columns (dict(str, list)): Cell values by header, excluding header
+
+    Returns:
+        dict(str, list), list(dict): Transformed columns, and for each
+        column, a report of its type and the number of values, and of
+        tokens replaced
+    """
+    transformed: Columns = {}
+    reports: List[ColumnReport] = []
+    for header, values in columns.items():
+        cells: np.ndarray = np.empty(len(values), dtype=object)
+        cells[:] = values
+        tokens: np.ndarray = cells == STATA_UNDEFINED_TOKEN
+        filled: np.ndarray = ~(tokens | (cells == '') | (cells == None))
+        n_values: int = int(np.count_nonzero(filled))
+        try:
+            cells[filled].astype(float)
+            numeric: bool = True
+        except (TypeError, ValueError):
+            numeric: bool = False
+
+        column_type: str = 'empty' if not n_values \
+            else 'numeric' if numeric else 'text'
+        if column_type != 'text':
+            cells[tokens] = None
+        transformed[header] = values if column_type == 'text' \
+            else cells.tolist()
+        reports.append({
+            'transform': clean_stata_undefined_tokens.__name__,
+            'sheet': sheetname,
+            'column': header,
+            'type': column_type,
+            'values': n_values,
+            'replaced': int(np.count_nonzero(tokens))
+            if column_type != 'text' else 0})
+
+    return transformed, reports
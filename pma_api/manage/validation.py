@@ -0,0 +1,393 @@
+"""Validation of dataset workbooks, before anything is loaded.
+
+Worksheets are checked a column at a time, from the parsed workbook cache,
+so that a bad dataset is rejected within seconds, with every violation found
+rather than the first, and before the database is touched. Checked are:
+    - Headers, which must be columns, or otherwise understood, e.g. 'label'
+    - Codes referring to another worksheet, which must be in it
+    - Values of number and date columns, which must be of that type
+    - Values of required columns, which must not be empty
+    - Codes, and other unique values, which must not be repeated
+    - Data points, which must be unique by survey, indicator and
+    characteristics, across all data worksheets
+
+Example usage:
+    violations = validate_workbook(wb)
+"""
+from datetime import datetime
+from typing import Dict, Iterable, List, Set, Tuple
+
+from sqlalchemy import Column
+
+from pma_api.config import IGNORE_FIELD_PREFIX
+from pma_api.error import PmaApiDatasetValidationError
+from pma_api.manage.db_mgmt import ORDERED_METADATA_SHEET_MODEL_MAP, \
+    DATASET_WB_SHEET_MODEL_MAP, get_datasheet_names
+from pma_api.manage.transforms import STATA_UNDEFINED_TOKEN, is_number
+from pma_api.manage.workbook import Workbook
+from pma_api.models import db, Data, Translation
+
+Columns = Dict[str, List]
+Violation = Dict[str, object]
+
+# Columns holding codes of records of another worksheet, by worksheet
+# ('data' for all data worksheets): column, worksheet, and if required
+SHEET_REFERENCES: Dict[str, Tuple[Tuple[str, str, bool], ...]] = {
+    'survey': (('country_code', 'country', True),
+               ('geography_code', 'geography', False)),
+    'char': (('char_grp_code', 'char_grp', True),),
+    'data': (('survey_code', 'survey', True),
+             ('indicator_code', 'indicator', True),
+             ('char1_code', 'char', False),
+             ('char2_code', 'char', False))}
+# Columns identifying a data point
+DATA_POINT_KEY: Tuple[str, ...] = Data.NATURAL_KEY
+# Format of dates in worksheets, as parsed by the models
+DATE_FORMAT = '%m-%Y'
+# Headers which are not columns, but are understood by the model
+MODEL_HEADERS: Dict[db.Model, Tuple[str, ...]] = {
+    Translation: ('english', 'english_code')}
+MAX_VIOLATIONS_SHOWN = 50
+
+
+def is_empty(value) -> bool:
+    """Is cell value empty, or the Stata undefined token?
+
+    Args:
+        value: Cell value
+
+    Returns:
+        bool: True if empty
+    """
+    return value == '' or value is None or value == STATA_UNDEFINED_TOKEN
+
+
+def violation(sheet: str, row: int, column: str, value, problem: str) \
+        -> Violation:
+    """Describe a violation
+
+    Args:
+        sheet (str): Worksheet name
+        row (int): Row number, as shown in a spreadsheet, or None if not about
+        a row
+        column (str): Header of column
+        value: Cell value
+        problem (str): What is wrong
+
+    Returns:
+        dict: Violation
+    """
+    return {'sheet': sheet, 'row': row, 'column': column, 'value': value,
+            'problem': problem}
+
+
+def model_columns(model: db.Model) -> Dict[str, Column]:
+    """Get columns of model, but 'id'
+
+    Args:
+        model (db.Model): Model
+
+    Returns:
+        dict(str, Column): Columns by name
+    """
+    return {x.name: x for x in model.__table__.columns if x.name != 'id'}
+
+
+def check_headers(sheet: str, header: List[str], model: db.Model,
+                  references: Iterable[str]) -> List[Violation]:
+    """Check that headers are columns of model, or otherwise understood
+
+    English fields are understood, e.g. 'label' for 'label_id', and so are
+    code references. Except in data worksheets, which are not loaded through
+    models, headers with the ignore prefix are too.
+
+    Args:
+        sheet (str): Worksheet name
+        header (list(str)): Header row
+        model (db.Model): Model of worksheet
+        references (list(str)): Headers of code references
+
+    Returns:
+        list(dict): Violations
+    """
+    known: Set[str] = set(model_columns(model)) | set(references) \
+        | set(getattr(model, 'english_fields', ())) \
+        | set(MODEL_HEADERS.get(model, ()))
+    if model == Data:
+        known.discard('code')
+
+    unknown: List[str] = [x for x in header if x not in known]
+
+    return [violation(sheet, None, x, None, 'unknown column')
+            for x in unknown if not str(x).startswith(IGNORE_FIELD_PREFIX)]
+
+
+def check_types(sheet: str, columns: Columns, model: db.Model) \
+        -> List[Violation]:
+    """Check that values of number and date columns are of that type
+
+    Args:
+        sheet (str): Worksheet name
+        columns (dict(str, list)): Cell values by header, excluding header
+        model (db.Model): Model of worksheet
+
+    Returns:
+        list(dict): Violations
+    """
+    violations: List[Violation] = []
+    for name, column in model_columns(model).items():
+        if name not in columns:
+            continue
+        python_type: type = column.type.python_type
+        for i, value in enumerate(columns[name], 2):
+            if is_empty(value):
+                continue
+            if python_type in (int, float, bool) and not is_number(value):
+                violations.append(
+                    violation(sheet, i, name, value, 'not a number'))
+            elif python_type is int and not float(value).is_integer():
+                violations.append(
+                    violation(sheet, i, name, value, 'not an integer'))
+            elif python_type is datetime:
+                try:
+                    datetime.strptime(str(value), DATE_FORMAT)
+                except ValueError:
+                    violations.append(violation(
+                        sheet, i, name, value,
+                        'not a date of format "{}"'.format(DATE_FORMAT)))
+
+    return violations
+
+
+def check_required(sheet: str, columns: Columns, model: db.Model) \
+        -> List[Violation]:
+    """Check that values of required columns are not empty
+
+    Args:
+        sheet (str): Worksheet name
+        columns (dict(str, list)): Cell values by header, excluding header
+        model (db.Model): Model of worksheet
+
+    Returns:
+        list(dict): Violations
+    """
+    english_fields: Tuple[str] = getattr(model, 'english_fields', ())
+    violations: List[Violation] = []
+    for name, column in model_columns(model).items():
+        if column.nullable:
+            continue
+        header: str = name[:-len('_id')] \
+            if name[:-len('_id')] in english_fields else name
+        if header not in columns:
+            violations.append(
+                violation(sheet, None, header, None, 'missing column'))
+            continue
+        violations += [violation(sheet, i, header, value, 'empty')
+                       for i, value in enumerate(columns[header], 2)
+                       if is_empty(value)]
+
+    return violations
+
+
+def check_unique(sheet: str, columns: Columns, model: db.Model) \
+        -> List[Violation]:
+    """Check that values of unique columns are not repeated
+
+    Args:
+        sheet (str): Worksheet name
+        columns (dict(str, list)): Cell values by header, excluding header
+        model (db.Model): Model of worksheet
+
+    Returns:
+        list(dict): Violations
+    """
+    violations: List[Violation] = []
+    for name, column in model_columns(model).items():
+        if not column.unique or name not in columns:
+            continue
+        rows: Dict = {}
+        for i, value in enumerate(columns[name], 2):
+            if is_empty(value):
+                continue
+            if value in rows:
+                violations.append(violation(
+                    sheet, i, name, value,
+                    'duplicate of row {}'.format(rows[value])))
+            else:
+                rows[value] = i
+
+    return violations
+
+
+def check_references(sheet: str, columns: Columns,
+                     references: Iterable[Tuple[str, str, bool]],
+                     codes: Dict[str, Set]) -> List[Violation]:
+    """Check that codes referring to another worksheet are in it
+
+    Args:
+        sheet (str): Worksheet name
+        columns (dict(str, list)): Cell values by header, excluding header
+        references (list(tuple)): Column, worksheet referred to, and if
+        required, of each reference
+        codes (dict(str, set)): Codes by worksheet
+
+    Returns:
+        list(dict): Violations
+    """
+    violations: List[Violation] = []
+    for name, referred_sheet, required in references:
+        if name not in columns:
+            if required:
+                violations.append(
+                    violation(sheet, None, name, None, 'missing column'))
+            continue
+        referred_codes: Set = codes.get(referred_sheet, set())
+        for i, value in enumerate(columns[name], 2):
+            if is_empty(value):
+                if required:
+                    violations.append(violation(sheet, i, name, value,
+                                                'empty'))
+            elif value not in referred_codes:
+                violations.append(violation(
+                    sheet, i, name, value,
+                    'no record with this code in "{}"'.format(referred_sheet)))
+
+    return violations
+
+
+def check_sheet(sheet: str, header: List[str], columns: Columns,
+                model: db.Model, references: Tuple[Tuple[str, str, bool]],
+                codes: Dict[str, Set]) -> List[Violation]:
+    """Run all checks of a single worksheet
+
+    Args:
+        sheet (str): Worksheet name
+        header (list(str)): Header row
+        columns (dict(str, list)): Cell values by header, excluding header
+        model (db.Model): Model of worksheet
+        references (list(tuple)): Code references of worksheet
+        codes (dict(str, set)): Codes by worksheet
+
+    Returns:
+        list(dict): Violations
+    """
+    return check_headers(sheet, header, model, [x[0] for x in references]) \
+        + check_types(sheet, columns, model) \
+        + check_required(sheet, columns, model) \
+        + check_unique(sheet, columns, model) \
+        + check_references(sheet, columns, references, codes)
+
+
+def check_data_points(sheet_columns: Dict[str, Columns]) -> List[Violation]:
+    """Check that data points are not repeated, across data worksheets
+
+    Args:
+        sheet_columns (dict(str, dict)): Columns by data worksheet name
+
+    Returns:
+        list(dict): Violations
+    """
+    violations: List[Violation] = []
+    rows: Dict[Tuple, Tuple[str, int]] = {}
+    for sheet, columns in sheet_columns.items():
+        if not all(x in columns for x in DATA_POINT_KEY):
+            continue  # reported by check_references
+        keys = zip(*(columns[x] for x in DATA_POINT_KEY))
+        for i, key in enumerate(keys, 2):
+            key = tuple(None if is_empty(x) else x for x in key)
+            if key in rows:
+                violations.append(violation(
+                    sheet, i, ', '.join(DATA_POINT_KEY), list(key),
+                    'duplicate data point, of sheet "{}", row {}'
+                    .format(*rows[key])))
+            else:
+                rows[key] = (sheet, i)
+
+    return violations
+
+
+def validate_workbook(wb: Workbook, ui_wb: Workbook = None) \
+        -> List[Violation]:
+    """Validate dataset workbook
+
+    Args:
+        wb (Workbook): API data workbook
+        ui_wb (Workbook): UI data workbook, of which only translations are
+        loaded
+
+    Returns:
+        list(dict): Violations, if any
+    """
+    violations: List[Violation] = []
+    codes: Dict[str, Set] = {}
+    for sheet in list(ORDERED_METADATA_SHEET_MODEL_MAP) + ['translation']:
+        if sheet not in wb.sheet_names():
+            violations.append(
+                violation(sheet, None, None, None, 'missing worksheet'))
+            continue
+        header, columns = wb.sheet_by_name(sheet).columns()
+        codes[sheet] = \
+            {x for x in columns.get('code', []) if not is_empty(x)}
+        violations += check_sheet(
+            sheet, header, columns, DATASET_WB_SHEET_MODEL_MAP[sheet],
+            SHEET_REFERENCES.get(sheet, ()), codes)
+
+    data_sheet_columns: Dict[str, Columns] = {}
+    for sheet in get_datasheet_names(wb):
+        header, columns = wb.sheet_by_name(sheet).columns()
+        data_sheet_columns[sheet] = columns
+        violations += check_sheet(sheet, header, columns, Data,
+                                  SHEET_REFERENCES['data'], codes)
+    violations += check_data_points(data_sheet_columns)
+
+    if ui_wb and 'translation' in ui_wb.sheet_names():
+        header, columns = ui_wb.sheet_by_name('translation').columns()
+        violations += check_sheet('translation (UI data)', header, columns,
+                                  Translation, (), codes)
+
+    return violations
+
+
+def format_violations(violations: List[Violation],
+                      max_shown: int = MAX_VIOLATIONS_SHOWN) -> str:
+    """Describe violations, one per line
+
+    Args:
+        violations (list(dict)): Violations
+        max_shown (int): Number of violations to describe; others are counted
+
+    Returns:
+        str: Description
+    """
+    lines: List[str] = []
+    for x in violations[:max_shown]:
+        where: str = 'Worksheet "{}"'.format(x['sheet'])
+        if x['row'] is not None:
+            where += ', row {}'.format(x['row'])
+        if x['column'] is not None:
+            where += ', column "{}"'.format(x['column'])
+        value: str = '' if x['value'] is None \
+            else ': {}'.format(repr(x['value']))
+        lines.append('- {}: {}{}'.format(where, x['problem'], value))
+    if len(violations) > max_shown:
+        lines.append('- ...and {} more'.format(len(violations) - max_shown))
+
+    return '\n'.join(lines)
+
+
+def assert_valid_workbook(wb: Workbook, ui_wb: Workbook = None):
+    """Validate dataset workbook, raising if invalid
+
+    Args:
+        wb (Workbook): API data workbook
+        ui_wb (Workbook): UI data workbook
+
+    Raises:
+        PmaApiDatasetValidationError: Listing all violations, if any
+    """
+    violations: List[Violation] = validate_workbook(wb, ui_wb)
+    if violations:
+        raise PmaApiDatasetValidationError(
+            'Dataset is invalid, with {} violation(s). Nothing was loaded.\n'
+            .format(len(violations)) + format_violations(violations),
+            violations=violations)
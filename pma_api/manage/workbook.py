@@ -0,0 +1,405 @@
+"""Workbook reading, one worksheet at a time."""
+import os
+import pickle
+import shutil
+from datetime import date, datetime, time
+from hashlib import md5
+from typing import Any, BinaryIO, Dict, Iterator, List, Tuple, Union
+
+import xlrd
+from xlrd.sheet import Sheet
+try:
+    import openpyxl
+    from openpyxl.utils.datetime import to_excel
+except ImportError:
+    openpyxl = None
+
+from pma_api.config import PARSED_WORKBOOKS_DIR, PARSED_WORKBOOKS_KEEP
+
+# Change whenever the values read from worksheets change, so that workbooks
+# parsed before are parsed again
+PARSED_WORKBOOK_FORMAT = 1
+
+# md5 checksums of files, by path, size and modification time
+_file_md5s: Dict[Tuple[str, int, int], str] = {}
+
+
+def _file_md5_key(path: str) -> Tuple[str, int, int]:
+    """Get key of a file in memoized checksums
+
+    Args:
+        path (str): Path to file
+
+    Returns:
+        tuple: Absolute path, size and modification time in nanoseconds
+    """
+    stat: os.stat_result = os.stat(path)
+
+    return os.path.abspath(path), stat.st_size, stat.st_mtime_ns
+
+
+def remember_file_md5(path: str, checksum: str):
+    """Memoize md5 checksum of a file, computed while writing it
+
+    Side effects:
+        - Memoizes checksum, until the file is changed
+
+    Args:
+        path (str): Path to file, once written and closed
+        checksum (str): md5 hex digest
+    """
+    _file_md5s[_file_md5_key(path)] = checksum
+
+
+def file_md5(path: str) -> str:
+    """Get md5 checksum of a file, reading it in chunks
+
+    Checksums are memoized in-process, so that a file is read once, however
+    many times it is opened, unless it is changed.
+
+    Args:
+        path (str): Path to file
+
+    Returns:
+        str: md5 hex digest
+    """
+    key: Tuple[str, int, int] = _file_md5_key(path)
+    if key in _file_md5s:
+        return _file_md5s[key]
+    checksum = md5()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b''):
+            checksum.update(chunk)
+    _file_md5s[key] = checksum.hexdigest()
+
+    return _file_md5s[key]
+
+
+class Md5Writer:
+    """Writer to a file, computing its md5 checksum as it is written.
+
+    It cannot seek, so that writers such as boto3 write in order. Another
+    checksum, with the same update() and hexdigest() methods as hashlib's,
+    can be computed instead.
+
+    Example usage:
+        with open(path, 'wb') as file:
+            writer = Md5Writer(file)
+            s3_object.download_fileobj(writer)
+        remember_file_md5(path, writer.hexdigest())
+    """
+
+    def __init__(self, file: BinaryIO, checksum=None):
+        """Initialize
+
+        Args:
+            file (BinaryIO): File, opened for writing
+            checksum: Checksum to update. Defaults to a new md5 checksum.
+        """
+        self.file: BinaryIO = file
+        self.checksum = md5() if checksum is None else checksum
+
+    def write(self, data: bytes) -> int:
+        """Write data to file, and add it to checksum
+
+        Args:
+            data (bytes): Data
+
+        Returns:
+            int: Number of bytes written
+        """
+        self.checksum.update(data)
+
+        return self.file.write(data)
+
+    def hexdigest(self) -> str:
+        """Get md5 checksum of everything written
+
+        Returns:
+            str: md5 hex digest
+        """
+        return self.checksum.hexdigest()
+
+
+def xlrd_cell_value(value):
+    """Convert an openpyxl cell value to the value xlrd gives for the cell
+
+    xlrd reads every number as a float, booleans as integers, dates as
+    Excel serial numbers, and empty cells as empty strings.
+
+    Args:
+        value: openpyxl cell value
+
+    Returns:
+        any: xlrd cell value
+    """
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, int):
+        return float(value)
+    if isinstance(value, (datetime, date, time)):
+        return float(to_excel(value))
+
+    return value
+
+
+def sheet_rows(ws: Union['Worksheet', Sheet]) -> Iterator[List]:
+    """Iterate over rows of cell values of a worksheet
+
+    Args:
+        ws (Union[Worksheet, xlrd.sheet.Sheet]): Worksheet
+
+    Returns:
+        Iterator(list): Row cell values, header row first
+    """
+    if isinstance(ws, Worksheet):
+        return ws.rows()
+
+    return ([cell.value for cell in row] for row in ws.get_rows())
+
+
+class Worksheet:
+    """A worksheet, of which rows are read from file only when iterated."""
+
+    def __init__(self, workbook: 'Workbook', name: str):
+        """Initialize
+
+        Args:
+            workbook (Workbook): Workbook of worksheet
+            name (str): Worksheet name
+        """
+        self.workbook: Workbook = workbook
+        self.name: str = name
+
+    def rows(self) -> Iterator[List]:
+        """Iterate over rows of cell values, as xlrd would read them
+
+        Rows are read from the parsed workbook cache if there. Otherwise,
+        they are parsed from the workbook file, and once all have been
+        iterated over, saved to the cache.
+
+        Returns:
+            Iterator(list): Row cell values, header row first
+        """
+        cache_name: str = \
+            'sheet-{}'.format(self.workbook.sheet_names().index(self.name))
+        columns: List[List] = self.workbook.load_parsed(cache_name)
+        if columns is not None:
+            yield from (list(row) for row in zip(*columns))
+            return
+
+        rows: List[List] = []
+        for row in self.parse_rows():
+            rows.append(row)
+            yield row
+        self.workbook.save_parsed(
+            cache_name, [list(column) for column in zip(*rows)])
+
+    def columns(self) -> Tuple[List, Dict[str, List]]:
+        """Get columns of cell values
+
+        Read directly from the parsed workbook cache if there.
+
+        Returns:
+            list, dict(str, list): Header row, and cell values by header,
+            excluding header
+        """
+        cache_name: str = \
+            'sheet-{}'.format(self.workbook.sheet_names().index(self.name))
+        columns: List[List] = self.workbook.load_parsed(cache_name)
+        if columns is None:
+            columns = [list(column) for column in zip(*self.rows())]
+        header: List = [column[0] for column in columns]
+
+        return header, {column[0]: column[1:] for column in columns}
+
+    def parse_rows(self) -> Iterator[List]:
+        """Parse rows of cell values from workbook file
+
+        Rows which are entirely empty are skipped. Rows are padded or
+        truncated to the width of the header row, up to its last non-empty
+        cell.
+
+        Returns:
+            Iterator(list): Row cell values, header row first
+        """
+        book = self.workbook.book
+        if self.workbook.is_xlrd:
+            yield from ([cell.value for cell in row]
+                        for row in book.sheet_by_name(self.name).get_rows())
+            if book.on_demand and not self.workbook.path.endswith('.xlsx'):
+                book.unload_sheet(self.name)
+            return
+
+        width: int = None
+        for row in book[self.name].iter_rows(values_only=True):
+            if all(x is None for x in row):
+                continue
+            if width is None:
+                width = max(i + 1 for i, x in enumerate(row) if x is not None)
+            values: List = [xlrd_cell_value(x) for x in row[:width]]
+            yield values + [''] * (width - len(values))
+
+
+class Workbook:
+    """A workbook file, read one worksheet at a time.
+
+    Excel 2007+ (.xlsx) files are read in read-only mode using openpyxl, so
+    that only the rows being iterated over are held in memory, rather than
+    the whole workbook. If openpyxl is not installed, or for other formats,
+    xlrd is used, loading each worksheet on demand where the format
+    supports it.
+
+    Parsed worksheets are saved column-oriented in a cache directory, keyed
+    by the md5 of the workbook file, so that the same file is only parsed
+    once. The workbook file is only opened if something is not cached.
+
+    Example usage:
+        with Workbook(path) as wb:
+            for row in wb.sheet_by_name('indicator').rows():
+                ...
+    """
+
+    def __init__(self, path: str, cache_dir: str = PARSED_WORKBOOKS_DIR):
+        """Initialize
+
+        Args:
+            path (str): Path to workbook file
+            cache_dir (str): Directory of parsed workbook cache. If empty,
+            nothing is cached.
+        """
+        self.path: str = path
+        self.is_xlrd: bool = openpyxl is None or not path.endswith('.xlsx')
+        self.md5: str = file_md5(path)
+        self.cache_dir: str = '' if not cache_dir else os.path.join(
+            cache_dir, '{}-v{}'.format(self.md5, PARSED_WORKBOOK_FORMAT))
+        self._book: Union[xlrd.book.Book, 'openpyxl.Workbook'] = None
+        self._sheet_names: List[str] = self.load_parsed('sheet_names')
+        if self._sheet_names is not None:
+            os.utime(self.cache_dir)  # mark as recently used
+
+    @property
+    def book(self) -> Union[xlrd.book.Book, 'openpyxl.Workbook']:
+        """Workbook file, opened when first needed
+
+        Returns:
+            Union[xlrd.book.Book, openpyxl.Workbook]: Workbook
+        """
+        if self._book is None:
+            self._book = xlrd.open_workbook(self.path, on_demand=True) \
+                if self.is_xlrd \
+                else openpyxl.load_workbook(
+                    self.path, read_only=True, data_only=True)
+
+        return self._book
+
+    def sheet_names(self) -> List[str]:
+        """Get worksheet names
+
+        Returns:
+            list(str): Worksheet names, in workbook order
+        """
+        if self._sheet_names is None:
+            self._sheet_names = self.book.sheet_names() if self.is_xlrd \
+                else self.book.sheetnames
+            self.save_parsed('sheet_names', self._sheet_names)
+
+        return self._sheet_names
+
+    def sheet_by_name(self, name: str) -> Worksheet:
+        """Get worksheet by name
+
+        Args:
+            name (str): Worksheet name
+
+        Raises:
+            KeyError: If there is no such worksheet
+
+        Returns:
+            Worksheet: Worksheet
+        """
+        if name not in self.sheet_names():
+            raise KeyError('No worksheet named "{}" in {}'
+                           .format(name, self.path))
+
+        return Worksheet(self, name)
+
+    def load_parsed(self, name: str) -> Any:
+        """Load object from parsed workbook cache
+
+        Args:
+            name (str): Name of cached object
+
+        Returns:
+            any: Cached object, or None if not cached
+        """
+        if not self.cache_dir:
+            return None
+        try:
+            with open(os.path.join(self.cache_dir, name + '.pickle'),
+                      'rb') as file:
+                return pickle.load(file)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+
+    def save_parsed(self, name: str, obj: Any):
+        """Save object to parsed workbook cache
+
+        The file is written under a temporary name and then renamed, so that
+        an incomplete file is never loaded.
+
+        Side effects:
+            - Writes file
+            - Removes least recently used parsed workbooks, if the cache
+            directory was created
+
+        Args:
+            name (str): Name of cached object
+            obj (any): Object to cache
+        """
+        if not self.cache_dir:
+            return
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir, exist_ok=True)
+            prune_parsed_workbooks(os.path.dirname(self.cache_dir))
+        path: str = os.path.join(self.cache_dir, name + '.pickle')
+        temp_path: str = '{}.{}.tmp'.format(path, os.getpid())
+        with open(temp_path, 'wb') as file:
+            pickle.dump(obj, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+
+    def close(self):
+        """Close workbook file, if opened"""
+        if self._book is None:
+            return
+        if self.is_xlrd:
+            self._book.release_resources()
+        else:
+            self._book.close()
+        self._book = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def prune_parsed_workbooks(cache_dir: str = PARSED_WORKBOOKS_DIR,
+                           keep: int = PARSED_WORKBOOKS_KEEP):
+    """Remove all but the most recently used parsed workbooks from cache
+
+    Side effects:
+        - Removes directories
+
+    Args:
+        cache_dir (str): Directory of parsed workbook cache
+        keep (int): Number of parsed workbooks to keep
+    """
+    paths: List[str] = [os.path.join(cache_dir, x)
+                        for x in os.listdir(cache_dir)]
+    paths.sort(key=os.path.getmtime, reverse=True)
+    for path in paths[keep:]:
+        shutil.rmtree(path, ignore_errors=True)
@@ -11,7 +11,7 @@ db = SQLAlchemy()
 
 from pma_api.models.core import Characteristic, CharacteristicGroup, Country, \
     Data, Geography, Indicator, Survey
-from pma_api.models.meta import Cache, ApiMetadata
+from pma_api.models.meta import Cache, CacheAccess, ApiMetadata
 # Depends on ApiMetadata; so import it after
 from pma_api.models.dataset import Dataset
 from pma_api.models.string import EnglishString, Translation
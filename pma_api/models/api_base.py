@@ -1,5 +1,6 @@
 """Abstract base model."""
 from datetime import datetime
+from typing import List, Tuple
 
 from pma_api.config import IGNORE_FIELD_PREFIX
 from pma_api.models import db
@@ -24,6 +25,9 @@ class ApiModel(db.Model):
     __abstract__ = True
 
     ignore_field_prefix = IGNORE_FIELD_PREFIX
+    # Fields of English text, each stored as an EnglishString record, and
+    # referenced by a '<field>_id' field
+    english_fields: Tuple[str, ...] = ()
 
     def __init__(self, *args, **kwargs):
         """Perform common tasks on kwargs."""
@@ -53,6 +57,28 @@ class ApiModel(db.Model):
         this_date = datetime.strptime(string_date, fstr)
         kwargs[source_key] = this_date
 
+    @classmethod
+    def english_strings(cls, kwargs) -> List[Tuple[str, str]]:
+        """Get English strings that initializing a record inserts
+
+        Args:
+            kwargs (dict): Keyword arguments a record would be initialized with
+
+        Returns:
+            list(tuple(str, str)): English string, and code, which is always
+            None, as any code will do
+        """
+        return [(kwargs.get(x), None) for x in cls.english_fields]
+
+    def update_kwargs_english_fields(self, kwargs):
+        """Translate all English text fields to ids of EnglishString records
+
+        Args:
+            kwargs (dict): Keyword arguments.
+        """
+        for field in self.english_fields:
+            self.update_kwargs_english(kwargs, field, field + '_id')
+
     @staticmethod
     def update_kwargs_english(kwargs, source_key, target_key):
         """Translate API query parameters to equivalent in model.
@@ -71,12 +97,7 @@ class ApiModel(db.Model):
         """
         english = kwargs.pop(source_key)
         if english:
-            record = EnglishString.query.filter_by(english=english).first()
-            if record:
-                kwargs[target_key] = record.id
-            else:
-                new_record = EnglishString.insert_unique(english)
-                kwargs[target_key] = new_record.id
+            kwargs[target_key] = EnglishString.id_for(english)
         else:
             kwargs[target_key] = None
 
@@ -1,9 +1,11 @@
 """Core db_models."""
+from typing import Dict
+
 from flask import url_for
 
 from pma_api.models import db
 from pma_api.models.api_base import ApiModel
-from pma_api.utils import next64
+from pma_api.utils import unique_content_code
 from copy import copy
 
 
@@ -11,6 +13,7 @@ class Indicator(ApiModel):
     """Indicator model."""
 
     __tablename__ = 'indicator'
+    english_fields = ('level1', 'level2', 'domain', 'definition', 'label')
     id = db.Column(db.Integer, primary_key=True)
     code = db.Column(db.String, unique=True)
     label_id = db.Column(db.Integer, db.ForeignKey('english_string.id'),
@@ -46,11 +49,7 @@ class Indicator(ApiModel):
         and (3) Calls super init.
         """
         kwargs['is_favorite'] = bool(kwargs['is_favorite'])
-        self.update_kwargs_english(kwargs, 'level1', 'level1_id')
-        self.update_kwargs_english(kwargs, 'level2', 'level2_id')
-        self.update_kwargs_english(kwargs, 'domain', 'domain_id')
-        self.update_kwargs_english(kwargs, 'definition', 'definition_id')
-        self.update_kwargs_english(kwargs, 'label', 'label_id')
+        self.update_kwargs_english_fields(kwargs)
         super(Indicator, self).__init__(**kwargs)
 
     def full_json(self, lang=None, jns=False, endpoint=None):
@@ -117,6 +116,7 @@ class CharacteristicGroup(ApiModel):
     """CharacteristicGroup model."""
 
     __tablename__ = 'characteristic_group'
+    english_fields = ('label', 'definition', 'category')
     id = db.Column(db.Integer, primary_key=True)
     code = db.Column(db.String, unique=True)
     label_id = db.Column(db.Integer, db.ForeignKey('english_string.id'))
@@ -136,9 +136,7 @@ class CharacteristicGroup(ApiModel):
         values into the EnglishString translation table if not present, and
         (4) calls super init.
         """
-        self.update_kwargs_english(kwargs, 'label', 'label_id')
-        self.update_kwargs_english(kwargs, 'definition', 'definition_id')
-        self.update_kwargs_english(kwargs, 'category', 'category_id')
+        self.update_kwargs_english_fields(kwargs)
         super(CharacteristicGroup, self).__init__(**kwargs)
 
     def full_json(self, lang=None, jns=False, index=None):
@@ -206,6 +204,7 @@ class Characteristic(ApiModel):
     """Characteristic model."""
 
     __tablename__ = 'characteristic'
+    english_fields = ('label',)
     id = db.Column(db.Integer, primary_key=True)
     code = db.Column(db.String, unique=True)
     label_id = db.Column(db.Integer, db.ForeignKey('english_string.id'))
@@ -227,7 +226,7 @@ class Characteristic(ApiModel):
         Raises:
             AttributeError: If valid ID is not found for CharacteristicGroup.
         """
-        self.update_kwargs_english(kwargs, 'label', 'label_id')
+        self.update_kwargs_english_fields(kwargs)
         self.set_kwargs_id(kwargs, 'char_grp_code', 'char_grp_id',
                            CharacteristicGroup)
         super(Characteristic, self).__init__(**kwargs)
@@ -311,6 +310,8 @@ class Data(ApiModel):
     """Data model."""
 
     __tablename__ = 'datum'
+    # Worksheet columns identifying a data point
+    NATURAL_KEY = ('survey_code', 'indicator_code', 'char1_code', 'char2_code')
     id = db.Column(db.Integer, primary_key=True)
     code = db.Column(db.String, unique=True)
     value = db.Column(db.Float, nullable=False)
@@ -339,7 +340,8 @@ class Data(ApiModel):
 
         Does a few things: (1) Updates instance based on mapping from API query
         parameter names to model field names, (2) Reformats any empty strings,
-        (3) Sets a randomly generated code string, and (4) Calls super init.
+        (3) Sets a code derived from its natural key, and (4) Calls super
+        init.
         """
         kwargs_copy = copy(kwargs)
         if kwargs:
@@ -363,9 +365,28 @@ class Data(ApiModel):
                            ', '.join(['{}: {}'.format(k, v)
                                       for k, v in kwargs_copy.items()]))
                 raise KeyError(msg)
-            kwargs['code'] = next64()
+            kwargs['code'] = unique_content_code(
+                self.natural_key(kwargs_copy),
+                lambda x: Data.query.filter_by(code=x).count() > 0)
             super(Data, self).__init__(**kwargs)
 
+    @staticmethod
+    def natural_key(record: Dict) -> tuple:
+        """Natural key of a record, from which its code is derived
+
+        The key is what identifies a data point, so that its code is the same
+        whatever its values, or the ids of the records it refers to.
+
+        Args:
+            record (dict): Cell values of worksheet row, by header
+
+        Returns:
+            tuple: Codes of survey, indicator and characteristics, empty ones
+            as None
+        """
+        return tuple(None if record.get(x) == '' else record.get(x)
+                     for x in Data.NATURAL_KEY)
+
     def full_json(self, lang=None, jns=False):
         """Return dictionary ready to convert to JSON as response.
 
@@ -427,6 +448,7 @@ class Survey(ApiModel):
     """Survey model."""
 
     __tablename__ = 'survey'
+    english_fields = ('label', 'partner')
     id = db.Column(db.Integer, primary_key=True)
     label_id = db.Column(db.Integer, db.ForeignKey('english_string.id'),
                          nullable=False)
@@ -518,8 +540,7 @@ class Survey(ApiModel):
         Raises:
             AttributeError: If valid ID is not found for Country.
         """
-        self.update_kwargs_english(kwargs, 'label', 'label_id')
-        self.update_kwargs_english(kwargs, 'partner', 'partner_id')
+        self.update_kwargs_english_fields(kwargs)
         self.update_kwargs_date(kwargs, 'start_date', '%m-%Y')
         self.update_kwargs_date(kwargs, 'end_date', '%m-%Y')
         self.set_kwargs_id(kwargs, 'country_code', 'country_id', Country,
@@ -537,6 +558,7 @@ class Country(ApiModel):
     """Country model."""
 
     __tablename__ = 'country'
+    english_fields = ('label',)
     id = db.Column(db.Integer, primary_key=True)
     label_id = db.Column(db.Integer, db.ForeignKey('english_string.id'))
     order = db.Column(db.Integer, unique=True)
@@ -611,7 +633,7 @@ class Country(ApiModel):
                 code='BF'
             )
         """
-        self.update_kwargs_english(kwargs, 'label', 'label_id')
+        self.update_kwargs_english_fields(kwargs)
         super(Country, self).__init__(**kwargs)
 
     @staticmethod
@@ -794,6 +816,7 @@ class Geography(ApiModel):
     """Geography model."""
 
     __tablename__ = 'geography'
+    english_fields = ('label', 'subheading')
     id = db.Column(db.Integer, primary_key=True)
     label_id = db.Column(db.Integer, db.ForeignKey('english_string.id'))
     order = db.Column(db.Integer, unique=True)
@@ -812,8 +835,7 @@ class Geography(ApiModel):
         Does a few things: (1) Updates instance based on mapping from API query
         parameter names to model field names, and (2) calls super init.
         """
-        self.update_kwargs_english(kwargs, 'label', 'label_id')
-        self.update_kwargs_english(kwargs, 'subheading', 'subheading_id')
+        self.update_kwargs_english_fields(kwargs)
         super(Geography, self).__init__(**kwargs)
 
     @staticmethod
@@ -1,12 +1,27 @@
 """Metadata table."""
+import logging
 import os
+import threading
+from collections import Counter
 from hashlib import md5
-from typing import Any, Dict, Union
+from time import time
+from typing import Any, Callable, Dict, Iterable, List, Tuple, Union
+from urllib.parse import parse_qs, urlencode, urlsplit
 
-from flask import url_for, Flask, current_app
+from flask import Flask, abort, current_app, json
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import DatabaseError
+from werkzeug.exceptions import HTTPException
 
-from pma_api.config import REFERENCES
+from pma_api.config import REFERENCES, CACHE_ACCESS_FLUSH_SECONDS, \
+    CACHE_WARM_UP_SIZE, CACHE_MAX_RECORDS
+from pma_api.manage.workbook import file_md5
+from pma_api import invalidation
 from pma_api.models import db
+from pma_api.utils import SingleFlight
+
+
+cache_miss_flights = SingleFlight()
 
 
 class ApiMetadata(db.Model):
@@ -21,8 +36,17 @@ class ApiMetadata(db.Model):
     created_on = db.Column(db.DateTime, default=db.func.now(),
                            onupdate=db.func.now(), index=True)
 
+    # In-process memo of values derived from records, valid only while
+    # listening for dataset activation
+    _memo: Dict[str, Any] = {}
+    _memo_generation: int = 0
+
     def __init__(self, path):
-        """Metadata init."""
+        """Metadata init.
+
+        The md5 checksum is memoized by file, so is not computed again if it
+        was while the file was downloaded, or by an earlier read.
+        """
         filename = os.path.splitext(os.path.basename(path))[0]
         self.name = filename
         if filename.startswith('api'):
@@ -31,7 +55,7 @@ class ApiMetadata(db.Model):
             self.type = 'ui'
         with open(path, 'rb') as file:
             self.blob = file.read()
-        self.md5_checksum = md5(self.blob).hexdigest()
+        self.md5_checksum = file_md5(path)
 
     @classmethod
     def get_record(cls, ui_or_api: str, as_json: bool = False) \
@@ -80,6 +104,67 @@ class ApiMetadata(db.Model):
         """
         return cls.get_record(ui_or_api='ui', as_json=as_json)
 
+    @classmethod
+    def memoized(cls, name: str, func: Callable) -> Any:
+        """Get value from in-process memo, or compute and memoize it
+
+        Values are only memoized while this process is listening for dataset
+        activation, which clears the memo. Otherwise, they are computed
+        every time.
+
+        Args:
+            name (str): Name of memoized value
+            func (Callable): Function computing value from the database
+
+        Returns:
+            any: Value
+        """
+        if not invalidation.is_listening():
+            return func()
+        try:
+            return cls._memo[name]
+        except KeyError:
+            generation: int = cls._memo_generation
+            value = func()
+            if generation == cls._memo_generation:
+                cls._memo[name] = value
+            return value
+
+    @classmethod
+    def clear_memo(cls, _md5: str = None):
+        """Clear in-process memo
+
+        Args:
+            _md5 (str): md5 of activated API data; unused
+        """
+        cls._memo_generation += 1
+        cls._memo = {}
+
+    @classmethod
+    def current_api_md5(cls) -> Union[str, None]:
+        """Get md5 of the current API data, memoized in-process
+
+        Returns:
+            str: md5, or None if there is no current API data
+        """
+        def query():
+            """Get md5 from database"""
+            record = cls.get_current_api_data()
+            return record.md5_checksum if record else None
+
+        return cls.memoized('current_api_md5', query)
+
+    @classmethod
+    def dataset_metadata_json(cls) -> List[Dict]:
+        """Get all records ready to convert to JSON, memoized in-process
+
+        Returns:
+            list(dict): API response ready to be JSONified
+        """
+        return cls.memoized(
+            'dataset_metadata_json',
+            lambda: [x.to_json() for x in cls.query.all()])
+
     def to_json(self):
         """Return dictionary ready to convert to JSON as response.
 
@@ -95,8 +180,16 @@ class ApiMetadata(db.Model):
         return result
 
 
+invalidation.subscribe(ApiMetadata.clear_memo)
+
+
 class Cache(db.Model):
-    """Cache for API responses."""
+    """Cache for API responses.
+
+    Each record is versioned by the md5 of the API data it was generated
+    from. Records are kept when a new dataset is activated, so that a stale
+    value can be served while it is regenerated in the background.
+    """
 
     __tablename__ = 'cache'
     key = db.Column(db.String, primary_key=True)
@@ -104,63 +197,479 @@ class Cache(db.Model):
     mimetype = db.Column(db.String)
     source_data_md5 = db.Column(db.String)
 
-    # TODO: Should be generalized function for all routes
+    @staticmethod
+    def route_key(path: str, args: Dict = None,
+                  names: Iterable[str] = None) -> str:
+        """Get cache key for a route
+
+        Query arguments are sorted so that equivalent requests share a key,
+        and the 'cached' argument is left out.
+
+        Args:
+            path (str): Route path, e.g. '/v1/datalab/combos'
+            args (MultiDict): Query arguments
+            names (iterable(str)): Names of query arguments to keep, if not
+            all
+
+        Returns:
+            str: Cache key, e.g. 'v1/datalab/combos?indicator=mcp_all'
+        """
+        items: List[Tuple[str, str]] = [] if not args else \
+            list(args.items(multi=True)) if hasattr(args, 'getlist') \
+            else list(args.items())
+        if names is not None:
+            items = [x for x in items if x[0] in names]
+        query: str = urlencode(sorted(x for x in items if x[0] != 'cached'))
+        key: str = path.lstrip('/')
+
+        return key + '?' + query if query else key
+
     @staticmethod
     def cache_route(route: str, app: Flask = current_app):
         """Add route to the server cache
 
-        This method checks the cache. If there is nothing cached or if the md5s
-        do not match, then a new cached response is generated and saved.
+        This method checks the cache. If there is nothing cached, then a new
+        cached response is generated and saved. If the md5s do not match, the
+        stale response is returned while a new one is generated in the
+        background.
 
         Args:
-            route (str): route to cache
+            route (str): Cache key of route, as given by `route_key()`
             app (Flask): The Flask app. There must be a current app context.
+
+        Returns:
+            Cache: The cache record
+        """
+        return Cache.get_or_generate(route, Cache._route_generator(route, app))
+
+    @staticmethod
+    def _route_generator(route: str, app: Flask) -> Callable:
+        """Get function that renders a route, bypassing the cache
+
+        Args:
+            route (str): Cache key of route, as given by `route_key()`
+            app (Flask): The Flask app
+
+        Returns:
+            Callable: Function returning value and mimetype of the response.
+            It aborts with the response if its status is not 200 OK.
+        """
+        def generate() -> Tuple[str, str]:
+            """Render route"""
+            with app.test_request_context('/' + route) as ctx:
+                endpoint, view_args = ctx.url_adapter.match()
+                view = app.view_functions[endpoint]
+                view = getattr(view, '__wrapped__', view)
+                response = app.make_response(view(**view_args))
+            if response.status_code != 200:
+                abort(response)
+
+            return response.get_data(as_text=True), response.mimetype
+
+        return generate
+
+    @staticmethod
+    def datalab_init_section_key(section: str, lang: str = None) -> str:
+        """Get cache key for a datalab init section
+
+        Args:
+            section (str): Section name, e.g. 'strings'
+            lang (str): The language, if specified.
+
+        Returns:
+            str: Cache key, e.g. 'v1/datalab/init/strings?lang=fr'
+        """
+        key: str = REFERENCES['routes']['datalab_init_section'].format(section)
+        if lang:
+            key += '?lang={}'.format(lang.lower())
+
+        return key
+
+    @staticmethod
+    def cache_datalab_init_section(section: str, lang: str = None):
+        """Add a /v1/datalab/init/<section> to the server cache.
+
+        Only the section itself is cached, not a full response, so that
+        sections can be composed together cheaply. See `get_or_generate()`.
+
+        Args:
+            section (str): Section name, e.g. 'strings'
+            lang (str): The language, if specified.
+
+        Returns:
+            Cache: The cache record
+        """
+        key: str = Cache.datalab_init_section_key(section, lang)
+
+        return Cache.get_or_generate(
+            key, Cache._datalab_init_section_generator(section, lang))
+
+    @staticmethod
+    def _datalab_init_section_generator(section: str, lang: str = None) \
+            -> Callable:
+        """Get function that generates a datalab init section
+
+        Args:
+            section (str): Section name, e.g. 'strings'
+            lang (str): The language, if specified.
+
+        Returns:
+            Callable: Function returning value and mimetype of the section
+        """
+        from pma_api.queries import DatalabData
+
+        def generate() -> Tuple[str, str]:
+            """Generate section"""
+            section_json = DatalabData.datalab_init_section(section, lang=lang)
+            return json.dumps(section_json), 'application/json'
+
+        return generate
+
+    @staticmethod
+    def get_or_generate(key: str, generate: Callable):
+        """Get cache record, generating it if needed
+
+        If there is nothing cached, a new value is generated and saved before
+        returning. Concurrent misses for the same key are coalesced: within a
+        worker, only one thread generates the value while the others wait for
+        it, and across workers, generation is serialized by a database lock on
+        the key, after which the cache is checked again.
+
+        If the record was generated from other data than what is currently
+        active, it is returned as is, and regenerated in a background thread
+        (stale-while-revalidate).
+
+        If there is no active API data, e.g. during dataset activation, any
+        cached value is returned as is. Otherwise, a value is generated but
+        not saved.
+
+        Side effects:
+            - Records access to key
+            - May modify or add cache record
+
+        Args:
+            key (str): Cache key
+            generate (Callable): Function returning value and mimetype
+
+        Returns:
+            Cache: The cache record
+        """
+        CacheAccess.record(key)
+        source_data_md5: str = ApiMetadata.current_api_md5()
+        current_cache = Cache.get(key)
+
+        if not source_data_md5:
+            if not current_cache:
+                value, mimetype = generate()
+                current_cache = Cache(key=key, value=value, mimetype=mimetype)
+        elif not current_cache:
+            cache_miss_flights.do(
+                key, Cache._generate, key, generate, source_data_md5)
+            current_cache = Cache.get(key, refresh=True)
+        elif current_cache.source_data_md5 != source_data_md5:
+            Cache._refresh_in_background(key, generate, source_data_md5)
+
+        return current_cache
+
+    @staticmethod
+    def _refresh_in_background(key: str, generate: Callable,
+                               source_data_md5: str):
+        """Regenerate cache record in a background thread
+
+        Nothing is started if the key is already being generated in this
+        worker.
+
+        Args:
+            key (str): Cache key
+            generate (Callable): Function returning value and mimetype
+            source_data_md5 (str): md5 of currently active API data
         """
-        source_data_md5 = ApiMetadata.get_current_api_data().md5_checksum
-        # example route: 'datalab_init': 'v1/datalab/init'
-        # TODO: use 'cache_datalab_init' as template
-        print(route, source_data_md5, app)
+        if cache_miss_flights.busy(key):
+            return
+        # noinspection PyProtectedMember
+        app: Flask = current_app._get_current_object()
+
+        def refresh():
+            """Regenerate cache record"""
+            with app.app_context():
+                try:
+                    cache_miss_flights.do(
+                        key, Cache._generate, key, generate, source_data_md5)
+                except Exception as err:
+                    logging.error('Failed to refresh cache for "{}": {}'
+                                  .format(key, err))
+
+        threading.Thread(target=refresh, daemon=True).start()
 
     @staticmethod
-    def cache_datalab_init(app: Flask = current_app):
-        """Add /v1/datalab/init to the server cache.
+    def _generate(key: str, generate: Callable, source_data_md5: str):
+        """Generate and save a cache record, unless already current
 
-        This method checks the cache. If there is nothing cached or if the md5s
-        do not match, then a new cached response is generated and saved.
+        If the value can no longer be generated, e.g. a route responds with
+        404 Not Found for the new data, the record is deleted.
+
+        Side effects:
+            - Takes a transaction-scoped database lock on the key
+            - Modifies, adds, or deletes cache record
+            - Evicts least recently accessed records, if one is added
+
+        Args:
+            key (str): Cache key
+            generate (Callable): Function returning value and mimetype
+            source_data_md5 (str): md5 of currently active API data
+        """
+        Cache._lock(key)  # released on commit
+        current_cache = Cache.get(key, refresh=True)
+        if current_cache and current_cache.source_data_md5 == source_data_md5:
+            db.session.commit()
+            return
+
+        try:
+            value, mimetype = generate()
+        except HTTPException:
+            if current_cache:
+                db.session.delete(current_cache)
+            db.session.commit()
+            raise
+        except Exception:
+            db.session.rollback()
+            raise
+
+        if current_cache:
+            current_cache.value = value
+            current_cache.mimetype = mimetype
+            current_cache.source_data_md5 = source_data_md5
+        else:
+            new_cache = Cache(key=key,
+                              value=value,
+                              mimetype=mimetype,
+                              source_data_md5=source_data_md5)
+            db.session.add(new_cache)
+        db.session.commit()
+        if not current_cache:
+            Cache.evict()
+
+    @staticmethod
+    def evict(max_records: int = CACHE_MAX_RECORDS):
+        """Delete least recently accessed records, beyond max_records
+
+        Records with no access logged yet, i.e. not yet flushed, are taken to
+        be the most recently accessed.
+
+        Side effects:
+            - Deletes cache records, and their access logs
+
+        Args:
+            max_records (int): Number of records to keep
+        """
+        try:
+            excess: int = Cache.query.count() - max_records
+            if excess <= 0:
+                return
+            keys: List[str] = [x.key for x in db.session.query(Cache.key)
+                               .outerjoin(CacheAccess,
+                                          CacheAccess.key == Cache.key)
+                               .order_by(CacheAccess.last_accessed.is_(None),
+                                         CacheAccess.last_accessed)
+                               .limit(excess)]
+            Cache.query.filter(Cache.key.in_(keys)) \
+                .delete(synchronize_session=False)
+            CacheAccess.query.filter(CacheAccess.key.in_(keys)) \
+                .delete(synchronize_session=False)
+            db.session.commit()
+        except DatabaseError as err:
+            db.session.rollback()
+            logging.error('Failed to evict cache records: {}'.format(err))
+
+    @staticmethod
+    def _lock(key: str):
+        """Wait for and take a database lock on cache key
+
+        The lock is a Postgres transaction-level advisory lock, so it is
+        released when the current transaction is committed or rolled back.
+        Other databases have no such lock, in which case this does nothing.
+
+        Args:
+            key (str): Cache key
+        """
+        if db.engine.dialect.name != 'postgresql':
+            return
+        db.session.execute(
+            'SELECT pg_advisory_xact_lock(hashtext(:lock_key))',
+            {'lock_key': 'pma_api.cache:' + key})
+
+    @staticmethod
+    def _generator(key: str, app: Flask) -> Callable:
+        """Get function that generates the value of a cache key
+
+        Args:
+            key (str): Cache key
+            app (Flask): The Flask app
+
+        Returns:
+            Callable: Function returning value and mimetype
+        """
+        from pma_api.queries import DatalabData
+
+        parts = urlsplit(key)
+        for section in DatalabData.init_sections():
+            if parts.path == Cache.datalab_init_section_key(section):
+                lang: str = parse_qs(parts.query).get('lang', [None])[0]
+                return Cache._datalab_init_section_generator(section, lang)
+
+        return Cache._route_generator(key, app)
+
+    @staticmethod
+    def warm_up(app: Flask = current_app, size: int = CACHE_WARM_UP_SIZE):
+        """Regenerate server cache for the active API data
+
+        Regenerates every section of /v1/datalab/init, including the
+        'strings' section for each individual language, and then the most
+        requested of any other cached keys. Keys which are already current
+        are skipped. Unlike when serving, stale records are regenerated
+        before returning.
 
         Args:
             app (Flask): The Flask app. There must be a current app context.
+            size (int): Number of most requested keys to regenerate
         """
-        source_data_md5 = ApiMetadata.get_current_api_data().md5_checksum
-        current_cache = Cache.get(REFERENCES['routes']['datalab_init'])
-
-        if not current_cache \
-                or current_cache.source_data_md5 != source_data_md5:
-            url = url_for('api.get_datalab_init')
-            headers = {'X-Requested-With': 'XMLHttpRequest'}
-            with app.test_request_context(url, headers=headers):
-                api_result = \
-                    app.view_functions['api.get_datalab_init'](cached=False)
-                response = api_result.to_response()
-                value = response.get_data(as_text=True).strip()
-                mimetype = response.mimetype
-                if current_cache:
-                    current_cache.value = value
-                    current_cache.mimetype = mimetype
-                    current_cache.source_data_md5 = source_data_md5
-                else:
-                    new_cache = Cache(key=REFERENCES['routes']['datalab_init'],
-                                      value=value,
-                                      mimetype=mimetype,
-                                      source_data_md5=source_data_md5)
-                    db.session.add(new_cache)
-                db.session.commit()
+        from pma_api.queries import DatalabData
+        from pma_api.models.string import Translation
+
+        with app.app_context():
+            api_data = ApiMetadata.get_current_api_data()
+            if not api_data:
+                return
+
+            keys: List[str] = \
+                [Cache.datalab_init_section_key(x)
+                 for x in DatalabData.init_sections()] + \
+                [Cache.datalab_init_section_key('strings', lang=x)
+                 for x in Translation.languages()]
+            keys += [x for x in CacheAccess.most_requested(size)
+                     if x not in keys and Cache.get(x)]
+
+            for key in keys:
+                try:
+                    cache_miss_flights.do(
+                        key, Cache._generate, key, Cache._generator(key, app),
+                        api_data.md5_checksum)
+                except HTTPException as err:
+                    logging.error('Failed to warm up cache for "{}": {}'
+                                  .format(key, err))
+
+    @property
+    def etag(self) -> str:
+        """Entity tag of cached value
+
+        The value of a cache record is fully determined by its key and the
+        source data it was generated from.
+
+        Returns:
+            str: ETag
+        """
+        return md5('|'.join((self.key, str(self.source_data_md5)))
+                   .encode('utf-8')).hexdigest()
 
     @classmethod
-    def get(cls, key):
-        """Return a record by key."""
-        return cls.query.filter_by(key=key).first()
+    def get(cls, key, refresh: bool = False):
+        """Return a record by key.
+
+        Args:
+            key (str): Cache key
+            refresh (bool): Overwrite any copy of the record already loaded in
+            the session with what is currently in the database?
+        """
+        query = cls.query.populate_existing() if refresh else cls.query
+        return query.filter_by(key=key).first()
 
     def __repr__(self):
         """Give a representation of this record."""
         return "<Cache key='{}'>".format(self.key)
+
+
+class CacheAccess(db.Model):
+    """Access log of cache keys.
+
+    Hits are counted in memory and written to the database at most every
+    CACHE_ACCESS_FLUSH_SECONDS per worker, so that serving from the cache
+    does not write to the database on every request.
+    """
+
+    __tablename__ = 'cache_access'
+    key = db.Column(db.String, primary_key=True)
+    hits = db.Column(db.Integer, nullable=False, default=0)
+    last_accessed = db.Column(db.DateTime, default=db.func.now(),
+                              onupdate=db.func.now())
+
+    _pending: Counter = Counter()
+    _pending_lock = threading.Lock()
+    _last_flush: float = time()
+
+    @classmethod
+    def record(cls, key: str):
+        """Count a hit for cache key
+
+        Args:
+            key (str): Cache key
+        """
+        with cls._pending_lock:
+            cls._pending[key] += 1
+            if time() - cls._last_flush < CACHE_ACCESS_FLUSH_SECONDS:
+                return
+            counts: Counter = cls._pending
+            cls._pending = Counter()
+            cls._last_flush = time()
+
+        cls.flush(counts)
+
+    @classmethod
+    def flush(cls, counts: Counter):
+        """Add hit counts to the database
+
+        Uses its own connection and transaction, independent of the session.
+        Counts are dropped if they cannot be written.
+
+        Args:
+            counts (Counter): Hits by cache key
+        """
+        table = cls.__table__
+        try:
+            with db.engine.begin() as connection:
+                for key, hits in counts.items():
+                    if db.engine.dialect.name == 'postgresql':
+                        statement = pg_insert(table).values(key=key, hits=hits)
+                        excluded = statement.excluded
+                        connection.execute(statement.on_conflict_do_update(
+                            index_elements=[table.c.key],
+                            set_={'hits': table.c.hits + excluded.hits,
+                                  'last_accessed': db.func.now()}))
+                        continue
+                    updated = connection.execute(
+                        table.update()
+                        .where(table.c.key == key)
+                        .values(hits=table.c.hits + hits,
+                                last_accessed=db.func.now()))
+                    if not updated.rowcount:
+                        connection.execute(
+                            table.insert().values(key=key, hits=hits))
+        except DatabaseError as err:
+            logging.error('Failed to record cache access: {}'.format(err))
+
+    @classmethod
+    def most_requested(cls, size: int) -> List[str]:
+        """Get most requested cache keys
+
+        Args:
+            size (int): Number of keys to get
+
+        Returns:
+            list(str): Cache keys, most requested first
+        """
+        records = cls.query.order_by(cls.hits.desc()).limit(size).all()
+
+        return [x.key for x in records]
+
+    def __repr__(self):
+        """Give a representation of this record."""
+        return "<CacheAccess key='{}' hits={}>".format(self.key, self.hits)
@@ -1,6 +1,13 @@
 """EnglishString & Translation model."""
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import bindparam, func
+
 from pma_api.models import db
-from pma_api.utils import next64
+from pma_api.utils import CodeAllocator, unique_content_code
+
+# Values per query when looking up strings in bulk
+STRING_LOOKUP_CHUNK_SIZE = 500
 
 
 class EnglishString(db.Model):
@@ -11,6 +18,8 @@ class EnglishString(db.Model):
     code = db.Column(db.String, unique=True)
     english = db.Column(db.String, nullable=False)
     translations = db.relationship('Translation')
+    # Interner of strings being imported, if any. See StringInterner.
+    interner: 'StringInterner' = None
 
     def to_string(self, lang=None):
         """Return string in specified language if supplied, else English.
@@ -67,12 +76,46 @@ class EnglishString(db.Model):
             record = EnglishString.insert_unique(english, code)
         return record
 
+    @staticmethod
+    def id_for(english) -> int:
+        """Get id of an English string, inserting it if not existing
+
+        Args:
+            english (str): The string in English.
+
+        Returns:
+            int: id of an EnglishString record of that string
+        """
+        interner: StringInterner = EnglishString.interner
+        if interner and english in interner.english_ids:
+            return interner.english_ids[english]
+        record = EnglishString.query.filter_by(english=english).first()
+        if record:
+            return record.id
+        return EnglishString.insert_unique(english).id
+
+    @staticmethod
+    def id_for_code(english, code) -> int:
+        """Get id of an English string by code, inserting or updating it
+
+        Args:
+            english (str): The string in English.
+            code (str): The code for the string.
+
+        Returns:
+            int: id of the EnglishString record of that code
+        """
+        interner: StringInterner = EnglishString.interner
+        if interner and code in interner.code_ids:
+            return interner.code_ids[code]
+        return EnglishString.insert_or_update(english, code).id
+
     @staticmethod
     def insert_unique(english, code=None):
         """Insert a unique record into the database.
 
         Creates a code and combines with English text to as the parameters for
-        new record.
+        new record. Codes created are derived from the English text.
 
         Args:
             english (str): The string in English to insert.
@@ -81,23 +124,32 @@ class EnglishString(db.Model):
         Returns:
             The new EnglishString record.
         """
-        # TODO: (jkp 2017-08-29) This is not necessary because next64 now
-        # returns unique. Needs: Nothing.
         if code is None:
-            code = next64()
+            code = unique_content_code(english, lambda x: EnglishString.query
+                                       .filter_by(code=x).count() > 0)
         record = EnglishString(code=code, english=english)
         db.session.add(record)
         # TODO: Resolve - Committing causes slow, but remove causes error
         db.session.commit()
         return record
 
-    def datalab_init_json(self):
-        """Datalab init json: EnglishString."""
-        this_dict = {
-            'en': self.english
-        }
-        for translation in self.translations:
-            this_dict[translation.language_code] = translation.translation
+    def datalab_init_json(self, lang=None):
+        """Datalab init json: EnglishString.
+
+        Args:
+            lang (str): The language, if specified. If supplied, only text
+            for that language is included.
+        """
+        if lang is not None:
+            this_dict = {
+                lang.lower(): self.to_string(lang)
+            }
+        else:
+            this_dict = {
+                'en': self.english
+            }
+            for translation in self.translations:
+                this_dict[translation.language_code] = translation.translation
         to_return = {
             self.code: this_dict
         }
@@ -145,21 +197,29 @@ class Translation(db.Model):
         """
         self.prune_ignored_fields(kwargs)
         if kwargs.get('english_code'):
-            english = EnglishString.insert_or_update(
+            kwargs['english_id'] = EnglishString.id_for_code(
                 kwargs['english'], kwargs['english_code'].lower())
             kwargs.pop('english_code')
         else:
-            english = EnglishString.query.filter_by(english=kwargs['english'])\
-                .first()
-        try:
-            kwargs['english_id'] = english.id
-        except AttributeError:
-            new_record = EnglishString.insert_unique(kwargs['english'])
-            kwargs['english_id'] = new_record.id
+            kwargs['english_id'] = EnglishString.id_for(kwargs['english'])
 
         kwargs.pop('english')
         super(Translation, self).__init__(**kwargs)
 
+    @staticmethod
+    def english_strings(kwargs) -> List[Tuple[str, str]]:
+        """Get English strings that initializing a record inserts or updates
+
+        Args:
+            kwargs (dict): Keyword arguments a record would be initialized with
+
+        Returns:
+            list(tuple(str, str)): English string, and code if any
+        """
+        code: str = kwargs.get('english_code')
+
+        return [(kwargs.get('english'), code.lower() if code else None)]
+
     @staticmethod
     def prune_ignored_fields(kwargs):
         """Prune ignored fields.
@@ -184,3 +244,164 @@ class Translation(db.Model):
         else:
             preview = self.translation
         return '<Translation ({}) "{}">'.format(self.language_code, preview)
+
+
+class StringInterner:
+    """Resolves English strings of records being imported, in bulk.
+
+    Rather than each record looking up, and inserting or updating, each of
+    its strings, and committing, all strings of a worksheet are looked up
+    with one query per chunk of them. Those missing are then inserted, and
+    those of which the English changed updated, in one batch each. While
+    the interner is entered, EnglishString.id_for() and id_for_code() return
+    the ids it resolved, falling back to a query for any other string.
+
+    Strings are inserted in the order records would have inserted them one
+    at a time, so that they get the same ids. Strings without a code are
+    given codes derived from their English text. One interner can be used
+    for all worksheets of a dataset, so that strings already resolved, and
+    codes already taken, are not queried again.
+
+    Example usage:
+        interner = StringInterner()
+        interner.intern(Translation.english_strings(x) for x in rows)
+        with interner:
+            records = [Translation(**x) for x in rows]
+    """
+
+    def __init__(self):
+        """Initialize"""
+        self.english_ids: Dict[str, int] = {}
+        self.code_ids: Dict[str, int] = {}
+        self.code_texts: Dict[str, str] = {}  # English of each code, as saved
+        self.allocator: CodeAllocator = None
+        self.last_id: int = None  # of strings whose codes allocator knows
+
+    def intern(self, strings: Iterable[Tuple[str, str]]):
+        """Resolve ids of strings, inserting or updating them as needed
+
+        As when records are initialized one at a time, the English of a
+        code given more than once is the last given.
+
+        Side effects:
+            - Inserts and updates EnglishString records, in current session's
+            transaction
+
+        Args:
+            strings (Iterable(tuple(str, str))): English string, and code if
+            the string should have that code, else None. Strings without a
+            code are matched to any existing string of the same English.
+        """
+        strings: List[Tuple[str, str]] = \
+            [(english, code) for english, code in strings if english or code]
+        codes: List[str] = list({x for _, x in strings
+                                 if x and x not in self.code_ids})
+        texts: List[str] = list({english for english, code in strings
+                                 if not code and english not in
+                                 self.english_ids})
+        for chunk in self._chunks(codes):
+            for _id, code, english in \
+                    db.session.query(EnglishString.id, EnglishString.code,
+                                     EnglishString.english) \
+                    .filter(EnglishString.code.in_(chunk)):
+                self.code_ids[code] = _id
+                self.code_texts[code] = english
+        for chunk in self._chunks(texts):
+            self.english_ids.update(
+                db.session.query(EnglishString.english,
+                                 func.min(EnglishString.id))
+                .filter(EnglishString.english.in_(chunk))
+                .group_by(EnglishString.english))
+
+        inserts: List[Dict[str, str]] = []
+        coded_inserts: Dict[str, Dict[str, str]] = {}
+        updates: Dict[int, str] = {}  # English by id
+        inserted_texts: set = set()
+        for english, code in strings:
+            if code in coded_inserts:
+                coded_inserts[code]['english'] = english
+                continue
+            elif code in self.code_ids:
+                if self.code_texts[code] != english:
+                    _id: int = self.code_ids[code]
+                    if self.english_ids.get(self.code_texts[code]) == _id:
+                        del self.english_ids[self.code_texts[code]]
+                    updates[_id] = self.code_texts[code] = english
+                continue
+            elif code:
+                coded_inserts[code] = {'code': code, 'english': english}
+                inserts.append(coded_inserts[code])
+            elif english not in self.english_ids \
+                    and english not in inserted_texts:
+                inserts.append({'code': None, 'english': english})
+            else:
+                continue
+            inserted_texts.add(english)
+
+        uncoded: List[Dict[str, str]] = [x for x in inserts if not x['code']]
+        if uncoded:
+            allocator: CodeAllocator = self.code_allocator()
+            allocator.taken.update(coded_inserts)
+            for record, code in zip(uncoded, allocator.allocate(
+                    x['english'] for x in uncoded)):
+                record['code'] = code
+
+        table = EnglishString.__table__
+        if updates:
+            db.session.execute(
+                table.update().where(table.c.id == bindparam('_id'))
+                .values(english=bindparam('english')),
+                [{'_id': k, 'english': v} for k, v in updates.items()])
+        if not inserts:
+            return
+        db.session.execute(table.insert(), inserts)
+        for chunk in self._chunks([x['code'] for x in inserts]):
+            self.code_ids.update(
+                db.session.query(EnglishString.code, EnglishString.id)
+                .filter(EnglishString.code.in_(chunk)))
+        for record in inserts:  # in order of id
+            self.code_texts[record['code']] = record['english']
+            self.english_ids.setdefault(
+                record['english'], self.code_ids[record['code']])
+
+    def code_allocator(self) -> CodeAllocator:
+        """Get allocator of codes for strings without one
+
+        Codes of all strings are loaded once, and afterwards only those of
+        strings inserted since, e.g. by this interner.
+
+        Returns:
+            CodeAllocator: Allocator, knowing all codes taken
+        """
+        if not self.allocator:
+            self.allocator = CodeAllocator()
+        query = db.session.query(EnglishString.id, EnglishString.code)
+        if self.last_id is not None:
+            query = query.filter(EnglishString.id > self.last_id)
+        for _id, code in query:
+            self.allocator.taken.add(code)
+            self.last_id = _id if self.last_id is None \
+                else max(self.last_id, _id)
+
+        return self.allocator
+
+    @staticmethod
+    def _chunks(values: List, size: int = STRING_LOOKUP_CHUNK_SIZE) \
+            -> Iterable[List]:
+        """Split values into chunks, e.g. for IN clauses
+
+        Args:
+            values (list): Values
+            size (int): Maximum number of values per chunk
+
+        Returns:
+            Iterable(list): Chunks of values
+        """
+        return (values[i:i + size] for i in range(0, len(values), size))
+
+    def __enter__(self):
+        EnglishString.interner = self
+        return self
+
+    def __exit__(self, *args):
+        EnglishString.interner = None
@@ -86,8 +86,7 @@ class Task(db.Model):
 
         validation: bool = True if update or validate else False
         with app.app_context():
-            all_tasks: List[Task] = cls.query.all()
-            tasks: List[Task] = [x for x in all_tasks if x.is_active]
+            tasks: List[Task] = cls.query.filter_by(is_active=True).all()
         actually_inactive_tasks: List[Task] = [] if not validation else \
             [x for x in tasks if not validate_active_task_status(x.id)]
 
@@ -0,0 +1,340 @@
+"""Streaming of task progress to clients.
+
+Tasks report progress far more often than clients need it, and each report
+written to the Celery result backend is read back by every client polling
+the task's status. So reports are coalesced by a `ProgressPublisher`: the
+latest is published over Redis at most every TASK_PROGRESS_PUBLISH_SECONDS,
+and written to the result backend at most every
+TASK_PROGRESS_BACKEND_SECONDS, with the last report of each always sent.
+
+Clients then follow a task as server-sent events, from `stream()`: the
+latest report kept in Redis, then each one published. Where the message
+broker is not Redis, reports are instead read from the result backend, every
+ASYNC_SECONDS_BETWEEN_STATUS_CHECKS.
+
+Example usage:
+    publisher = ProgressPublisher(task_id, write=write_to_backend)
+    publisher.report({'status': 'Loading', 'current': 0.5, 'total': 1})
+    publisher.close()
+"""
+import json
+import logging
+import os
+import threading
+from time import monotonic, sleep
+from typing import Callable, Dict, Iterator, Optional, Union
+
+import redis
+
+from pma_api.config import Config, ASYNC_SECONDS_BETWEEN_STATUS_CHECKS, \
+    TASK_PROGRESS_PUBLISH_SECONDS, TASK_PROGRESS_BACKEND_SECONDS, \
+    TASK_PROGRESS_HEARTBEAT_SECONDS, TASK_PROGRESS_STREAM_MAX_SECONDS, \
+    TASK_PROGRESS_SNAPSHOT_SECONDS
+
+Report = Dict[str, Union[str, int, float]]
+
+CHANNEL_PREFIX = 'pma_api_task_progress:'
+SNAPSHOT_PREFIX = 'pma_api_task_progress_latest:'
+FINAL_STATES = ('SUCCESS', 'FAILURE', 'REVOKED')
+REDIS_SCHEMES = ('redis://', 'rediss://', 'unix://')
+SECONDS_BETWEEN_RECONNECTS = 5
+RECONNECT_MILLISECONDS = 500  # for clients, when a stream ends
+
+_client_lock = threading.Lock()
+_clients: Dict[int, redis.Redis] = {}  # by process id
+_failed_at: float = None
+
+
+def redis_client(url: str = Config.CELERY_BROKER_URL) -> \
+        Optional[redis.Redis]:
+    """Get Redis client of this process, created when first needed
+
+    Args:
+        url (str): URL of message broker
+
+    Returns:
+        redis.Redis: Client, or None if message broker is not Redis
+    """
+    if not url or not url.startswith(REDIS_SCHEMES):
+        return None
+    pid: int = os.getpid()
+    if pid not in _clients:
+        with _client_lock:
+            if pid not in _clients:
+                _clients.clear()
+                _clients[pid] = redis.Redis.from_url(
+                    url, socket_connect_timeout=SECONDS_BETWEEN_RECONNECTS,
+                    socket_timeout=SECONDS_BETWEEN_RECONNECTS)
+
+    return _clients[pid]
+
+
+def channel(task_id: str) -> str:
+    """Get Redis channel reports of a task are published on
+
+    Args:
+        task_id (str): Task id
+
+    Returns:
+        str: Channel
+    """
+    return CHANNEL_PREFIX + task_id
+
+
+def snapshot_key(task_id: str) -> str:
+    """Get Redis key latest report of a task is kept under
+
+    Args:
+        task_id (str): Task id
+
+    Returns:
+        str: Key
+    """
+    return SNAPSHOT_PREFIX + task_id
+
+
+def publish(task_id: str, report: Report) -> bool:
+    """Publish report of a task, and keep it as the latest
+
+    Failures are logged rather than raised, so as not to fail the task, and
+    publishing is skipped for a while after one.
+
+    Side effects:
+        - Publishes to Redis, and sets key
+
+    Args:
+        task_id (str): Task id
+        report (dict): Task status report
+
+    Returns:
+        bool: True if published
+    """
+    global _failed_at
+    if _failed_at and monotonic() - _failed_at < SECONDS_BETWEEN_RECONNECTS:
+        return False
+    client: redis.Redis = redis_client()
+    if not client:
+        return False
+    message: str = json.dumps(report, default=str)
+    try:
+        pipe = client.pipeline()
+        pipe.set(snapshot_key(task_id), message,
+                 ex=TASK_PROGRESS_SNAPSHOT_SECONDS)
+        pipe.publish(channel(task_id), message)
+        pipe.execute()
+    except redis.RedisError as err:
+        _failed_at = monotonic()
+        logging.warning('Task progress could not be published: {}'
+                        .format(err))
+        return False
+    _failed_at = None
+
+    return True
+
+
+def task_report(task_id: str, state: str, meta: Dict) -> Report:
+    """Get task status report from progress reported by task
+
+    Args:
+        task_id (str): Task id
+        state (str): Task state
+        meta (dict): Progress, as written to result backend: 'status',
+        'current', 'total' and other 'args'
+
+    Returns:
+        dict: Task status report, as `task_utils.get_task_status()` returns
+    """
+    return {
+        'id': task_id,
+        'url': '',
+        'state': state,
+        'status': meta.get('status', state),
+        'current': meta.get('current', 0),
+        'total': meta.get('total', 1),
+        **meta.get('args', {})}
+
+
+class ProgressPublisher:
+    """Publisher of progress of a task, coalescing reports.
+
+    Reports arriving before the next may be published are held, and the
+    latest published when it may be, from a timer thread. Writes to the
+    result backend are made only from the thread reporting, so those held
+    are written with the next report, or on closing.
+    """
+
+    def __init__(self, task_id: str, write: Callable[[Dict], None],
+                 publish_seconds: float = TASK_PROGRESS_PUBLISH_SECONDS,
+                 backend_seconds: float = TASK_PROGRESS_BACKEND_SECONDS):
+        """Initialize
+
+        Args:
+            task_id (str): Task id
+            write (callable): Function writing progress to result backend,
+            e.g. calling `update_state()` of task
+            publish_seconds (float): Least seconds between publishes
+            backend_seconds (float): Least seconds between writes to result
+            backend
+        """
+        self.task_id: str = task_id
+        self.write: Callable[[Dict], None] = write
+        self.publish_seconds: float = publish_seconds
+        self.backend_seconds: float = backend_seconds
+        self.latest: Dict = None
+        self.unpublished: bool = False
+        self.unwritten: bool = False
+        self.published_at: float = None
+        self.written_at: float = None
+        self.timer: threading.Timer = None
+        self.lock = threading.Lock()
+
+    def publish_latest(self):
+        """Publish latest report, if not yet published"""
+        with self.lock:
+            self.timer = None
+            if not self.unpublished:
+                return
+            self.unpublished = False
+            self.published_at = monotonic()
+            publish(self.task_id,  # under lock, so as to publish in order
+                    task_report(self.task_id, 'PROGRESS', self.latest))
+
+    def write_latest(self):
+        """Write latest report to result backend, if not yet written"""
+        if self.unwritten:
+            self.unwritten = False
+            self.written_at = monotonic()
+            self.write(self.latest)
+
+    def report(self, meta: Dict):
+        """Report progress
+
+        Side effects:
+            - Publishes to Redis, now or from a timer thread
+            - Writes to result backend, if due
+
+        Args:
+            meta (dict): Progress: 'status', 'current', 'total' and other
+            'args'
+        """
+        now: float = monotonic()
+        with self.lock:
+            self.latest = meta
+            self.unpublished = self.unwritten = True
+            due_in: float = 0 if self.published_at is None else \
+                self.published_at + self.publish_seconds - now
+            if due_in > 0 and not self.timer:
+                self.timer = threading.Timer(due_in, self.publish_latest)
+                self.timer.daemon = True
+                self.timer.start()
+        if due_in <= 0:
+            self.publish_latest()
+        if self.written_at is None \
+                or now - self.written_at >= self.backend_seconds:
+            self.write_latest()
+
+    def close(self):
+        """Publish and write latest report, if not yet
+
+        Side effects:
+            - Publishes to Redis
+            - Writes to result backend
+        """
+        with self.lock:
+            if self.timer:
+                self.timer.cancel()
+        self.publish_latest()
+        self.write_latest()
+
+
+def event(report: Report, url: str = '') -> str:
+    """Format report as a server-sent event
+
+    Args:
+        report (dict): Task status report
+        url (str): URL of task status
+
+    Returns:
+        str: Event
+    """
+    return 'data: {}\n\n'.format(
+        json.dumps({**report, 'url': url}, default=str))
+
+
+def stream(task_id: str, poll: Callable[[], Report], url: str = '',
+           heartbeat_seconds: float = TASK_PROGRESS_HEARTBEAT_SECONDS,
+           max_seconds: float = TASK_PROGRESS_STREAM_MAX_SECONDS) \
+        -> Iterator[str]:
+    """Stream reports of a task as server-sent events
+
+    Streams end once the task is done, or after max_seconds, for the client
+    to reconnect. While no report is published, the result backend is read
+    every heartbeat_seconds, in case the task is done but its last report
+    was missed, and a comment is sent otherwise.
+
+    Args:
+        task_id (str): Task id
+        poll (callable): Function reading task status report from result
+        backend
+        url (str): URL of task status, set in each report
+        heartbeat_seconds (float): Seconds idle before reading the result
+        backend and sending a comment
+        max_seconds (float): Seconds after which stream ends
+
+    Yields:
+        str: Server-sent events and comments
+    """
+    deadline: float = monotonic() + max_seconds
+    client: redis.Redis = redis_client()
+    pubsub = None
+    snapshot: bytes = None
+    if client:
+        try:
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(channel(task_id))  # before reading latest
+            snapshot = client.get(snapshot_key(task_id))
+        except redis.RedisError as err:
+            logging.warning('Task progress could not be subscribed to: {}'
+                            .format(err))
+            pubsub = None
+    try:
+        report: Report = json.loads(snapshot) if snapshot else poll()
+        sent: Report = None
+        yield 'retry: {}\n\n'.format(RECONNECT_MILLISECONDS)
+        while True:
+            if report != sent:
+                yield event(report, url)
+                sent = report
+            else:
+                yield ': heartbeat\n\n'
+            if report['state'] in FINAL_STATES or monotonic() >= deadline:
+                return
+            wait: float = min(deadline - monotonic(), heartbeat_seconds
+                              if pubsub else
+                              ASYNC_SECONDS_BETWEEN_STATUS_CHECKS)
+            if not pubsub:
+                sleep(max(wait, 0))
+                report = poll()
+                continue
+            idle_until: float = monotonic() + wait
+            published: bool = False
+            try:
+                while not published and monotonic() < idle_until:
+                    # None also if a subscription message was read
+                    message: Dict = pubsub.get_message(
+                        timeout=max(idle_until - monotonic(), 0))
+                    while message:  # skip to the latest
+                        report = json.loads(message['data'])
+                        published = True
+                        message = pubsub.get_message(timeout=0)
+            except redis.RedisError as err:
+                logging.warning('Task progress subscription was lost: {}'
+                                .format(err))
+                return  # client reconnects
+            if not published and monotonic() < deadline:
+                polled: Report = poll()  # older than published, if not done
+                if polled['state'] in FINAL_STATES:
+                    report = polled
+    finally:
+        if pubsub:
+            pubsub.close()
@@ -1,10 +1,10 @@
 """Queries."""
-from collections import ChainMap
+from collections import OrderedDict
 from typing import Dict, List
 
 from flask_sqlalchemy import BaseQuery
 from sqlalchemy import or_
-from sqlalchemy.orm import aliased
+from sqlalchemy.orm import aliased, selectinload
 from sqlalchemy.orm.util import AliasedClass
 from sqlalchemy.sql.elements import BooleanClauseList
 
@@ -559,20 +559,20 @@ class DatalabData:
         """Datalab init."""
         select_args = Indicator
         joined = DatalabData.all_joined(select_args)
-        ordered = joined.order_by(Indicator.order)
+        ordered = joined.order_by(Indicator.order) \
+            .options(selectinload(Indicator.level2),
+                     selectinload(Indicator.label),
+                     selectinload(Indicator.definition))
         results = ordered.distinct().all()
 
-        indicator_categories = []
+        categories: OrderedDict = OrderedDict()  # level2 code: indicators
         for ind in results:
-            for cat in indicator_categories:
-                if ind.level2.code == cat['label.id']:
-                    cat['indicators'].append(ind.datalab_init_json())
-                    break
-            else:
-                indicator_categories.append({
-                    'label.id': ind.level2.code,
-                    'indicators': [ind.datalab_init_json()]
-                })
+            categories.setdefault(ind.level2.code, [])\
+                .append(ind.datalab_init_json())
+        indicator_categories = [
+            {'label.id': label_code, 'indicators': indicators}
+            for label_code, indicators in categories.items()]
+
         return indicator_categories
 
     @staticmethod
@@ -580,21 +580,19 @@ class DatalabData:
         """Datalab init."""
         select_args = DatalabData.char_grp1
         joined = DatalabData.all_joined(select_args)
-        ordered = joined.order_by(DatalabData.char_grp1.order)
+        ordered = joined.order_by(DatalabData.char_grp1.order) \
+            .options(selectinload(DatalabData.char_grp1.category),
+                     selectinload(DatalabData.char_grp1.label),
+                     selectinload(DatalabData.char_grp1.definition))
         results = ordered.distinct().all()
 
-        chargrp_categories = []
+        categories: OrderedDict = OrderedDict()  # category code: char grps
         for char_grp in results:
-            for cat in chargrp_categories:
-                if char_grp.category.code == cat['label.id']:
-                    cat['characteristicGroups'].append(
-                        char_grp.datalab_init_json())
-                    break
-            else:
-                chargrp_categories.append({
-                    'label.id': char_grp.category.code,
-                    'characteristicGroups': [char_grp.datalab_init_json()]
-                })
+            categories.setdefault(char_grp.category.code, [])\
+                .append(char_grp.datalab_init_json())
+        chargrp_categories = [
+            {'label.id': label_code, 'characteristicGroups': char_grps}
+            for label_code, char_grps in categories.items()]
 
         return chargrp_categories
 
@@ -602,7 +600,8 @@ class DatalabData:
     def init_chars():
         """Datalab init."""
         select_args = DatalabData.char1
-        joined = DatalabData.all_joined(select_args)
+        joined = DatalabData.all_joined(select_args) \
+            .options(selectinload(DatalabData.char1.label))
         results = joined.distinct().all()
         results = [record.datalab_init_json() if record is not None else "none"
                    for record in results]
@@ -610,52 +609,44 @@ class DatalabData:
 
     @staticmethod
     def init_surveys():
-        # pylint: disable=too-many-locals
-        # TODO (2017-09-05 jkp) refactor so that this method is simpler
-        """Datalab init."""
+        """Datalab init.
+
+        Surveys are grouped in a single pass, first by country and then by
+        geography. Ordered hash maps keep the order in which each country and
+        geography was first seen, which is the order of the query.
+        """
         select_args = Survey
         joined = DatalabData.all_joined(select_args)
         ordered = joined.order_by(Country.order) \
                         .order_by(Geography.order) \
-                        .order_by(Survey.order)
+                        .order_by(Survey.order) \
+                        .options(selectinload(Survey.country)
+                                 .selectinload(Country.label),
+                                 selectinload(Survey.geography)
+                                 .selectinload(Geography.subheading),
+                                 selectinload(Survey.label),
+                                 selectinload(Survey.partner))
         results = ordered.distinct().all()
 
-        country_order = []
-        country_map = {}
-        country_geo_map = {}
+        # OrderedDict[str, Tuple[Country, OrderedDict[str, Tuple[Geography,
+        # List[Survey]]]]]
+        countries: OrderedDict = OrderedDict()
         for survey in results:
             country = survey.country
-            country_code = country.code
             geo = survey.geography
-            geo_code = geo.code
-            country_geo_key = '|'.join((country_code, geo_code))
-            if country not in country_order:
-                country_order.append(country)
-
-            if country_code in country_map:
-                if geo not in country_map[country_code]:
-                    country_map[country_code].append(geo)
-            elif country_code not in country_map:
-                country_map[country_code] = [geo]
-
-            if country_geo_key in country_geo_map:
-                country_geo_map[country_geo_key].append(survey)
-            else:
-                country_geo_map[country_geo_key] = [survey]
+            if country.code not in countries:
+                countries[country.code] = (country, OrderedDict())
+            geographies: OrderedDict = countries[country.code][1]
+            if geo.code not in geographies:
+                geographies[geo.code] = (geo, [])
+            geographies[geo.code][1].append(survey)
 
         survey_country_list = []
-        for country in country_order:
-            this_country_geos = country_map[country.code]
-            geography_list = []
-            for geo in this_country_geos:
-                country_geo_key = '|'.join((country.code, geo.code))
-                surveys = country_geo_map[country_geo_key]
-                survey_list = [s.datalab_init_json() for s in surveys]
-                this_geo_obj = {
-                    'label.id': geo.subheading.code,
-                    'surveys': survey_list
-                }
-                geography_list.append(this_geo_obj)
+        for country, geographies in countries.values():
+            geography_list = [{
+                'label.id': geo.subheading.code,
+                'surveys': [s.datalab_init_json() for s in surveys]
+            } for geo, surveys in geographies.values()]
             this_country_obj = {
                 'label.id': country.label.code,
                 'geographies': geography_list
@@ -664,13 +655,21 @@ class DatalabData:
 
         return survey_country_list
 
-    # TODO: (jkp 2017-08-29) Get other languages. Needs: Nothing.
     @staticmethod
-    def init_strings():
-        """Datalab init."""
-        results = EnglishString.query.all()
-        results = [record.datalab_init_json() for record in results]
-        results = dict(ChainMap(*results))
+    def init_strings(lang: str = None):
+        """Datalab init.
+
+        Args:
+            lang (str): The language, if specified. If supplied, only the text
+            in that language is returned for each string, falling back to
+            English where no translation exists. Otherwise, every language is
+            returned.
+        """
+        records = EnglishString.query \
+            .options(selectinload(EnglishString.translations)).all()
+        results = {}
+        for record in records:
+            results.update(record.datalab_init_json(lang=lang))
         return results
 
     @staticmethod
@@ -678,16 +677,56 @@ class DatalabData:
         """Datalab init."""
         return Translation.languages()
 
+    @staticmethod
+    def init_sections() -> OrderedDict:
+        """Get the sections that make up the datalab init payload.
+
+        Returns:
+            OrderedDict: Map of section name, as used in the
+            '/datalab/init/<section>' route, to a tuple of the section's key
+            in the datalab init payload and the function that builds it.
+        """
+        return OrderedDict((
+            ('indicators',
+             ('indicatorCategories', DatalabData.init_indicators)),
+            ('characteristicGroups',
+             ('characteristicGroupCategories', DatalabData.init_char_grp)),
+            ('characteristics',
+             ('characteristics', DatalabData.init_chars)),
+            ('surveys',
+             ('surveyCountries', DatalabData.init_surveys)),
+            ('strings',
+             ('strings', DatalabData.init_strings)),
+            ('languages',
+             ('languages', DatalabData.init_languages)),
+        ))
+
+    @staticmethod
+    def datalab_init_section(section: str, lang: str = None):
+        """Datalab init, a single section.
+
+        Args:
+            section (str): Section name; a key of init_sections()
+            lang (str): The language, if specified. Only applies to the
+            'strings' section.
+
+        Raises:
+            KeyError: If section does not exist
+
+        Returns:
+            Section contents, ready to be JSONified
+        """
+        _, func = DatalabData.init_sections()[section]
+        if section == 'strings':
+            return func(lang=lang)
+        return func()
+
     @staticmethod
     def datalab_init():
         """Datalab Init."""
         return {
-            'indicatorCategories': DatalabData.init_indicators(),
-            'characteristicGroupCategories': DatalabData.init_char_grp(),
-            'characteristics': DatalabData.init_chars(),
-            'surveyCountries': DatalabData.init_surveys(),
-            'strings': DatalabData.init_strings(),
-            'languages': DatalabData.init_languages()
+            key: DatalabData.datalab_init_section(section)
+            for section, (key, _) in DatalabData.init_sections().items()
         }
 
     @staticmethod
@@ -1,9 +1,11 @@
 """Responses."""
+from hashlib import md5
 from io import StringIO
 from csv import DictWriter
-from typing import List
+from functools import wraps
+from typing import Callable, Dict, List
 
-from flask import Response, jsonify, make_response
+from flask import Response, json, jsonify, make_response, request
 
 from pma_api.__version__ import __version__
 
@@ -39,8 +41,7 @@ class ApiResult:
         from pma_api.models import ApiMetadata
         obj = {
             'version': __version__,
-            'datasetMetadata': [item.to_json() for item in
-                                ApiMetadata.query.all()]
+            'datasetMetadata': ApiMetadata.dataset_metadata_json()
         }
         if extra_metadata:
             obj.update(extra_metadata)
@@ -122,8 +123,123 @@ class QuerySetApiResult(ApiResult):
         return jsonify(obj)
 
 
+class CachedApiResult(ApiResult):
+    """A JSON API result composed of already serialized, cached values."""
+
+    def __init__(self, cached: Dict, metadata=None):
+        """Store input arguments.
+
+        Args:
+            cached (dict(str, Cache)): Map of keys of the returned JSON object
+                to the cache records holding their serialized values.
+            metadata (dict): A dictionary of keys and values to add to the
+                metadata field of the return object.
+        """
+        super().__init__({}, metadata)
+        self.cached = cached
+
+    @property
+    def etag(self) -> str:
+        """Entity tag of the composed response.
+
+        Returns:
+            str: ETag
+        """
+        etags: str = '|'.join(k + ':' + v.etag for k, v in self.cached.items())
+
+        return md5(etags.encode('utf-8')).hexdigest()
+
+    def to_response(self) -> Response:
+        """Make a response by joining the cached values without re-parsing.
+
+        The response is conditional; a request whose 'If-None-Match' header
+        matches the ETag gets a 304.
+        """
+        members: List[str] = [
+            '{}: {}'.format(json.dumps(key), record.value)
+            for key, record in self.cached.items()]
+        members.append(
+            '"metadata": ' + json.dumps(self.metadata(self.extra_metadata)))
+        response = Response('{' + ', '.join(members) + '}',
+                            mimetype='application/json')
+        response.set_etag(self.etag)
+
+        return response.make_conditional(request)
+
+
 # TODO: (jef/jkp 2017-08-29) Add methods for:
 # * return warnings, errors
 # * return version number
 # * documentation
 # Needs: Decision on how these should be returned.
+
+
+def with_query_parameters(record) -> Response:
+    """Make response of a cached JSON result, with query parameters of the
+    request in its metadata
+
+    Args:
+        record (Cache): Cache record of an ApiResult
+
+    Returns:
+        Response: Response, conditional on an ETag of the record and query
+        parameters
+    """
+    query_parameters: Dict[str, str] = request.args.to_dict()
+    obj: Dict = json.loads(record.value)
+    obj['metadata']['queryParameters'] = query_parameters
+    response: Response = jsonify(obj)
+    response.set_etag(md5('|'.join((
+        record.etag, json.dumps(query_parameters, sort_keys=True)))
+        .encode('utf-8')).hexdigest())
+
+    return response.make_conditional(request)
+
+
+def cached_route(*arg_names: str, query_parameters: bool = False) \
+        -> Callable:
+    """Serve route from the server cache
+
+    The cache key is the request path and the sorted query arguments the
+    route reads, so that other arguments neither miss the cache nor add
+    records to it. Requests with 'cached=false', or for CSV format, bypass
+    the cache.
+
+    Args:
+        *arg_names (str): Names of query arguments the route reads
+        query_parameters (bool): Does the route give all query arguments of
+        the request as 'queryParameters' in its metadata? If so, they are
+        filled in from the request, as the cached value has only those of
+        the cache key.
+
+    Returns:
+        Callable: Decorator of Flask view function
+    """
+    def decorator(view: Callable) -> Callable:
+        """Wrap view function
+
+        Args:
+            view (Callable): Flask view function
+
+        Returns:
+            Callable: Wrapped view function
+        """
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            """Get cache record, or bypass the cache"""
+            from pma_api.models import Cache
+
+            cache_arg: str = request.args.get('cached', '')
+            if cache_arg.lower() == 'false' \
+                    or request.args.get('format', '') == 'csv':
+                return view(*args, **kwargs)
+
+            record: Cache = Cache.cache_route(
+                Cache.route_key(request.path, request.args, arg_names))
+
+            return with_query_parameters(record) if query_parameters \
+                else record
+
+        return wrapper
+
+    return decorator
@@ -4,14 +4,17 @@ import os
 import re
 from typing import Dict, Union, List
 
-from botocore.exceptions import EndpointConnectionError
+from botocore.exceptions import ClientError, EndpointConnectionError
 from flask import jsonify, request, render_template, send_file, url_for, \
-    flash, redirect, Response
+    flash, redirect, Response, abort
 from flask_user import login_required
 from werkzeug.datastructures import ImmutableDict
 from werkzeug.utils import secure_filename
 
-from pma_api.error import ExistingDatasetError, PmaApiTaskDenialError
+from pma_api.config import TASK_PROGRESS_STREAMING, UPLOAD_CHUNK_BYTES, \
+    UPLOAD_MAX_BYTES
+from pma_api.error import ExistingDatasetError, PmaApiDbInteractionError, \
+    PmaApiTaskDenialError, PmaApiUploadError
 from pma_api.routes import root
 
 
@@ -40,20 +43,54 @@ def admin_route():
     # POST REQUESTS
     Receives a file uploaded, which is of the type:
     ImmutableMultiDict([('file', <FileStorage: 'FILENAME' ('FILETYPE')>)])
+
+    Files may be uploaded in chunks, as by Dropzone, with form fields
+    'dzuuid', 'dzchunkindex', 'dzchunkbyteoffset', 'dzchunksize',
+    'dztotalfilesize' and 'dztotalchunkcount'. Rejected chunks, and files
+    discarded as their checksum did not match, get a 400 response, so that
+    no more are sent. Chunks which cloud storage failed to store get a 502
+    response, and may be sent again.
     """
     from pma_api.manage.db_mgmt import list_cloud_datasets, download_dataset, \
         delete_dataset
-    from pma_api.models import ApiMetadata, Task
+    from pma_api.models import ApiMetadata
+    from pma_api.manage.dataset_upload import receive_chunk
+    from pma_api.task_locks import ACTIVATION_LOCK, running_tasks
     from pma_api.task_utils import upload_dataset
 
     # upload
-    if request.method == 'POST':
+    if request.method == 'POST' and 'dzuuid' in request.form:
+        form: Dict[str, str] = request.form
+        try:
+            file = request.files['file']
+            file_url: str = receive_chunk(
+                upload_id=form['dzuuid'],
+                filename=secure_filename(file.filename),
+                index=int(form['dzchunkindex']),
+                data=file.read(),
+                offset=int(form['dzchunkbyteoffset']),
+                chunk_bytes=int(form['dzchunksize']),
+                total_bytes=int(form['dztotalfilesize']),
+                total_chunks=int(form['dztotalchunkcount']))
+            return jsonify({'success': True, 'complete': bool(file_url)})
+        except (ExistingDatasetError, PmaApiUploadError) as err:
+            return jsonify({'success': False, 'message': str(err)}), 400
+        except (KeyError, ValueError):
+            msg = 'Chunk is missing a file or form field.'
+            return jsonify({'success': False, 'message': msg}), 400
+        except PmaApiDbInteractionError as err:
+            return jsonify({'success': False, 'message': str(err)}), 400
+        except (ClientError, EndpointConnectionError) as err:
+            msg = 'Unable to store chunk in cloud storage.\n' + \
+                  err.__class__.__name__ + ': ' + str(err)
+            return jsonify({'success': False, 'message': msg}), 502
+    elif request.method == 'POST':
         try:
             file = request.files['file']
             filename = secure_filename(file.filename)
             file_url: str = upload_dataset(filename=filename, file=file)
             return jsonify({'success': bool(file_url)})
-        except ExistingDatasetError as err:
+        except (ExistingDatasetError, PmaApiUploadError) as err:
             return jsonify({'success': False, 'message': str(err)})
         except Exception as err:
             msg = 'An unexpected error occurred.\n' + \
@@ -65,12 +102,12 @@ def admin_route():
             args = request.args.to_dict()
 
             if 'download' in args:
-                # TODO: Delete tempfile after sending
-                tempfile_path: str = download_dataset(
+                # Served from local dataset store, which bounds its size
+                file_path: str = download_dataset(
                     version_number=int(args['download']))
                 return send_file(
-                    filename_or_fp=tempfile_path,
-                    attachment_filename=os.path.basename(tempfile_path),
+                    filename_or_fp=file_path,
+                    attachment_filename=os.path.basename(file_path),
                     as_attachment=True)
 
             if 'delete' in args:
@@ -88,7 +125,7 @@ def admin_route():
             re.findall(r'-v[0-9]*', active_api_dataset['name'])[0]\
             .replace('-v', '')
 
-        present_task_list: List[str] = Task.get_present_tasks()
+        present_task_list: List[str] = running_tasks(ACTIVATION_LOCK)
         task_id_url_map: Dict[str, str] = {
             task_id: url_for('root.taskstatus', task_id=task_id)
             for task_id in present_task_list}
@@ -107,7 +144,69 @@ def admin_route():
             datasets=datasets,  # List[Dict[str, str]]
             active_dataset_version=active_dataset_version,  # int
             active_tasks=present_tasks,  # str(json({id: url}))
-            this_env=os.getenv('ENV_NAME', 'development'))  # str
+            this_env=os.getenv('ENV_NAME', 'development'),  # str
+            task_progress_streaming=TASK_PROGRESS_STREAMING,  # bool
+            upload_chunk_bytes=UPLOAD_CHUNK_BYTES,  # int
+            upload_max_mib=UPLOAD_MAX_BYTES // (1024 * 1024))  # int
+
+
+@root.route('/admin/upload/<upload_id>', methods=['GET', 'DELETE'])
+@login_required
+def upload_route(upload_id: str) -> jsonify:
+    """Status of a dataset upload in chunks, e.g. to resume it; or abort it.
+
+    .. :quickref: admin; Status of a dataset upload in chunks, or abort it.
+
+    Args:
+        upload_id (str): Id client gave upload, e.g. 'dzuuid'
+
+    Returns:
+        json.jsonify: File name, number of chunks, and indexes of chunks
+        received; or a message if there is no such upload
+    """
+    from pma_api.manage.dataset_upload import abort, status
+
+    try:
+        if request.method == 'DELETE':
+            abort(upload_id)
+            return jsonify({'success': True})
+        return jsonify(status(upload_id))
+    except PmaApiUploadError as err:
+        return jsonify({'message': str(err)}), 404
+
+
+@root.route('/admin/diff', methods=['GET'])
+@login_required
+def diff_datasets_route() -> jsonify:
+    """Diff two versions of a dataset.
+
+    .. :quickref: admin; Diff two versions of a dataset.
+
+    Datasets are diffed by a task, as workbooks take a while to parse. Its
+    status, with the diff as 'diff' once done, is at the URL returned.
+
+    Query Args:
+        new (str): Version number of new dataset
+        old (str): Version number of old dataset; defaults to the active
+        dataset
+
+    Returns:
+        json.jsonify: Id and status URL of task, or a message if versions
+        are not numbers
+    """
+    from pma_api.tasks import diff_datasets
+    from pma_api.task_utils import start_task
+
+    new: str = request.args.get('new', '')
+    old: str = request.args.get('old')
+    if not new.isdigit() or (old is not None and not old.isdigit()):
+        return jsonify({'message': 'Versions must be numbers.'}), 400
+    task_id: str = \
+        start_task(func=diff_datasets, kwarg_dict={'new': new, 'old': old})
+    url: str = url_for('root.taskstatus', task_id=task_id, _external=True)
+
+    return jsonify({'id': task_id, 'url': url}), 202, \
+        {'Content-Location': url}
 
 
 # @login_required  # Transfer creds from sending to receiving server?
@@ -179,6 +278,38 @@ def taskstatus(task_id: str) -> jsonify:
     return jsonify(report)
 
 
+@root.route('/status/<task_id>/stream', methods=['GET'])
+def taskstatus_stream(task_id: str) -> Response:
+    """Stream task status, as server-sent events
+
+    Each report is sent as an event, as reported by the task, until the task
+    is done. Streams are ended after a while, and are then reconnected by the
+    client. See `pma_api.progress.stream()`. Only served if
+    TASK_PROGRESS_STREAMING is set, as each stream holds a web worker.
+
+    Args:
+        task_id (str): ID with which to look up task in task queue
+
+    Returns:
+        Response: Response object, streaming 'text/event-stream'; or 404 if
+        streaming is not enabled
+    """
+    if not TASK_PROGRESS_STREAMING:
+        abort(404)
+    from pma_api.progress import stream
+    from pma_api.task_utils import get_task_status
+
+    return Response(
+        stream(task_id=task_id,
+               poll=lambda: get_task_status(task_id=task_id,
+                                            return_format='dict'),
+               url=url_for('root.taskstatus', task_id=task_id,
+                           _external=True)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache',
+                 'X-Accel-Buffering': 'no'})  # not buffered by proxies
+
+
 # TODO 2019.04.15-jef: This feature would be ideal to add back. This would
 #  allow the user to remotely activate dataset on another server (e.g. prod
 #  from staging).
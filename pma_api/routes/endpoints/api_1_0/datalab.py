@@ -3,10 +3,10 @@ from typing import Dict, List
 
 from flask import request
 
-from pma_api.config import REFERENCES
 from pma_api.routes.endpoints.api_1_0 import api
-from pma_api.models import Cache
-from pma_api.response import ApiResult, QuerySetApiResult
+from pma_api.models import Cache, Translation
+from pma_api.response import ApiResult, CachedApiResult, \
+    QuerySetApiResult, cached_route
 from pma_api.queries import DatalabData
 
 
@@ -88,6 +88,7 @@ def get_datalab_data_json(
 
 
 @api.route('/datalab/data')
+@cached_route('survey', 'indicator', 'characteristicGroup', 'overTime')
 def get_datalab_data() -> QuerySetApiResult:
     """Datalab client endpoint for querying data.
 
@@ -112,6 +113,8 @@ def get_datalab_data() -> QuerySetApiResult:
         lang (string): Accepts 2 letter language code, e.g. "EN" for English,
         or "FR" for French. This is used in tandem with "format=csv". Default
         value is "EN". Not required.
+        cached (string): If "false", the server cache is bypassed. Not
+        required.
 
     Returns:
         QuerySetApiResult: JSON query result if format requested is JSON, else
@@ -269,6 +272,8 @@ def get_datalab_data() -> QuerySetApiResult:
 
 
 @api.route('/datalab/combos')
+@cached_route('survey', 'indicator', 'characteristicGroup',
+              query_parameters=True)
 def get_datalab_combos() -> ApiResult:
     """Datalab client endpoint for querying validmetadata combinations.
 
@@ -285,6 +290,8 @@ def get_datalab_combos() -> ApiResult:
         indicator: (string): A single indicator. Not required.
         characteristicGroup (string): A single characteristic group. Not
         required.
+        cached (string): If "false", the server cache is bypassed. Not
+        required.
 
     Returns:
         json: List of valid metadata combinations.
@@ -475,9 +482,6 @@ def get_datalab_combos() -> ApiResult:
     return ApiResult(json_obj, metadata=metadata)
 
 
-# TODO: We might as well move this cache behavior into the Flask app to apply
-# it on all routes, or we could also create a new function wrapper for all
-# our routese that we want to cahce.
 @api.route('/datalab/init')
 def get_datalab_init(cached: bool = True):
     """Datalab client endpoint for app initialization, minified.
@@ -497,7 +501,9 @@ def get_datalab_init(cached: bool = True):
         json: All of the necessary elements to render initial view of Datalab.
 
     Details:
-        Datalab client endpoint for app initialization, minified.
+        Datalab client endpoint for app initialization, minified. The cached
+        response is composed of each of the individually cached sections
+        available at "/datalab/init/<section>".
 
     Example:
         .. code-block:: json
@@ -514,12 +520,76 @@ def get_datalab_init(cached: bool = True):
         else True
 
     if request_cached or cached:
-        cache_route = REFERENCES['routes']['datalab_init']
-        cached_val = Cache.get(cache_route)
-        if not cached_val:
-            Cache.cache_datalab_init()
-            cached_val = Cache.get(cache_route)
-        return cached_val
+        cached_sections: Dict[str, Cache] = {
+            key: Cache.cache_datalab_init_section(section)
+            for section, (key, _) in DatalabData.init_sections().items()}
+        return CachedApiResult(cached_sections)
     else:
         json_obj = DatalabData.datalab_init()
         return ApiResult(json_obj)
+
+
+@api.route('/datalab/init/<section>')
+def get_datalab_init_section(section: str):
+    """Datalab client endpoint for a single section of app initialization.
+
+    .. :quickref: Datalab; Datalab client specific endpoint for a single
+     section of app initialization.
+
+    Args:
+        section (str): One of: indicators, characteristicGroups,
+        characteristics, surveys, strings, languages
+
+    Query Args:
+        lang (string): Only used by the "strings" section. Accepts 2 letter
+        language code, e.g. "en" for English, or "fr" for French. If
+        supplied, only text in that language is returned, falling back to
+        English where no translation exists. Default is all languages. Not
+        required. Unknown languages get a 400 response.
+
+    Returns:
+        json: A single section of "/datalab/init", under the same key used
+        there, e.g. "strings".
+
+    Details:
+        Each section is cached separately, and responses carry an ETag so
+        that unchanged sections can be revalidated with "If-None-Match"
+        rather than downloaded again.
+
+    Example:
+        .. code-block:: json
+           :caption: GET http://api.pma2020.org/v1/datalab/init/strings?lang=fr
+           :name: example-of-collection-datalab-init-section
+
+            {
+              "metadata": {
+                "datasetMetadata": [
+                  "..."
+                ],
+                "version": "0.1.9"
+              },
+              "strings": {
+                "cizmJ6Gv": {
+                  "fr": "Burkina Faso"
+                },
+                "...": {}
+              }
+            }
+    """
+    sections = DatalabData.init_sections()
+    if section not in sections:
+        msg = 'Error 404: Section "{}" not found. The sections available ' \
+              'are: {}'.format(section, ', '.join(sections.keys()))
+        return msg, 404
+
+    key, _ = sections[section]
+    lang: str = request.args.get('lang', None) if section == 'strings' \
+        else None
+    languages = Translation.languages()
+    if lang is not None and lang.lower() not in languages:
+        msg = 'Error 400: Language "{}" not found. The languages available ' \
+              'are: {}'.format(lang, ', '.join(languages.keys()))
+        return msg, 400
+    cached: Cache = Cache.cache_datalab_init_section(section, lang=lang)
+
+    return CachedApiResult({key: cached})
@@ -0,0 +1,348 @@
+"""Locks of tasks which must not run concurrently, e.g. dataset activation.
+
+A lock is a Postgres session-level advisory lock, taken by a task on a
+connection of its own, which it keeps for as long as it runs. If its worker
+dies, the connection is closed, and the lock released, by Postgres. The task
+also renews its lease on the lock from a thread, by using the connection
+every quarter lease. A holder which has not renewed its lease, e.g. as its
+worker is frozen or unreachable, is terminated by the next task to take the
+lock. A task which then resumes finds out that its lock is lost when it
+next renews its lease, or checks that it holds the lock, e.g. before
+swapping its dataset in.
+
+Whether a task is running is then one query, of pg_locks, rather than a
+query of the message broker about each task ever registered.
+
+Only Postgres is supported. Elsewhere, tasks registered as active are
+validated against the message broker instead.
+
+Example usage:
+    with TaskLock(ACTIVATION_LOCK, task_id):
+        ...
+"""
+import logging
+import threading
+import zlib
+from time import sleep
+from typing import Dict, List
+
+from flask import Flask, current_app
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+from pma_api.config import TASK_LOCK_LEASE_SECONDS
+from pma_api.error import PmaApiTaskDenialError, PmaApiTaskLockLostError
+
+ACTIVATION_LOCK = 'pma_api.activate_dataset'
+# Holders are identified by application name, of up to 63 characters
+APPLICATION_NAME_PREFIX = 'pma_api_task:'
+TAKEOVER_ATTEMPTS = 10
+SECONDS_BETWEEN_TAKEOVER_ATTEMPTS = 0.5
+
+HOLDERS_QUERY = text('''
+    SELECT a.pid, a.application_name,
+        extract(epoch FROM clock_timestamp() - a.query_start)
+            AS idle_seconds
+    FROM pg_locks l
+    JOIN pg_stat_activity a ON a.pid = l.pid
+    WHERE l.locktype = 'advisory' AND l.granted
+        AND l.database = (SELECT oid FROM pg_database
+                          WHERE datname = current_database())
+        AND l.classid = 0 AND l.objid = CAST(:key AS oid)
+        AND l.objsubid = 1''')
+HELD_QUERY = text('''
+    SELECT count(*) FROM pg_locks
+    WHERE pid = :pid AND locktype = 'advisory' AND granted
+        AND database = (SELECT oid FROM pg_database
+                        WHERE datname = current_database())
+        AND classid = 0 AND objid = CAST(:key AS oid) AND objsubid = 1''')
+
+
+def engine(app: Flask = current_app) -> Engine:
+    """Get database engine
+
+    Args:
+        app (Flask): The Flask app
+
+    Returns:
+        Engine: Engine
+    """
+    from pma_api.models import db
+
+    return db.get_engine(app)
+
+
+def is_supported(app: Flask = current_app) -> bool:
+    """Are locks taken in the database?
+
+    Args:
+        app (Flask): The Flask app
+
+    Returns:
+        bool: True if using Postgres
+    """
+    return engine(app).dialect.name == 'postgresql'
+
+
+def lock_key(name: str) -> int:
+    """Get key of advisory lock
+
+    Keys are positive 32 bit integers, so that pg_locks lists them by 'objid',
+    with 'classid' 0.
+
+    Args:
+        name (str): Name of lock
+
+    Returns:
+        int: Key
+    """
+    return zlib.crc32(name.encode()) & 0x7fffffff
+
+
+def holders(name: str, app: Flask = current_app) -> List[Dict]:
+    """Get holders of lock
+
+    Args:
+        name (str): Name of lock
+        app (Flask): The Flask app
+
+    Returns:
+        list(dict): 'task_id', 'pid' of connection, and 'idle_seconds' since
+        lease was last renewed, or None if not known
+    """
+    with engine(app).connect() as connection:
+        rows: List = connection.execute(
+            HOLDERS_QUERY, key=lock_key(name)).fetchall()
+
+    return [{
+        'task_id': x.application_name[len(APPLICATION_NAME_PREFIX):]
+        if x.application_name.startswith(APPLICATION_NAME_PREFIX) else '',
+        'pid': x.pid,
+        'idle_seconds': None if x.idle_seconds is None
+        else float(x.idle_seconds)} for x in rows]
+
+
+def is_expired(holder: Dict,
+               lease_seconds: float = TASK_LOCK_LEASE_SECONDS) -> bool:
+    """Has holder of lock not renewed its lease?
+
+    Args:
+        holder (dict): Holder, as returned by `holders()`
+        lease_seconds (float): Seconds lease lasts
+
+    Returns:
+        bool: True if so
+    """
+    return holder['idle_seconds'] is not None \
+        and holder['idle_seconds'] > lease_seconds
+
+
+def running_tasks(name: str, app: Flask = current_app,
+                  lease_seconds: float = TASK_LOCK_LEASE_SECONDS) \
+        -> List[str]:
+    """Get ids of tasks running, holding lock
+
+    Args:
+        name (str): Name of lock
+        app (Flask): The Flask app
+        lease_seconds (float): Seconds lease lasts
+
+    Returns:
+        list(str): Ids of tasks with a lease on lock. Elsewhere than
+        Postgres, ids of all tasks registered as active, and validated as
+        such.
+    """
+    if not is_supported(app):
+        from pma_api.models import Task
+        return Task.get_present_tasks()
+
+    return [x['task_id'] for x in holders(name, app)
+            if not is_expired(x, lease_seconds)]
+
+
+class TaskLock:
+    """Lock of a task, held on a connection of its own.
+
+    Can be used as a context manager.
+    """
+
+    def __init__(self, name: str, task_id: str, app: Flask = current_app,
+                 lease_seconds: float = TASK_LOCK_LEASE_SECONDS):
+        """Initialize
+
+        Args:
+            name (str): Name of lock
+            task_id (str): Id of task taking lock
+            app (Flask): The Flask app
+            lease_seconds (float): Seconds lease lasts, if not renewed
+        """
+        self.name: str = name
+        self.task_id: str = task_id
+        self.app: Flask = app
+        self.lease_seconds: float = lease_seconds
+        self.connection: Connection = None
+        self.pid: int = None  # of connection, on the database server
+        self.stopped = threading.Event()
+        self.lost = threading.Event()
+        self.heartbeat: threading.Thread = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+    def try_lock(self) -> bool:
+        """Try to take lock, without waiting
+
+        Returns:
+            bool: True if taken
+        """
+        return self.connection.execute(
+            text('SELECT pg_try_advisory_lock(:key)'),
+            key=lock_key(self.name)).scalar()
+
+    def take_over(self) -> bool:
+        """Take lock from holders whose leases have expired, if any
+
+        Side effects:
+            - Terminates connections of holders
+
+        Returns:
+            bool: True if taken
+        """
+        expired: List[Dict] = [x for x in holders(self.name, self.app)
+                               if is_expired(x, self.lease_seconds)]
+        if not expired:
+            return False
+        for holder in expired:
+            logging.warning(
+                'Task {} holds lock {}, but has not renewed its lease for {} '
+                'seconds. Terminating its connection.'.format(
+                    holder['task_id'], self.name,
+                    int(holder['idle_seconds'])))
+            self.connection.execute(
+                text('SELECT pg_terminate_backend(:pid)'), pid=holder['pid'])
+        for _ in range(TAKEOVER_ATTEMPTS):  # released once terminated
+            sleep(SECONDS_BETWEEN_TAKEOVER_ATTEMPTS)
+            if self.try_lock():
+                return True
+
+        return False
+
+    def renew(self):
+        """Renew lease, every quarter lease, until released
+
+        Side effects:
+            - Queries database, from a thread
+        """
+        while not self.stopped.wait(self.lease_seconds / 4):
+            try:
+                self.connection.execute(text('SELECT 1'))
+            except Exception as err:
+                self.lost.set()
+                logging.error('Task {} lost lock {}: {}'.format(
+                    self.task_id, self.name, err))
+                return
+
+    def acquire(self):
+        """Take lock, unless it is held by another task
+
+        Side effects:
+            - Opens connection, kept until released
+            - Renews lease from a thread
+
+        Raises:
+            PmaApiTaskDenialError: If lock is held by another task
+        """
+        if not is_supported(self.app):
+            from pma_api.models import Task
+            if Task.get_present_tasks():
+                raise PmaApiTaskDenialError
+            return
+
+        # Autocommit, so as not to be idle in a transaction while held
+        self.connection = engine(self.app) \
+            .execution_options(isolation_level='AUTOCOMMIT').connect()
+        try:
+            self.connection.execute(
+                text("SELECT set_config('application_name', :name, false)"),
+                name=(APPLICATION_NAME_PREFIX + self.task_id)[:63])
+            self.pid = self.connection.execute(
+                text('SELECT pg_backend_pid()')).scalar()
+            acquired: bool = self.try_lock() or self.take_over()
+        except BaseException:
+            self.close()
+            raise
+        if not acquired:
+            self.close()
+            raise PmaApiTaskDenialError
+
+        self.stopped.clear()
+        self.lost.clear()
+        self.heartbeat = threading.Thread(target=self.renew, daemon=True)
+        self.heartbeat.start()
+
+    def is_held(self, connection: Connection = None) -> bool:
+        """Is lock still held, rather than taken over?
+
+        Elsewhere than Postgres, it is taken to be.
+
+        Args:
+            connection (Connection): Connection to check on, e.g. one about
+            to make changes only the holder may make. Defaults to a new one.
+
+        Returns:
+            bool: True if held
+        """
+        if not is_supported(self.app):
+            return True
+        if self.lost.is_set() or not self.connection:
+            return False
+        if connection is None:
+            with engine(self.app).connect() as new_connection:
+                return self.is_held(new_connection)
+
+        return connection.execute(
+            HELD_QUERY, pid=self.pid, key=lock_key(self.name)).scalar() > 0
+
+    def assert_held(self, connection: Connection = None):
+        """Check that lock is still held, raising if not
+
+        Args:
+            connection (Connection): Connection to check on. Defaults to a
+            new one.
+
+        Raises:
+            PmaApiTaskLockLostError: If lock is no longer held
+        """
+        if not self.is_held(connection):
+            self.lost.set()
+            raise PmaApiTaskLockLostError(
+                'Task {} lost lock {}, as its lease was taken over by '
+                'another task.'.format(self.task_id, self.name))
+
+    def close(self):
+        """Close connection, releasing lock if held
+
+        The connection is discarded rather than returned to the pool, so that
+        neither the lock nor its application name outlive it.
+        """
+        try:
+            self.connection.invalidate()
+        finally:
+            self.connection.close()
+            self.connection = None
+
+    def release(self):
+        """Release lock, if held
+
+        Side effects:
+            - Closes connection
+        """
+        if not self.connection:
+            return
+        self.stopped.set()
+        self.heartbeat.join()
+        self.close()
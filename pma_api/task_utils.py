@@ -9,19 +9,17 @@ import os
 import time
 from io import BytesIO
 
-from typing import Dict, List, BinaryIO, Union
+from typing import Dict, BinaryIO, Union
 
 from celery import Celery
 from celery.exceptions import NotRegistered
 from celery.result import AsyncResult
 from werkzeug.datastructures import FileStorage
 
-from pma_api.config import TEMP_DIR, \
-    ACCEPTED_DATASET_EXTENSIONS as EXTENSIONS, S3_DATASETS_DIR_PATH, \
-    AWS_S3_STORAGE_BUCKETNAME as BUCKET, PACKAGE_DIR_NAME, CELERY_QUEUE
+from pma_api.config import PACKAGE_DIR_NAME, CELERY_QUEUE
 from pma_api.error import PmaApiException
 from pma_api.manage.db_mgmt import download_dataset
-from pma_api.routes.administration import ExistingDatasetError
+from pma_api.progress import ProgressPublisher
 from pma_api.utils import get_app_instance
 
 
@@ -110,63 +108,33 @@ def load_local_dataset_from_db(dataset_id: str) -> BinaryIO:
     return data
 
 
-def upload_dataset(filename: str, file) -> str:
+def upload_dataset(filename: str, file: FileStorage) -> str:
     """Upload file to data storage
 
+    The file is streamed to storage in parts as it is read, and checked as
+    it is, without saving it first. Files uploaded in chunks are received by
+    pma_api.manage.dataset_upload.receive_chunk() instead.
+
     Args:
         filename (str): File name.
-        file: File.
+        file (FileStorage): File.
 
     Side effects:
-        - Stores file on AWS S3 using: store_file_on_s3
+        - Streams file to AWS S3
 
     Raises:
         ExistingDatasetError: If dataset already exists
+        PmaApiUploadError: If file is too large or not a dataset file
 
     Returns:
         str: Url where file is stored
     """
-    from pma_api.manage.db_mgmt import store_file_on_s3, list_cloud_datasets
-    from pma_api.models import Dataset
-
-    # 1. Save file
-    default_ext = 'xlsx'
-    has_ext: bool = any(filename.endswith(x) for x in EXTENSIONS)
-    filename_with_ext: str = filename if has_ext \
-        else filename + '.' + default_ext
-    tempfile_path: str = os.path.join(TEMP_DIR, filename_with_ext)
-
-    save_file_from_request(file=file, file_path=tempfile_path)
-
-    # 2. Validate
-    this_dataset: Dataset = Dataset(tempfile_path)
-    this_version: int = this_dataset.version_number
-    uploaded_datasets: List[Dict[str, str]] = list_cloud_datasets()
-    uploaded_versions: List[int] = \
-        [int(x['version_number']) for x in uploaded_datasets]
-    already_exists: bool = this_version in uploaded_versions
-
-    if already_exists:
-        msg = 'ExistingDatasetError: Dataset version "{}" already exists.'\
-            .format(str(this_version))
-        if os.path.exists(tempfile_path):
-            os.remove(tempfile_path)
-        raise ExistingDatasetError(msg)
-
-    # 3. Upload file
-    filename: str = store_file_on_s3(
-        path=tempfile_path,
-        storage_dir=S3_DATASETS_DIR_PATH)
-
-    # 4. Closeout
-    if os.path.exists(tempfile_path):
-        os.remove(tempfile_path)
-    file_url = 'https://{bucket}.s3.amazonaws.com/{path}{object}'.format(
-        bucket=BUCKET,
-        path=S3_DATASETS_DIR_PATH,
-        object=filename)
-
-    return file_url
+    from pma_api.manage.dataset_upload import upload_stream
+
+    try:
+        return upload_stream(filename=filename, stream=file.stream)
+    finally:
+        file.close()
 
 
 def _get_task_status_report(task_id: str) -> Dict[str, Union[str, int, float]]:
@@ -341,44 +309,58 @@ def validate_active_task_status(task_id: str) -> bool:
 def progress_update_callback(task_obj: Celery, verbose: bool = False):
     """Progress update callback generator
 
+    Updates are coalesced by a ProgressPublisher, so that only some are
+    written to the result backend, and published to clients streaming task
+    progress. The latest is always sent once the generator is closed.
+
     Side effects:
-        - task_obj.update_state(): Updates task state.
+        - task_obj.update_state(): Updates task state, at most every
+        TASK_PROGRESS_BACKEND_SECONDS.
+        - Publishes task progress, at most every
+        TASK_PROGRESS_PUBLISH_SECONDS.
         - print(): if verbose
 
     Args:
         task_obj (Celery): Celery task object
         verbose (bool): Print update yields?
     """
-    while True:
-        # 1. Receive update via progress_update_callback.send()
-        # noinspection PyUnusedLocal
-        update_obj: Dict[str, Union[str, float]]
-        update_obj = yield
-
-        # 2. Set some static variables
-        status: str = update_obj['status'] if 'status' in update_obj else ''
-        current: Union[float, int] = update_obj['current'] \
-            if 'current' in update_obj else 0
-        total: int = update_obj['total'] if 'total' in update_obj \
-            else 100 if current and current > 1 else 1
-
-        # 3. Create report
-        static_report: Dict[str, Union[str, float, int]] = {
-            'status': status,
-            'current': current,
-            'total': total}
-        dynamic_report: Dict = {
-            k: v
-            for k, v in update_obj.items()
-            if k not in static_report.keys()}
-        report: Dict = {**static_report, **{'args': dynamic_report}} \
-            if dynamic_report else static_report
-
-        # 4. Send report
-        if verbose:
-            percent: str = str(int(current * 100)) + '%'
-            print('{} ({})'.format(status, percent))
-        task_obj.update_state(state='PROGRESS', meta=report)
+    publisher = ProgressPublisher(
+        task_id=task_obj.request.id,
+        write=lambda x: task_obj.update_state(state='PROGRESS', meta=x))
+    try:
+        while True:
+            # 1. Receive update via progress_update_callback.send()
+            # noinspection PyUnusedLocal
+            update_obj: Dict[str, Union[str, float]]
+            update_obj = yield
+
+            # 2. Set some static variables
+            status: str = update_obj['status'] if 'status' in update_obj \
+                else ''
+            current: Union[float, int] = update_obj['current'] \
+                if 'current' in update_obj else 0
+            total: int = update_obj['total'] if 'total' in update_obj \
+                else 100 if current and current > 1 else 1
+
+            # 3. Create report
+            static_report: Dict[str, Union[str, float, int]] = {
+                'status': status,
+                'current': current,
+                'total': total}
+            dynamic_report: Dict = {
+                k: v
+                for k, v in update_obj.items()
+                if k not in static_report.keys()}
+            report: Dict = {**static_report, **{'args': dynamic_report}} \
+                if dynamic_report else static_report
+
+            # 4. Send report
+            if verbose:
+                percent: str = str(int(current * 100)) + '%'
+                print('{} ({})'.format(status, percent))
+            publisher.report(report)
+    finally:
+        publisher.close()
 
 
 def start_task(
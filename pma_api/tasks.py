@@ -2,15 +2,18 @@
 
 # TODO: Add dynamic routing for each celery task, like from db.Model
 """
-from typing import Dict, Generator, List
+from typing import Dict, Generator
 
 from celery import Celery
+from celery.signals import task_postrun
 
 from pma_api.app import PmaApiFlask
-from pma_api.error import PmaApiTaskDenialError
-from pma_api.manage.db_mgmt import download_dataset
+from pma_api.manage.db_mgmt import download_dataset, backup_db
 from pma_api.manage.initdb_from_wb import InitDbFromWb
-from pma_api.task_utils import progress_update_callback
+from pma_api.progress import FINAL_STATES, publish, redis_client
+from pma_api.task_locks import ACTIVATION_LOCK, TaskLock
+from pma_api.task_utils import get_task_status, progress_update_callback, \
+    start_task
 from pma_api.utils import get_app_instance
 
 app: PmaApiFlask = get_app_instance()
@@ -23,6 +26,22 @@ celery.conf.update(app.config)
 CELERY_COMPLETION_CODES = ('FAILURE', 'SUCCESS')
 
 
+@task_postrun.connect
+def publish_final_report(task_id: str = None, state: str = None, **_):
+    """Publish final report of a task, to clients streaming its progress
+
+    Its result is already stored in the result backend by now, so the report
+    is read from there, as when polled.
+
+    Args:
+        task_id (str): Task id
+        state (str): Final task state
+    """
+    if state in FINAL_STATES and redis_client():
+        publish(task_id, get_task_status(task_id=task_id,
+                                         return_format='dict'))
+
+
 # TODO 2019.04.15-jef: This feature would be ideal to add back.
 # @celery.task(bind=True)  # TO-DO: fix action_url when works
 # def activate_dataset_request(self, dataset_id: str,
@@ -76,6 +95,8 @@ CELERY_COMPLETION_CODES = ('FAILURE', 'SUCCESS')
 def activate_dataset(self, dataset_id: str) -> Dict:
     """Activate dataset to the this server.
 
+    If the dataset is already active, its cache is refreshed instead.
+
     TODOs: 2019.03.27-jef
         1. This would be better as part of a wrapper func to all task funcs,
         until we allow for concurrent tasks.
@@ -87,32 +108,84 @@ def activate_dataset(self, dataset_id: str) -> Dict:
         self (Celery.task): Required Celery obj ref. Not to be used as param.
         dataset_id (str): Name of dataset.
 
+    Raises:
+        PmaApiTaskDenialError: If another dataset is being activated
+
     Returns:
         dict: Results.
     """
     from pma_api.models import Task
 
-    active_task_ids: List[str] = Task.get_present_tasks()  # TO-DO 1
-    if active_task_ids:
-        raise PmaApiTaskDenialError
-
-    app.config.SQLALCHEMY_ECHO = False  # TO-DO 2
-    callback: Generator = \
-        progress_update_callback(task_obj=self, verbose=True)
     task_id: str = self.request.id
+    lock = TaskLock(ACTIVATION_LOCK, task_id=task_id, app=app)
+    with lock:  # TO-DO 1
+        app.config.SQLALCHEMY_ECHO = False  # TO-DO 2
+        callback: Generator = \
+            progress_update_callback(task_obj=self, verbose=True)
+
+        try:
+            Task.register_active(task_id)
+            next(callback)  # readies callback to receive task updates
+
+            file_path: str = download_dataset(int(dataset_id))
+
+            this_task = InitDbFromWb(
+                callback=callback,
+                api_file_path=file_path,
+                _app=app,
+                skip_if_unchanged=True,
+                lock=lock)
+            this_task.run()
+            if this_task.unchanged:
+                return {'current': 100, 'total': 100,
+                        'status': 'Completed. Dataset was already active.'}
+            if this_task.uses_shadow_schema:  # backed up once active instead
+                start_task(func=backup_database)
+            return {'current': 100, 'total': 100, 'status': 'Completed'}
+        finally:
+            try:
+                callback.close()
+            finally:
+                Task.register_inactive(task_id)
+
+
+@celery.task(bind=True)
+def diff_datasets(self, new: str, old: str = None) -> Dict:
+    """Diff two versions of a dataset.
+
+    Run as a task, as workbooks may need downloading, and take a while to
+    parse.
 
-    try:
-        Task.register_active(task_id)
-        next(callback)  # readies callback to start receiving task updates
-
-        file_path: str = download_dataset(int(dataset_id))
-
-        this_task = InitDbFromWb(
-            callback=callback,
-            api_file_path=file_path,
-            _app=app)
-        this_task.run()
-        return {'current': 100, 'total': 100, 'status': 'Completed'}
-    finally:
-        callback.close()
-        Task.register_inactive(task_id)
+    Args:
+        self (Celery.task): Required Celery obj ref. Not to be used as param.
+        new (str): Version number of new dataset
+        old (str): Version number of old dataset; defaults to the active
+        dataset
+
+    Raises:
+        FileNotFoundError: If a dataset is not found
+
+    Returns:
+        dict: Results, with the diff as 'diff'. See
+        `pma_api.manage.dataset_diff.diff_workbooks()`.
+    """
+    from pma_api.manage.dataset_diff import diff_datasets as diff
+
+    self.update_state(state='PROGRESS', meta={
+        'status': 'Diffing datasets', 'current': 0, 'total': 100})
+    with app.app_context():
+        return {'current': 100, 'total': 100, 'status': 'Completed',
+                'args': {'diff': diff(new=new, old=old)}}
+
+
+@celery.task
+def backup_database() -> str:
+    """Backup database locally and to the cloud.
+
+    Run after a dataset is activated, rather than as part of activating it.
+
+    Returns:
+        str: Path saved locally
+    """
+    with app.app_context():
+        return backup_db()
@@ -1,9 +1,10 @@
 """Assortment of utilities for application."""
+import hashlib
 import itertools
 import operator
 import os
-import random
-from typing import List
+import threading
+from typing import Callable, Dict, Iterable, List, Set
 
 from flask_sqlalchemy import Model, SQLAlchemy
 
@@ -12,24 +13,166 @@ from pma_api.app import PmaApiFlask
 B64_CHAR_SET = ''.join(('abcdefghijklmnopqrstuvwxyz',
                         'ABCDEFGHIJKLMNOPQRSTUVWXYZ',
                         '0123456789-_'))
-seen = {None}
-random.seed(2020)
+CODE_LENGTH = 8
 
 
-def next64():
-    """Random string generator.
+def content_code(key, attempt: int = 0) -> str:
+    """Code derived from content.
+
+    The same key always gives the same code, across processes and
+    activations, so that codes of unchanged records are stable.
+
+    Args:
+        key: Natural key of a record, e.g. a string, or a tuple of values.
+        Its repr() is hashed.
+        attempt (int): Number of codes of the key already found to be taken,
+        to derive a different code from the same key.
+
+    Returns:
+        str: Code of CODE_LENGTH characters of B64_CHAR_SET
+    """
+    digest: int = int.from_bytes(hashlib.blake2b(
+        repr((key, attempt)).encode('utf-8'),
+        digest_size=CODE_LENGTH * 6 // 8).digest(), 'big')
+
+    return ''.join(B64_CHAR_SET[(digest >> (6 * i)) & 63]
+                   for i in range(CODE_LENGTH))
+
+
+def unique_content_code(key, is_taken: Callable[[str], bool]) -> str:
+    """Code derived from content, not already taken.
+
+    On collision, codes are derived from the key again, numbering attempts,
+    so that the code still only depends on the key, and on which codes were
+    taken before.
+
+    Args:
+        key: Natural key of a record
+        is_taken (Callable): Function telling whether a code is taken
 
     Returns:
-        str: Randomly generated string.
+        str: Code
     """
-    n_char = 8
-    result = None
+    attempt: int = 0
+    code: str = content_code(key)
+    while is_taken(code):
+        attempt += 1
+        code = content_code(key, attempt)
+
+    return code
+
+
+class CodeAllocator:
+    """Allocates unique codes derived from content, in batches.
+
+    Codes allocated are remembered, so that a table only needs one allocator
+    for all of its records. Identical keys, e.g. duplicate records, are
+    allocated different codes, in order.
+
+    Example usage:
+        allocator = CodeAllocator()
+        codes = allocator.allocate(tuple(x) for x in records)
+    """
+
+    def __init__(self, taken: Iterable[str] = ()):
+        """Initialize
+
+        Args:
+            taken (Iterable(str)): Codes already taken, e.g. by records
+            existing in the table
+        """
+        self.taken: Set[str] = set(taken)
 
-    while result in seen:
-        result = ''.join(random.choice(B64_CHAR_SET) for _ in range(n_char))
-    seen.add(result)
+    def allocate(self, keys: Iterable) -> List[str]:
+        """Allocate codes
 
-    return result
+        Args:
+            keys (Iterable): Natural keys of records
+
+        Returns:
+            list(str): Codes, in order of keys
+        """
+        codes: List[str] = []
+        for key in keys:
+            code: str = unique_content_code(key, self.taken.__contains__)
+            self.taken.add(code)
+            codes.append(code)
+
+        return codes
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one in-flight call.
+
+    The first thread to call `do()` for a key runs the function. Any other
+    thread calling `do()` for that key while it runs waits for it to finish
+    and receives the same result, or the same exception. Once finished, the
+    next call for the key runs the function again.
+
+    Example usage:
+        flights = SingleFlight()
+        value = flights.do('some-key', expensive_function, arg1, arg2)
+    """
+
+    class _Call:
+        """A call in flight"""
+
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error: Exception = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, SingleFlight._Call] = {}
+
+    def do(self, key: str, func: Callable, *args, **kwargs):
+        """Run function, unless already running for key, then wait for it.
+
+        Args:
+            key (str): Identifies calls which are equivalent
+            func (Callable): Function to run
+            *args: Positional arguments to pass to func
+            **kwargs: Keyword arguments to pass to func
+
+        Returns:
+            any: Return value of func
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader: bool = call is None
+            if is_leader:
+                call = self._calls[key] = SingleFlight._Call()
+
+        if not is_leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args, **kwargs)
+        except Exception as err:
+            call.error = err
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        return call.result
+
+    def busy(self, key: str) -> bool:
+        """Is a call for key currently in flight?
+
+        Args:
+            key (str): Identifies calls which are equivalent
+
+        Returns:
+            bool: True if a call for key is running
+        """
+        with self._lock:
+            return key in self._calls
 
 
 def most_common(a_list: list):
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Benchmark of building the datalab init sections.
+
+`DatalabData.init_surveys()` groups surveys by country and geography,
+`init_indicators()` indicators by category, `init_char_grp()`
+characteristic groups by category, and `init_strings()` merges the strings
+of each record into one map. Each should take time linear in the number of
+records. This benchmark times each on 10x and 100x the records of the
+smallest run, from records made up in memory, so that only the building is
+timed and not the database.
+
+To run, issue this command from the root directory:
+    python3 -m test.benchmark_datalab_init
+
+Exits with status 1 if time per record of any section grows more than
+MAX_GROWTH times from the smallest run to the largest.
+"""
+import sys
+from collections import OrderedDict
+from time import perf_counter
+from types import SimpleNamespace
+from typing import Callable, List
+from unittest import mock
+
+# Models first, as importing them creates the app, which imports queries
+import pma_api.models  # noqa: F401
+from pma_api.queries import DatalabData
+
+RECORD_COUNTS = (300, 3000, 30000)
+REPEATS = 5
+MAX_GROWTH = 3
+
+
+class FakeQuery:
+    """Query returning given rows, whatever it is ordered or loaded by."""
+
+    def __init__(self, rows: List):
+        """Initialize
+
+        Args:
+            rows (list): Rows to return
+        """
+        self.rows: List = rows
+
+    def order_by(self, *_):
+        return self
+
+    def options(self, *_):
+        return self
+
+    def distinct(self):
+        return self
+
+    def all(self) -> List:
+        return self.rows
+
+
+def fake_surveys(n: int) -> List[SimpleNamespace]:
+    """Make up surveys, in order of country and geography
+
+    Args:
+        n (int): Number of surveys; there are a tenth as many countries, and
+        a third as many geographies
+
+    Returns:
+        list(SimpleNamespace): Surveys
+    """
+    countries = [SimpleNamespace(code='C{}'.format(i),
+                                 label=SimpleNamespace(code='cl{}'.format(i)))
+                 for i in range(max(1, n // 10))]
+    geographies = [
+        SimpleNamespace(code='G{}'.format(i),
+                        subheading=SimpleNamespace(code='gs{}'.format(i)))
+        for i in range(max(1, n // 3))]
+    surveys: List[SimpleNamespace] = []
+    for i in range(n):
+        survey = SimpleNamespace(
+            code='S{}'.format(i),
+            country=countries[i * len(countries) // n],
+            geography=geographies[i * len(geographies) // n])
+        survey.datalab_init_json = lambda x=survey: {'id': x.code}
+        surveys.append(survey)
+
+    return surveys
+
+
+def fake_categorized(n: int, category: str) -> List[SimpleNamespace]:
+    """Make up records in categories, e.g. indicators, in order
+
+    Args:
+        n (int): Number of records; there are a tenth as many categories
+        category (str): Name of attribute of records which is their category
+
+    Returns:
+        list(SimpleNamespace): Records
+    """
+    categories = [SimpleNamespace(code='K{}'.format(i))
+                  for i in range(max(1, n // 10))]
+    records: List[SimpleNamespace] = []
+    for i in range(n):
+        record = SimpleNamespace(code='R{}'.format(i))
+        setattr(record, category, categories[i * len(categories) // n])
+        record.datalab_init_json = lambda x=record: {'id': x.code}
+        records.append(record)
+
+    return records
+
+
+def fake_strings(n: int) -> List[SimpleNamespace]:
+    """Make up English strings, with a translation each
+
+    Args:
+        n (int): Number of strings
+
+    Returns:
+        list(SimpleNamespace): Strings
+    """
+    strings: List[SimpleNamespace] = []
+    for i in range(n):
+        string = SimpleNamespace(code='E{}'.format(i))
+        string.datalab_init_json = lambda lang=None, x=string: \
+            {x.code: {'en': 'English', 'fr': 'Français'}}
+        strings.append(string)
+
+    return strings
+
+
+# Section name: (function building it, function making up n records of it)
+SECTIONS = OrderedDict((
+    ('surveys', (DatalabData.init_surveys, fake_surveys)),
+    ('indicators', (DatalabData.init_indicators,
+                    lambda n: fake_categorized(n, 'level2'))),
+    ('characteristicGroups', (DatalabData.init_char_grp,
+                              lambda n: fake_categorized(n, 'category'))),
+    ('strings', (DatalabData.init_strings, fake_strings)),
+))
+
+
+def time_build(build: Callable, rows: List, repeats: int = REPEATS) \
+        -> float:
+    """Time building a section from rows queried, best of repeats
+
+    Args:
+        build (callable): Function building section
+        rows (list): Rows returned by each query
+        repeats (int): Number of times to build it
+
+    Returns:
+        float: Seconds taken
+    """
+    query = FakeQuery(rows)
+    times: List[float] = []
+    with mock.patch.object(DatalabData, 'all_joined',
+                           staticmethod(lambda *_: query)), \
+            mock.patch('pma_api.queries.EnglishString',
+                       SimpleNamespace(query=query, translations=None)), \
+            mock.patch('pma_api.queries.selectinload'):
+        for _ in range(repeats):
+            start: float = perf_counter()
+            build()
+            times.append(perf_counter() - start)
+
+    return min(times)
+
+
+def run() -> bool:
+    """Run benchmark, printing seconds taken for each section and number of
+    records
+
+    Returns:
+        bool: True if time per record of each section grew at most
+        MAX_GROWTH times
+    """
+    linear: bool = True
+    for section, (build, fake) in SECTIONS.items():
+        per_record: List[float] = []
+        print('{:<20}  records  seconds  microseconds/record'.format(section))
+        for n in RECORD_COUNTS:
+            seconds: float = time_build(build, fake(n))
+            per_record.append(seconds / n)
+            print('{:<20}  {:>7}  {:>7.4f}  {:>19.2f}'.format(
+                '', n, seconds, seconds / n * 1e6))
+        growth: float = per_record[-1] / per_record[0]
+        print('Time per record grew {:.1f}x from {} to {} records.\n'.format(
+            growth, RECORD_COUNTS[0], RECORD_COUNTS[-1]))
+        linear = linear and growth <= MAX_GROWTH
+
+    return linear
+
+
+if __name__ == '__main__':
+    sys.exit(0 if run() else 1)
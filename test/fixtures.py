@@ -0,0 +1,87 @@
+"""Dataset workbooks of tests, and changed copies of them."""
+import os
+from typing import Callable, List
+
+import openpyxl
+from openpyxl.worksheet.worksheet import Worksheet
+
+from .config import TEST_STATIC_DIR
+
+API_DATA_PATH: str = TEST_STATIC_DIR + \
+    'SequentialTests/t1_initdb_overwrite/_archive/api_data-2000.01.01-v0.xlsx'
+
+
+def write_copy(directory: str, name: str,
+               edit: Callable[[openpyxl.Workbook], None] = None,
+               path: str = API_DATA_PATH) -> str:
+    """Write a copy of a workbook, edited
+
+    Formulas are saved as their values, as when last calculated.
+
+    Args:
+        directory (str): Directory to write copy to
+        name (str): File name of copy
+        edit (callable): Function editing workbook, if any
+        path (str): Path to workbook
+
+    Returns:
+        str: Path to copy
+    """
+    wb = openpyxl.load_workbook(path, data_only=True)
+    if edit:
+        edit(wb)
+    copy_path: str = os.path.join(directory, name)
+    wb.save(copy_path)
+
+    return copy_path
+
+
+def column_number(sheet: Worksheet, header: str) -> int:
+    """Get number of column, from 1, by header
+
+    Args:
+        sheet (Worksheet): Worksheet
+        header (str): Header of column
+
+    Returns:
+        int: Column number
+    """
+    headers: List[str] = [x.value for x in sheet[1]]
+
+    return headers.index(header) + 1
+
+
+def set_cell(sheet: Worksheet, row: int, header: str, value):
+    """Set value of a cell
+
+    Args:
+        sheet (Worksheet): Worksheet
+        row (int): Row number, as shown in a spreadsheet
+        header (str): Header of column
+        value: Value
+    """
+    sheet.cell(row=row, column=column_number(sheet, header)).value = value
+
+
+def get_cell(sheet: Worksheet, row: int, header: str):
+    """Get value of a cell
+
+    Args:
+        sheet (Worksheet): Worksheet
+        row (int): Row number, as shown in a spreadsheet
+        header (str): Header of column
+
+    Returns:
+        Value
+    """
+    return sheet.cell(row=row, column=column_number(sheet, header)).value
+
+
+def append_copy_of_row(sheet: Worksheet, row: int):
+    """Append a copy of a row to a worksheet
+
+    Args:
+        sheet (Worksheet): Worksheet
+        row (int): Row number, as shown in a spreadsheet
+    """
+    sheet.append([x.value for x in sheet[row]])
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""End-to-end tests of dataset activation on Postgres.
+
+Datasets are activated on Postgres by loading them into a shadow schema and
+swapping it in, keeping the replaced dataset as a snapshot to roll back to.
+These tests run that path against a database of their own, created on the
+Postgres server at TEST_POSTGRES_URL and dropped afterwards. They are
+skipped if it is not set.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from typing import List
+from unittest import mock
+
+import openpyxl
+from sqlalchemy import create_engine
+from sqlalchemy.engine.url import URL, make_url
+
+from pma_api import create_app, dataset_schemas, invalidation
+from pma_api.error import PmaApiDatasetValidationError
+from pma_api.manage.initdb_from_wb import InitDbFromWb
+from pma_api.manage.workbook import file_md5
+from pma_api.models import db, ApiMetadata, Data
+
+from .fixtures import API_DATA_PATH, set_cell, write_copy
+
+TEST_POSTGRES_URL: str = os.getenv('TEST_POSTGRES_URL')
+TEST_DB_NAME = 'pma_api_test_activation'
+UI_DATA_PATH: str = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
+    'data', 'ui_data-2017.10.02-v4-jef.xlsx')
+CHANGED_VALUE = 12.5
+DATA_SHEET = 'data_indonesia_17Jan2019'
+
+
+def change_value(wb: openpyxl.Workbook):
+    """Change value of the first data point of a workbook
+
+    Args:
+        wb (openpyxl.Workbook): Workbook
+    """
+    set_cell(wb[DATA_SHEET], 2, 'value', CHANGED_VALUE)
+
+
+def add_unknown_column(wb: openpyxl.Workbook):
+    """Add a column not of the model to 'survey' worksheet of a workbook
+
+    Args:
+        wb (openpyxl.Workbook): Workbook
+    """
+    sheet = wb['survey']
+    sheet.cell(row=1, column=sheet.max_column + 1).value = 'not_a_column'
+
+
+@unittest.skipUnless(TEST_POSTGRES_URL, 'TEST_POSTGRES_URL is not set')
+class TestActivationPostgres(unittest.TestCase):
+    """Test that datasets are activated, and rolled back, on Postgres.
+
+    To run this test directly, issue this command from the root directory:
+       TEST_POSTGRES_URL=postgresql://postgres@localhost/postgres \
+           python3 -m unittest test.test_activation_postgres
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """Set up: (1) Create test database, (2) Point app at it, (3) Write
+        changed copies of test dataset."""
+        cls.server = create_engine(TEST_POSTGRES_URL,
+                                   isolation_level='AUTOCOMMIT')
+        cls.drop_database()
+        cls.server.execute('CREATE DATABASE "{}"'.format(TEST_DB_NAME))
+        url: URL = make_url(TEST_POSTGRES_URL)
+        url.database = TEST_DB_NAME
+
+        cls.app = create_app('development')
+        cls.app.config['SQLALCHEMY_DATABASE_URI'] = str(url)
+        dataset_schemas.install(cls.app)
+        cls.client = cls.app.test_client()
+
+        cls.temp_dir: str = tempfile.mkdtemp()
+        cls.changed_path: str = write_copy(
+            cls.temp_dir, 'api_data-2000.01.02-v1.xlsx', change_value)
+        cls.invalid_path: str = write_copy(
+            cls.temp_dir, 'api_data-2000.01.03-v2.xlsx', add_unknown_column)
+
+    @classmethod
+    def tearDownClass(cls):
+        """Tear down: drop test database, and remove files written"""
+        with cls.app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+        cls.drop_database()
+        cls.server.dispose()
+        shutil.rmtree(cls.temp_dir)
+
+    @classmethod
+    def drop_database(cls):
+        """Drop test database, if it exists"""
+        cls.server.execute(
+            "SELECT pg_terminate_backend(pid) FROM pg_stat_activity "
+            "WHERE datname = '{}'".format(TEST_DB_NAME))
+        cls.server.execute('DROP DATABASE IF EXISTS "{}"'
+                           .format(TEST_DB_NAME))
+
+    def activate(self, api_file_path: str, **kwargs) -> dict:
+        """Activate dataset
+
+        Users are not seeded, as they are not under test.
+
+        Args:
+            api_file_path (str): Path to API data file
+            **kwargs: Other keyword arguments of InitDbFromWb
+
+        Returns:
+            dict: Final status of task
+        """
+        with mock.patch('pma_api.manage.initdb_from_wb.seed_users'):
+            return InitDbFromWb(
+                _app=self.app, api_file_path=api_file_path,
+                ui_file_path=UI_DATA_PATH, silent=True, **kwargs).run()
+
+    def live_md5(self) -> str:
+        """Get md5 of API data of live dataset, as served
+
+        Returns:
+            str: md5 checksum
+        """
+        response = self.client.get('/v1/datalab/init?cached=false')
+        self.assertEqual(response.status_code, 200)
+        metadata: List[dict] = \
+            response.get_json()['metadata']['datasetMetadata']
+
+        return next(x['hash'] for x in metadata if x['type'] == 'api')
+
+    def live_values(self) -> List[float]:
+        """Get values of all data points of live dataset
+
+        Returns:
+            list(float): Values
+        """
+        with self.app.app_context():
+            values: List[float] = [x.value for x in Data.query]
+            db.session.remove()
+
+        return values
+
+    def test_activate_and_roll_back(self):
+        """Test that activating swaps a dataset in, and rolling back out"""
+        original_md5: str = file_md5(API_DATA_PATH)
+        changed_md5: str = file_md5(self.changed_path)
+
+        status: dict = self.activate(API_DATA_PATH)
+        self.assertTrue(status['success'])
+        self.assertEqual(self.live_md5(), original_md5)
+        values: List[float] = self.live_values()
+        self.assertNotIn(CHANGED_VALUE, values)
+
+        status: dict = self.activate(self.changed_path)
+        self.assertTrue(status['success'])
+        self.assertEqual(self.live_md5(), changed_md5)
+        self.assertEqual(len(self.live_values()), len(values))
+        self.assertIn(CHANGED_VALUE, self.live_values())
+        with self.app.app_context():
+            self.assertEqual(len(dataset_schemas.list_snapshots()), 1)
+
+        status: dict = self.activate(self.changed_path,
+                                     skip_if_unchanged=True)
+        self.assertTrue(status['unchanged'])
+        with self.app.app_context():
+            self.assertEqual(len(dataset_schemas.list_snapshots()), 1)
+
+        with self.app.app_context():
+            dataset_schemas.activate_snapshot()
+            invalidation.publish()
+            self.assertEqual(
+                ApiMetadata.get_current_api_data().md5_checksum,
+                original_md5)
+            db.session.remove()
+        self.assertEqual(self.live_md5(), original_md5)
+        self.assertEqual(sorted(self.live_values()), sorted(values))
+
+    def test_invalid_dataset_leaves_live_dataset(self):
+        """Test that an invalid dataset is not loaded"""
+        self.activate(API_DATA_PATH)
+        live_md5: str = self.live_md5()
+        values: List[float] = self.live_values()
+
+        with self.assertRaises(PmaApiDatasetValidationError):
+            self.activate(self.invalid_path)
+        self.assertEqual(self.live_md5(), live_md5)
+        self.assertEqual(self.live_values(), values)
+
+
+if __name__ == '__main__':
+    unittest.main()
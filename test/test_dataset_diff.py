@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Tests of diffs of two versions of a dataset.
+
+The test API data workbook is diffed with copies of itself, changed.
+"""
+import shutil
+import tempfile
+import unittest
+from typing import Callable, Dict
+
+import openpyxl
+
+from pma_api.manage.dataset_diff import diff_workbooks
+from pma_api.manage.workbook import Workbook
+
+from .fixtures import API_DATA_PATH, append_copy_of_row, get_cell, \
+    set_cell, write_copy
+
+DATA_SHEET = 'data_ghana_22Sep2017'
+
+
+class TestDiffWorkbooks(unittest.TestCase):
+    """Test that rows added, removed and changed are found."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Set up: make a temporary directory for copies of workbook"""
+        cls.temp_dir: str = tempfile.mkdtemp()
+
+    @classmethod
+    def tearDownClass(cls):
+        """Tear down: remove temporary directory"""
+        shutil.rmtree(cls.temp_dir)
+
+    def diff(self, edit: Callable[[openpyxl.Workbook], None]) -> Dict:
+        """Diff test workbook with a copy of it, edited
+
+        Args:
+            edit (callable): Function editing workbook
+
+        Returns:
+            dict: Diff
+        """
+        path: str = write_copy(self.temp_dir, self.id() + '.xlsx', edit)
+        with Workbook(API_DATA_PATH, cache_dir='') as old, \
+                Workbook(path, cache_dir='') as new:
+            return diff_workbooks(old, new)
+
+    def assertOnlyChanged(self, diff: Dict, sheet: str, change: str,
+                          number: int = 1):
+        """Assert that only rows of a worksheet changed, and only so
+
+        Args:
+            diff (dict): Diff
+            sheet (str): Worksheet, or 'data' for data worksheets
+            change (str): 'added', 'removed' or 'changed'
+            number (int): Number of rows
+        """
+        self.assertEqual(
+            {(x, y): n for x, changes in diff['summary'].items()
+             for y, n in changes.items() if n},
+            {(sheet, change): number})
+
+    def test_same(self):
+        """Test that a copy of a workbook does not differ"""
+        diff: Dict = self.diff(lambda wb: None)
+        self.assertEqual(diff['old']['name'], 'api_data-2000.01.01-v0.xlsx')
+        self.assertEqual(diff['new']['name'], self.id() + '.xlsx')
+        self.assertNotEqual(diff['old']['md5'], diff['new']['md5'])
+        self.assertTrue(all(not n for changes in diff['summary'].values()
+                            for n in changes.values()))
+        self.assertEqual(diff['affected'], {'survey': [], 'indicator': []})
+
+    def test_metadata_changed(self):
+        """Test that a changed metadata value is found, by code"""
+        def edit(wb: openpyxl.Workbook):
+            set_cell(wb['country'], 2, 'label', 'Burkina')
+
+        diff: Dict = self.diff(edit)
+        self.assertOnlyChanged(diff, 'country', 'changed')
+        self.assertEqual(diff['sheets']['country']['changed'], [{
+            'code': 'BF',
+            'changes': {'label': {'old': 'Burkina Faso', 'new': 'Burkina'}}}])
+        self.assertEqual(diff['affected'], {'survey': [], 'indicator': []})
+
+    def test_metadata_added_and_removed(self):
+        """Test that a code changed is found as removed and added"""
+        def edit(wb: openpyxl.Workbook):
+            set_cell(wb['geography'], 2, 'code', 'gh_national_2')
+
+        diff: Dict = self.diff(edit)
+        self.assertEqual(diff['sheets']['geography']['removed'],
+                         [{'code': 'gh_national'}])
+        self.assertEqual(diff['sheets']['geography']['added'],
+                         [{'code': 'gh_national_2'}])
+        self.assertEqual(diff['summary']['geography']['changed'], 0)
+
+    def test_data_changed(self):
+        """Test that a changed data point is found, and what it affects"""
+        def edit(wb: openpyxl.Workbook):
+            set_cell(wb[DATA_SHEET], 2, 'value', 12.5)
+
+        diff: Dict = self.diff(edit)
+        self.assertOnlyChanged(diff, 'data', 'changed')
+        changed: Dict = diff['sheets']['data']['changed'][0]
+        self.assertEqual(changed['survey_code'], 'PMA2013_GHR1')
+        self.assertEqual(changed['indicator_code'], 'IUD_any_all')
+        self.assertEqual(changed['changes']['value']['new'], 12.5)
+        self.assertEqual(diff['affected'], {'survey': ['PMA2013_GHR1'],
+                                            'indicator': ['IUD_any_all']})
+
+    def test_data_within_tolerance(self):
+        """Test that numbers differing by rounding are not changed"""
+        def edit(wb: openpyxl.Workbook):
+            value: float = get_cell(wb[DATA_SHEET], 2, 'value')
+            set_cell(wb[DATA_SHEET], 2, 'value', value * (1 + 1e-12))
+
+        diff: Dict = self.diff(edit)
+        self.assertEqual(diff['summary']['data'],
+                         {'added': 0, 'removed': 0, 'changed': 0})
+
+    def test_data_added(self):
+        """Test that a data point added is found, across data worksheets"""
+        def edit(wb: openpyxl.Workbook):
+            append_copy_of_row(wb[DATA_SHEET], 2)
+            set_cell(wb[DATA_SHEET], wb[DATA_SHEET].max_row, 'survey_code',
+                     'PMA2014_GHR2')
+
+        diff: Dict = self.diff(edit)
+        self.assertOnlyChanged(diff, 'data', 'added')
+        self.assertEqual(diff['sheets']['data']['added'][0]['survey_code'],
+                         'PMA2014_GHR2')
+        self.assertEqual(diff['affected'], {'survey': ['PMA2014_GHR2'],
+                                            'indicator': ['IUD_any_all']})
+
+    def test_ignored_columns(self):
+        """Test that columns with the ignore prefix are not diffed"""
+        def edit(wb: openpyxl.Workbook):
+            set_cell(wb['survey'], 2, '__questionnaire', 'Other')
+
+        diff: Dict = self.diff(edit)
+        self.assertTrue(all(not n for changes in diff['summary'].values()
+                            for n in changes.values()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Tests of transfers of files to and from AWS S3.
+
+Transfers are made to a stand-in for S3, mocked by moto, of the development
+requirements. The tests are skipped if it is not installed.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from hashlib import md5
+from io import BytesIO
+from unittest import mock
+
+try:
+    from moto import mock_aws
+except ImportError:
+    try:  # moto < 5
+        from moto import mock_s3 as mock_aws
+    except ImportError:
+        mock_aws = None
+
+from pma_api.config import S3_TRANSFER_PART_BYTES
+from pma_api.error import PmaApiDbInteractionError
+from pma_api.manage import s3_transfer
+from pma_api.manage.s3_transfer import S3Checksum
+from pma_api.manage.workbook import file_md5
+
+TEST_BUCKET = 'pma-api-test'
+TEST_KEY = 'datasets/api_data-2000.01.01-v0.xlsx'
+WRONG_ETAG = '"{}"'.format('0' * 32)
+
+
+class NonSeekable:
+    """Stream which can only be read, in order, e.g. output of a process."""
+
+    def __init__(self, data: bytes):
+        """Initialize
+
+        Args:
+            data (bytes): Data to stream
+        """
+        self.stream = BytesIO(data)
+
+    def read(self, size: int = -1) -> bytes:
+        return self.stream.read(size)
+
+
+class TestS3Checksum(unittest.TestCase):
+    """Test that entity tags of S3 objects are computed as S3 does."""
+
+    def test_etag_of_one_part(self):
+        """Test that entity tag of an object in one part is its md5"""
+        checksum = S3Checksum(part_bytes=4)
+        checksum.update(b'abc')
+        etag: str = md5(b'abc').hexdigest()
+        self.assertEqual(checksum.etag(), etag)
+        self.assertTrue(checksum.matches('"{}"'.format(etag)))
+        self.assertFalse(checksum.matches(WRONG_ETAG))
+
+    def test_etag_of_parts(self):
+        """Test entity tag of an object in parts, updated across parts"""
+        checksum = S3Checksum(part_bytes=4)
+        for data in (b'abcde', b'fghi', b'j'):
+            checksum.update(data)
+        digests = b''.join(md5(x).digest() for x in (b'abcd', b'efgh', b'ij'))
+        etag: str = '{}-3'.format(md5(digests).hexdigest())
+        self.assertEqual(checksum.hexdigest(), md5(b'abcdefghij').hexdigest())
+        self.assertEqual(checksum.etag(), etag)
+        self.assertTrue(checksum.matches(etag))
+        self.assertFalse(checksum.matches(WRONG_ETAG.strip('"') + '-3'))
+
+    def test_etag_of_other_part_size(self):
+        """Test that entity tags of parts of another size are not compared"""
+        checksum = S3Checksum(part_bytes=4)
+        checksum.update(b'abcdefghij')
+        self.assertIsNone(checksum.etag(n_parts=2))
+        self.assertTrue(checksum.matches(WRONG_ETAG.strip('"') + '-2'))
+
+
+@unittest.skipUnless(mock_aws, 'moto is not installed')
+class TestS3Transfer(unittest.TestCase):
+    """Test that files are uploaded and downloaded, with their checksums."""
+
+    def setUp(self):
+        """Set up: (1) Mock S3, with a bucket, (2) Make a temporary directory
+        """
+        environ = mock.patch.dict(os.environ, {
+            'AWS_ACCESS_KEY_ID': 'testing',
+            'AWS_SECRET_ACCESS_KEY': 'testing',
+            'AWS_DEFAULT_REGION': 'us-east-1'})
+        environ.start()
+        self.addCleanup(environ.stop)
+        endpoint = mock.patch.object(s3_transfer, 'AWS_S3_ENDPOINT_URL', None)
+        endpoint.start()
+        self.addCleanup(endpoint.stop)
+        s3 = mock_aws()
+        s3.start()
+        self.addCleanup(s3.stop)
+        # Clients are created when first needed, so must be within the mock
+        s3_transfer._clients.clear()
+        self.addCleanup(s3_transfer._clients.clear)
+
+        self.client = s3_transfer.client()
+        self.client.create_bucket(Bucket=TEST_BUCKET)
+        self.temp_dir: str = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+
+    def write_file(self, data: bytes) -> str:
+        """Write file to temporary directory
+
+        Args:
+            data (bytes): Content
+
+        Returns:
+            str: Path to file
+        """
+        path: str = os.path.join(self.temp_dir, 'upload.xlsx')
+        with open(path, 'wb') as file:
+            file.write(data)
+
+        return path
+
+    def test_upload_file_in_parts(self):
+        """Test that a file of more than a part is uploaded in parts"""
+        data: bytes = os.urandom(2 * S3_TRANSFER_PART_BYTES + 1)
+        checksum: str = s3_transfer.upload_file(
+            self.write_file(data), TEST_KEY, metadata={'version': '0'},
+            bucket=TEST_BUCKET)
+        self.assertEqual(checksum, md5(data).hexdigest())
+
+        head: dict = self.client.head_object(Bucket=TEST_BUCKET, Key=TEST_KEY)
+        self.assertTrue(head['ETag'].strip('"').endswith('-3'))
+        self.assertEqual(head['Metadata'], {'version': '0'})
+        body: bytes = self.client.get_object(
+            Bucket=TEST_BUCKET, Key=TEST_KEY)['Body'].read()
+        self.assertEqual(body, data)
+
+    def test_upload_stream(self):
+        """Test that a stream which cannot seek is uploaded"""
+        data: bytes = b'pma-api' * 1000
+        checksum: str = s3_transfer.upload_stream(
+            NonSeekable(data), TEST_KEY, bucket=TEST_BUCKET)
+        self.assertEqual(checksum, md5(data).hexdigest())
+        self.assertEqual(s3_transfer.etag(TEST_KEY, TEST_BUCKET).strip('"'),
+                         checksum)
+
+    def test_upload_checksum_mismatch(self):
+        """Test that an upload whose entity tag does not match fails"""
+        with mock.patch.object(s3_transfer, 'etag', return_value=WRONG_ETAG):
+            with self.assertRaises(PmaApiDbInteractionError):
+                s3_transfer.upload_stream(
+                    BytesIO(b'pma-api'), TEST_KEY, bucket=TEST_BUCKET)
+
+    def test_download_file(self):
+        """Test that a file uploaded in parts is downloaded, and its md5
+        remembered"""
+        data: bytes = os.urandom(S3_TRANSFER_PART_BYTES + 1)
+        s3_transfer.upload_file(self.write_file(data), TEST_KEY,
+                                bucket=TEST_BUCKET)
+        path: str = os.path.join(self.temp_dir, 'download.xlsx')
+        with mock.patch('pma_api.manage.s3_transfer.remember_file_md5',
+                        wraps=s3_transfer.remember_file_md5) as remember:
+            checksum: str = \
+                s3_transfer.download_file(TEST_KEY, path, TEST_BUCKET)
+
+        self.assertEqual(checksum, md5(data).hexdigest())
+        with open(path, 'rb') as file:
+            self.assertEqual(file.read(), data)
+        remember.assert_called_once_with(path, checksum)
+        self.assertEqual(file_md5(path), checksum)
+
+    def test_download_checksum_mismatch(self):
+        """Test that a download whose entity tag does not match fails, and
+        is removed"""
+        self.client.put_object(Bucket=TEST_BUCKET, Key=TEST_KEY,
+                               Body=b'pma-api')
+        path: str = os.path.join(self.temp_dir, 'download.xlsx')
+        with mock.patch.object(s3_transfer, 'etag', return_value=WRONG_ETAG):
+            with self.assertRaises(PmaApiDbInteractionError):
+                s3_transfer.download_file(TEST_KEY, path, TEST_BUCKET)
+        self.assertFalse(os.path.exists(path))
+
+    def test_object_md5(self):
+        """Test that md5 of an object uploaded in parts is read"""
+        data: bytes = os.urandom(S3_TRANSFER_PART_BYTES + 1)
+        s3_transfer.upload_file(self.write_file(data), TEST_KEY,
+                                bucket=TEST_BUCKET)
+        self.assertEqual(s3_transfer.object_md5(TEST_KEY, TEST_BUCKET),
+                         md5(data).hexdigest())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Tests of locks of tasks on Postgres.
+
+Locks are taken on the Postgres server at TEST_POSTGRES_URL. The tests are
+skipped if it is not set.
+"""
+import os
+import time
+import unittest
+
+from pma_api import create_app, dataset_schemas
+from pma_api.error import PmaApiTaskDenialError, PmaApiTaskLockLostError
+from pma_api.models import db
+from pma_api.task_locks import TaskLock, running_tasks
+
+TEST_POSTGRES_URL: str = os.getenv('TEST_POSTGRES_URL')
+TEST_LOCK = 'pma_api.test_lock'
+# Long enough for the lease not to be renewed during a test
+LONG_LEASE_SECONDS = 60
+SHORT_LEASE_SECONDS = 1
+
+
+@unittest.skipUnless(TEST_POSTGRES_URL, 'TEST_POSTGRES_URL is not set')
+class TestTaskLock(unittest.TestCase):
+    """Test that locks are exclusive, and can be taken over once expired.
+
+    To run this test directly, issue this command from the root directory:
+       TEST_POSTGRES_URL=postgresql://postgres@localhost/postgres \
+           python3 -m unittest test.test_task_locks
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """Set up: point app at test Postgres server"""
+        cls.app = create_app('development')
+        cls.app.config['SQLALCHEMY_DATABASE_URI'] = TEST_POSTGRES_URL
+
+    @classmethod
+    def tearDownClass(cls):
+        """Tear down: close connections of app"""
+        with cls.app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+
+    def lock(self, task_id: str, lease_seconds: float) -> TaskLock:
+        """Acquire lock, released after test
+
+        Args:
+            task_id (str): Id of task taking lock
+            lease_seconds (float): Seconds lease lasts, if not renewed
+
+        Returns:
+            TaskLock: Lock acquired
+        """
+        lock = TaskLock(TEST_LOCK, task_id=task_id, app=self.app,
+                        lease_seconds=lease_seconds)
+        lock.acquire()
+        self.addCleanup(lock.release)
+
+        return lock
+
+    def test_denied_while_held(self):
+        """Test that lock is denied to another task while its lease is
+        renewed"""
+        first: TaskLock = self.lock('first', LONG_LEASE_SECONDS)
+        with self.assertRaises(PmaApiTaskDenialError):
+            self.lock('second', LONG_LEASE_SECONDS)
+        self.assertTrue(first.is_held())
+        self.assertEqual(running_tasks(TEST_LOCK, self.app), ['first'])
+
+    def test_take_over(self):
+        """Test that an expired lease is taken over, and that its former
+        holder finds out, before swapping its dataset in"""
+        first: TaskLock = self.lock('first', LONG_LEASE_SECONDS)
+        time.sleep(SHORT_LEASE_SECONDS * 1.5)
+        second: TaskLock = self.lock('second', SHORT_LEASE_SECONDS)
+
+        self.assertTrue(second.is_held())
+        self.assertFalse(first.is_held())
+        with self.assertRaises(PmaApiTaskLockLostError):
+            first.assert_held()
+        with self.app.app_context():
+            with self.assertRaises(PmaApiTaskLockLostError):
+                dataset_schemas.activate_shadow_schema([], lock=first)
+        self.assertEqual(running_tasks(TEST_LOCK, self.app), ['second'])
+
+    def test_renewal_failure(self):
+        """Test that lock is marked lost when its lease cannot be renewed"""
+        first: TaskLock = self.lock('first', LONG_LEASE_SECONDS)
+        first.stopped.set()
+        first.heartbeat.join()
+        time.sleep(SHORT_LEASE_SECONDS * 1.5)
+        self.lock('second', SHORT_LEASE_SECONDS)
+
+        first.stopped.clear()
+        first.lease_seconds = SHORT_LEASE_SECONDS / 10
+        first.renew()
+        self.assertTrue(first.lost.is_set())
+        self.assertFalse(first.is_held())
+
+
+if __name__ == '__main__':
+    unittest.main()
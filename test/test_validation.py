@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Tests of validation of dataset workbooks.
+
+Workbooks validated are copies of the test API data workbook, each changed
+to break a rule.
+"""
+import shutil
+import tempfile
+import unittest
+from typing import Callable, List, Set, Tuple
+
+import openpyxl
+
+from pma_api.error import PmaApiDatasetValidationError
+from pma_api.manage.validation import assert_valid_workbook, \
+    validate_workbook
+from pma_api.manage.workbook import Workbook
+
+from .fixtures import API_DATA_PATH, append_copy_of_row, set_cell, \
+    write_copy
+
+DATA_SHEET = 'data_ghana_22Sep2017'
+OTHER_DATA_SHEET = 'data_kenya_17Jan2019'
+
+
+class TestValidateWorkbook(unittest.TestCase):
+    """Test that violations of dataset workbooks are found."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Set up: make a temporary directory for copies of workbook"""
+        cls.temp_dir: str = tempfile.mkdtemp()
+
+    @classmethod
+    def tearDownClass(cls):
+        """Tear down: remove temporary directory"""
+        shutil.rmtree(cls.temp_dir)
+
+    def violations(self, edit: Callable[[openpyxl.Workbook], None] = None) \
+            -> Set[Tuple]:
+        """Validate copy of test workbook, edited
+
+        Args:
+            edit (callable): Function editing workbook, if any
+
+        Returns:
+            set(tuple): Worksheet, row, column and problem of each violation
+        """
+        path: str = API_DATA_PATH if not edit \
+            else write_copy(self.temp_dir, self.id() + '.xlsx', edit)
+        with Workbook(path, cache_dir='') as wb:
+            return {(x['sheet'], x['row'], x['column'], x['problem'])
+                    for x in validate_workbook(wb)}
+
+    def test_valid(self):
+        """Test that the test workbook is valid"""
+        self.assertEqual(self.violations(), set())
+
+    def test_unknown_column(self):
+        """Test that columns not of the model are found, unless ignored"""
+        def edit(wb: openpyxl.Workbook):
+            for sheet_name in ('survey', DATA_SHEET):
+                sheet = wb[sheet_name]
+                for header in ('not_a_column', '__notes'):
+                    sheet.cell(row=1, column=sheet.max_column + 1,
+                               value=header)
+
+        self.assertEqual(self.violations(edit), {
+            ('survey', None, 'not_a_column', 'unknown column'),
+            (DATA_SHEET, None, 'not_a_column', 'unknown column')})
+
+    def test_types(self):
+        """Test that values not of the column's type are found, but not
+        Stata undefined tokens"""
+        def edit(wb: openpyxl.Workbook):
+            set_cell(wb[DATA_SHEET], 2, 'value', 'abc')
+            set_cell(wb[DATA_SHEET], 3, 'lower_ci', '.')
+            set_cell(wb['survey'], 2, 'start_date', '2013-09')
+
+        self.assertEqual(self.violations(edit), {
+            (DATA_SHEET, 2, 'value', 'not a number'),
+            ('survey', 2, 'start_date', 'not a date of format "%m-%Y"')})
+
+    def test_required(self):
+        """Test that empty values of required columns are found"""
+        def edit(wb: openpyxl.Workbook):
+            set_cell(wb['survey'], 2, 'label', None)
+            set_cell(wb[DATA_SHEET], 2, 'value', '.')
+
+        self.assertEqual(self.violations(edit), {
+            ('survey', 2, 'label', 'empty'),
+            (DATA_SHEET, 2, 'value', 'empty')})
+
+    def test_duplicate_code(self):
+        """Test that repeated codes, and other unique values, are found"""
+        def edit(wb: openpyxl.Workbook):
+            append_copy_of_row(wb['country'], 2)
+
+        row: int = wb_rows('country') + 2
+        self.assertEqual(self.violations(edit), {
+            ('country', row, 'code', 'duplicate of row 2'),
+            ('country', row, 'order', 'duplicate of row 2')})
+
+    def test_references(self):
+        """Test that codes of records not in the worksheet referred to are
+        found"""
+        def edit(wb: openpyxl.Workbook):
+            set_cell(wb[DATA_SHEET], 2, 'survey_code', 'not_a_survey')
+            set_cell(wb['char'], 2, 'char_grp_code', 'not_a_group')
+
+        violations: Set[Tuple] = self.violations(edit)
+        self.assertIn((DATA_SHEET, 2, 'survey_code',
+                       'no record with this code in "survey"'), violations)
+        self.assertIn(('char', 2, 'char_grp_code',
+                       'no record with this code in "char_grp"'), violations)
+
+    def test_duplicate_data_point(self):
+        """Test that data points repeated across data worksheets are found"""
+        def edit(wb: openpyxl.Workbook):
+            sheet = wb[OTHER_DATA_SHEET]
+            sheet.append([x.value for x in wb[DATA_SHEET][2]])
+
+        violations: List[Tuple] = list(self.violations(edit))
+        self.assertEqual(len(violations), 1)
+        sheet, row, _, problem = violations[0]
+        self.assertEqual((sheet, row), (OTHER_DATA_SHEET,
+                                        wb_rows(OTHER_DATA_SHEET) + 2))
+        self.assertEqual(problem, 'duplicate data point, of sheet "{}", row 2'
+                         .format(DATA_SHEET))
+
+    def test_missing_worksheet(self):
+        """Test that missing worksheets are found"""
+        def edit(wb: openpyxl.Workbook):
+            del wb['char_grp']
+
+        self.assertIn(('char_grp', None, None, 'missing worksheet'),
+                      self.violations(edit))
+
+    def test_assert_valid_workbook(self):
+        """Test that all violations are raised, and described"""
+        path: str = write_copy(
+            self.temp_dir, 'assert_valid_workbook.xlsx',
+            lambda wb: [set_cell(wb[DATA_SHEET], x, 'value', 'abc')
+                        for x in (2, 3)])
+        with Workbook(path, cache_dir='') as wb:
+            with self.assertRaises(PmaApiDatasetValidationError) as context:
+                assert_valid_workbook(wb)
+        self.assertEqual(len(context.exception.violations), 2)
+        self.assertIn('Worksheet "{}", row 3, column "value": not a number'
+                      .format(DATA_SHEET), str(context.exception))
+        with Workbook(API_DATA_PATH, cache_dir='') as wb:
+            assert_valid_workbook(wb)
+
+
+def wb_rows(sheet: str) -> int:
+    """Get number of rows of a worksheet of test workbook, but header
+
+    Args:
+        sheet (str): Worksheet name
+
+    Returns:
+        int: Number of rows
+    """
+    with Workbook(API_DATA_PATH, cache_dir='') as wb:
+        return sum(1 for _ in wb.sheet_by_name(sheet).rows()) - 1
+
+
+if __name__ == '__main__':
+    unittest.main()